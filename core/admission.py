@@ -0,0 +1,121 @@
+"""
+Admission control for the exam-start path.
+
+When an exam opens every enrolled student arrives at once.  Each exam
+gets a per-process token bucket that lets ``rate`` students per second
+in (with bursts up to ``burst``) and a FIFO waiting room for the rest:
+
+* a student without a ticket draws the next ticket number;
+* tokens advance the "now serving" number in arrival order;
+* a ticket at or below "now serving" is admitted, anything above it
+  gets back its queue position and a retry hint.
+
+Tickets are signed strings handed back to the client, so a queued
+request needs no session or database access at all.  Rooms live in
+process memory; a ticket presented to another worker or after a restart
+is simply reissued at the back of that worker's queue.
+
+Capacity is configured per exam with ``EXAM_ADMISSION``::
+
+    EXAM_ADMISSION = {
+        'default': {'rate': 50, 'burst': 100},
+        'exam:12': {'rate': 20, 'burst': 40},
+    }
+"""
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+TICKET_SALT = 'core.admission.ticket'
+DEFAULT_CAPACITY = {'rate': 50, 'burst': 100}
+MAX_RETRY_AFTER = 30
+
+# Tickets issued by an earlier process are not honoured by this one.
+_EPOCH = uuid.uuid4().hex[:8]
+
+_rooms = {}
+_rooms_lock = threading.Lock()
+
+
+class Admission:
+    def __init__(self, admitted, ticket, position=0, retry_after=0):
+        self.admitted = admitted
+        self.ticket = ticket
+        self.position = position
+        self.retry_after = retry_after
+
+
+class WaitingRoom:
+    """Token bucket plus FIFO ticket queue for one exam on one process."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.issued = 0    # last ticket number handed out
+        self.serving = 0   # highest ticket number allowed in
+        self.lock = threading.Lock()
+
+    def _advance(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        waiting = self.issued - self.serving
+        if waiting > 0 and self.tokens >= 1:
+            step = min(waiting, int(self.tokens))
+            self.serving += step
+            self.tokens -= step
+
+    def admit(self, number=None):
+        """Admit or queue ticket ``number`` (a new ticket when ``None``)."""
+        with self.lock:
+            if number is None or number > self.issued:
+                self.issued += 1
+                number = self.issued
+            self._advance()
+            if number <= self.serving:
+                return number, 0, 0
+            position = number - self.serving
+            retry_after = min(MAX_RETRY_AFTER, max(1, math.ceil(position / self.rate)))
+            return number, position, retry_after
+
+
+def capacity(exam_key):
+    config = getattr(settings, 'EXAM_ADMISSION', {})
+    return config.get(exam_key) or config.get('default') or DEFAULT_CAPACITY
+
+
+def get_room(exam_key):
+    room = _rooms.get(exam_key)
+    if room is None:
+        with _rooms_lock:
+            room = _rooms.get(exam_key)
+            if room is None:
+                limits = capacity(exam_key)
+                room = _rooms[exam_key] = WaitingRoom(limits['rate'], limits['burst'])
+    return room
+
+
+def _read_ticket(ticket, exam_key, student_id):
+    if not ticket:
+        return None
+    try:
+        epoch, key, owner, number = signing.loads(ticket, salt=TICKET_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if epoch != _EPOCH or key != exam_key or owner != student_id:
+        return None
+    return number
+
+
+def admit(exam_key, student_id, ticket=None):
+    """Try to let ``student_id`` start ``exam_key``; never touches the DB."""
+    number = _read_ticket(ticket, exam_key, student_id)
+    number, position, retry_after = get_room(exam_key).admit(number)
+    signed = signing.dumps([_EPOCH, exam_key, student_id, number], salt=TICKET_SALT)
+    return Admission(position == 0, signed, position, retry_after)
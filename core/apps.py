@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        # Models and signal receivers that live outside core.models.  They
+        # are imported here so every process registers the models (and
+        # makemigrations sees them) and connects the receivers that keep
+        # counters, caches and the search index current, whether or not
+        # a view happens to import the module.
+        from core import (  # noqa: F401
+            attempts, certificates, db, enrollment_stats, enrollments, images,
+            item_analysis, paper_cache, principal, question_stats, search,
+        )
@@ -0,0 +1,378 @@
+"""
+Exam attempts with server-side deadlines.
+
+Every start of an ``Exam`` or ``Examination`` creates or resumes an
+``ExamAttempt``::
+
+    started --(first answer)--> in_progress --(submit)--> submitted
+        \\                           \\
+         +------(deadline passes)----+--> expired (auto-submitted)
+
+``start_attempt`` enforces ``max_attempts`` and ``allow_resume`` (an
+``Exam`` allows one resumable attempt) and sets the deadline from the
+exam's duration.  The attempt id, number, deadline and state are kept
+in the session, so the answer and submit paths check the deadline with
+one comparison instead of loading the attempt and its exam.  Answers
+and submissions without an open attempt are refused.
+
+Answers are accepted until ``ATTEMPT_GRACE_SECONDS`` (default 5) after
+the deadline, for requests already in flight.  In an attempt's last
+``ATTEMPT_SYNC_FLUSH_SECONDS`` the answer path writes the student's
+buffered answers before replying, so nothing accepted in time is still
+sitting in a web worker's autosave buffer when the attempt is
+auto-submitted ``ATTEMPT_SETTLE_SECONDS`` (default 5) later.
+
+Expiry is handled by one ``DeadlineScheduler``, run as its own process
+with ``expire_attempts --watch``: a min-heap of ``(deadline, attempt
+id)`` refilled by a cheap indexed poll, and a loop that sleeps until
+the earliest deadline, then expires every attempt that is due in one
+batch: the attempts are moved to ``expired`` with a conditional UPDATE
+and their ``Submission`` rows are inserted in bulk, skipping students
+who already have one (studentpanel's unique ``(student, exam)``
+constraint).  Attempts submitted in the meantime are skipped by that
+UPDATE rather than removed from the heap.  Start and submit also
+expire an overdue attempt on the spot, so a stopped scheduler delays
+auto-submission but never lets an attempt run over.
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, models, transaction
+from django.utils import timezone
+
+from core import live_monitor
+from core.autosave import get_buffer
+from core.models import CustomUser
+from core.paper_cache import EXAM, KINDS
+from studentpanel.models import Submission
+
+logger = logging.getLogger(__name__)
+
+STARTED, IN_PROGRESS, SUBMITTED, EXPIRED = 'started', 'in_progress', 'submitted', 'expired'
+OPEN = (STARTED, IN_PROGRESS)
+EXPIRE_BATCH_SIZE = 500
+
+
+class AttemptError(Exception):
+    """The student may not start (or resume) this exam."""
+
+
+class ExamAttempt(models.Model):
+    STATUS_CHOICES = [
+        (STARTED, 'Started'),
+        (IN_PROGRESS, 'In progress'),
+        (SUBMITTED, 'Submitted'),
+        (EXPIRED, 'Expired'),
+    ]
+
+    kind = models.CharField(max_length=12, choices=[(kind, kind.title()) for kind in KINDS])
+    exam_id = models.PositiveIntegerField()
+    student = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='exam_attempts')
+    number = models.PositiveSmallIntegerField(default=1)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STARTED)
+    started_at = models.DateTimeField()
+    # None when the exam has no time limit.
+    deadline = models.DateTimeField(null=True, blank=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    # Ids of the questions on this attempt's paper, stored when it is first served.
+    question_ids = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'exam_id', 'student', 'number')
+        indexes = [models.Index(fields=['status', 'deadline'], name='core_attempt_deadline_idx')]
+
+    def __str__(self):
+        return f"{self.kind}:{self.exam_id} #{self.number} {self.student_id} ({self.status})"
+
+    @property
+    def is_open(self):
+        return self.status in OPEN
+
+
+def grace_seconds():
+    return getattr(settings, 'ATTEMPT_GRACE_SECONDS', 5)
+
+
+def expiry_delay():
+    """Seconds after the deadline before an attempt is auto-submitted."""
+    return grace_seconds() + getattr(settings, 'ATTEMPT_SETTLE_SECONDS', 5)
+
+
+def _rules(kind, exam_id):
+    """``(duration minutes, max attempts, allow resume)`` of one exam."""
+    exam = KINDS[kind].objects.get(id=exam_id)
+    duration = getattr(exam, 'duration_minutes', None) or getattr(exam, 'duration', None)
+    return duration, getattr(exam, 'max_attempts', None) or 1, getattr(exam, 'allow_resume', True)
+
+
+def start_attempt(kind, exam_id, student_id, resume_id=None):
+    """Return ``(attempt, created)`` for a student starting an exam.
+
+    An open attempt whose deadline has passed is expired first.  An open
+    attempt is resumed when the exam allows it or when ``resume_id`` (the
+    attempt in the student's session) names it.  Raises
+    ``AttemptError`` when no attempt is left or resuming is not allowed.
+    """
+    duration, max_attempts, allow_resume = _rules(kind, exam_id)
+    attempts = list(ExamAttempt.objects.filter(kind=kind, exam_id=exam_id, student_id=student_id)
+                    .order_by('-number'))
+    latest = attempts[0] if attempts else None
+
+    if latest is not None and latest.is_open:
+        if latest.deadline is not None and timezone.now() > latest.deadline + timedelta(seconds=grace_seconds()):
+            expire_attempts([latest.id], delay=grace_seconds())
+            latest.status = EXPIRED
+        elif allow_resume or latest.id == resume_id:
+            return latest, False
+        else:
+            raise AttemptError("This exam is already in progress and cannot be resumed.")
+
+    if len(attempts) >= max_attempts:
+        raise AttemptError("You have used all your attempts for this exam.")
+
+    now = timezone.now()
+    attempt = ExamAttempt(
+        kind=kind, exam_id=exam_id, student_id=student_id, number=len(attempts) + 1,
+        started_at=now, deadline=now + timedelta(minutes=duration) if duration else None,
+    )
+    try:
+        with transaction.atomic():
+            attempt.save()
+    except IntegrityError:
+        # A concurrent start of the same attempt won; use that one.
+        return ExamAttempt.objects.get(kind=kind, exam_id=exam_id, student_id=student_id,
+                                       number=attempt.number), False
+    return attempt, True
+
+
+def _session_key(kind, exam_id):
+    return f'exam_deadline_{kind}_{exam_id}'
+
+
+def remember(request, kind, exam_id, attempt):
+    """Keep what the answer and submit paths need in the session."""
+    request.session[f'exam_attempt_{kind}_{exam_id}'] = attempt.number
+    request.session[_session_key(kind, exam_id)] = [
+        attempt.id, attempt.deadline.timestamp() if attempt.deadline else None, attempt.status,
+    ]
+
+
+def current(request, kind, exam_id, rebuild=True):
+    """``(attempt id, deadline timestamp or None, status)`` or ``None``.
+
+    A session without a copy (a new login, a second browser) gets one
+    rebuilt from the student's latest attempt, so the answer and submit
+    paths never skip the deadline check.  ``None`` means the student has
+    not started this exam.
+    """
+    state = request.session.get(_session_key(kind, exam_id))
+    if state is None and rebuild:
+        attempt = (ExamAttempt.objects.filter(kind=kind, exam_id=exam_id, student_id=request.principal.id)
+                   .order_by('-number').first())
+        if attempt is None:
+            return None
+        remember(request, kind, exam_id, attempt)
+        state = request.session[_session_key(kind, exam_id)]
+    return tuple(state) if state else None
+
+
+def seconds_left(state):
+    if state is None or state[1] is None:
+        return None
+    return max(0, int(state[1] - time.time()))
+
+
+def near_deadline(state):
+    """True in the last ``ATTEMPT_SYNC_FLUSH_SECONDS`` (default 30) of an attempt."""
+    window = getattr(settings, 'ATTEMPT_SYNC_FLUSH_SECONDS', 30)
+    return state is not None and state[1] is not None and time.time() >= state[1] - window
+
+
+def is_expired(state):
+    """True once the attempt's deadline (plus the grace period) has passed."""
+    return state is not None and state[1] is not None and time.time() > state[1] + grace_seconds()
+
+
+def _paper_key(kind, exam_id):
+    return f'exam_paper_{kind}_{exam_id}'
+
+
+def paper_question_ids(request, kind, exam_id, state):
+    """The question ids stored for the session's attempt, or ``None``."""
+    if state is None:
+        return None
+    stored = request.session.get(_paper_key(kind, exam_id))
+    if stored and stored[0] == state[0]:
+        return stored[1]
+    question_ids = ExamAttempt.objects.filter(id=state[0]).values_list('question_ids', flat=True).first()
+    if question_ids is not None:
+        request.session[_paper_key(kind, exam_id)] = [state[0], question_ids]
+    return question_ids
+
+
+def store_question_ids(request, kind, exam_id, state, question_ids):
+    """Store the paper's question ids on the attempt; returns the stored ids.
+
+    The first paper served wins: if another request stored a selection
+    first, that one is returned.
+    """
+    if not ExamAttempt.objects.filter(id=state[0], question_ids__isnull=True).update(question_ids=question_ids):
+        question_ids = ExamAttempt.objects.filter(id=state[0]).values_list('question_ids', flat=True).first()
+    request.session[_paper_key(kind, exam_id)] = [state[0], question_ids]
+    return question_ids
+
+
+def mark_in_progress(request, kind, exam_id):
+    """Move a started attempt to ``in_progress`` on its first answer."""
+    state = current(request, kind, exam_id, rebuild=False)
+    if state is None or state[2] != STARTED:
+        return
+    ExamAttempt.objects.filter(id=state[0], status=STARTED).update(status=IN_PROGRESS, updated_at=timezone.now())
+    request.session[_session_key(kind, exam_id)] = [state[0], state[1], IN_PROGRESS]
+
+
+def finish(request, kind, exam_id):
+    """Mark the session's attempt submitted; returns its final status."""
+    state = current(request, kind, exam_id, rebuild=False)
+    if state is None:
+        return None
+    updated = ExamAttempt.objects.filter(id=state[0], status__in=OPEN).update(
+        status=SUBMITTED, submitted_at=timezone.now(), updated_at=timezone.now(),
+    )
+    status = SUBMITTED if updated else ExamAttempt.objects.filter(id=state[0]).values_list(
+        'status', flat=True).first()
+    request.session[_session_key(kind, exam_id)] = [state[0], state[1], status]
+    return status
+
+
+def expire_attempts(attempt_ids, batch_size=EXPIRE_BATCH_SIZE, delay=None):
+    """Auto-submit the overdue open attempts among ``attempt_ids``.
+
+    An attempt is overdue ``delay`` seconds (default ``expiry_delay()``)
+    after its deadline.  Returns how many attempts were expired.
+    Attempts that were submitted meanwhile, or that are not overdue yet,
+    are left alone.  Safe to run
+    concurrently: the status UPDATE is conditional and the ``Submission``
+    insert ignores rows that already exist.
+    """
+    attempt_ids = list(attempt_ids)
+    if not attempt_ids:
+        return 0
+    # Web workers write the answers of an attempt's last minutes
+    # synchronously (see near_deadline); this covers the lazy expiry
+    # done inside a web worker.
+    get_buffer().flush()
+    delay = expiry_delay() if delay is None else delay
+    expired = 0
+    for start in range(0, len(attempt_ids), batch_size):
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                ExamAttempt.objects
+                .filter(id__in=attempt_ids[start:start + batch_size], status__in=OPEN,
+                        deadline__lte=now - timedelta(seconds=delay))
+                .values_list('id', 'kind', 'exam_id', 'student_id')
+            )
+            if not rows:
+                continue
+            ExamAttempt.objects.filter(id__in=[row[0] for row in rows], status__in=OPEN).update(
+                status=EXPIRED, submitted_at=now, updated_at=now,
+            )
+            Submission.objects.bulk_create([
+                Submission(exam_id=exam_id, student_id=student_id)
+                for _, kind, exam_id, student_id in rows if kind == EXAM
+            ], batch_size=batch_size, ignore_conflicts=True)
+        for _, kind, exam_id, student_id in rows:
+            live_monitor.record_submit(kind, exam_id, student_id)
+        expired += len(rows)
+    return expired
+
+
+def overdue_attempt_ids():
+    cutoff = timezone.now() - timedelta(seconds=expiry_delay())
+    return ExamAttempt.objects.filter(status__in=OPEN, deadline__lte=cutoff).values_list('id', flat=True)
+
+
+class DeadlineScheduler:
+    """Min-heap of upcoming attempt deadlines, expired as they fall due.
+
+    Run exactly one, through ``expire_attempts --watch``.  Every
+    ``poll_interval`` seconds the open attempts due within the next two
+    intervals are read through the ``(status, deadline)`` index and
+    added to the heap; in between the loop sleeps until the earliest
+    deadline or the next poll, whichever comes first.
+    """
+
+    def __init__(self, batch_size=EXPIRE_BATCH_SIZE, poll_interval=None):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval or getattr(settings, 'ATTEMPT_POLL_SECONDS', 5)
+        self._heap = []
+        self._scheduled = set()
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, deadline, attempt_id):
+        """Schedule ``attempt_id`` to expire after ``deadline`` (a timestamp)."""
+        with self._condition:
+            if attempt_id in self._scheduled:
+                return
+            self._scheduled.add(attempt_id)
+            heapq.heappush(self._heap, (deadline, attempt_id))
+
+    def load(self):
+        """Schedule the open attempts whose deadline falls before the next polls."""
+        horizon = timezone.now() + timedelta(seconds=2 * self.poll_interval)
+        rows = (ExamAttempt.objects.filter(status__in=OPEN, deadline__lte=horizon)
+                .values_list('deadline', 'id'))
+        for deadline, attempt_id in rows.iterator(chunk_size=self.batch_size):
+            self.push(deadline.timestamp(), attempt_id)
+
+    def _next_batch(self, until):
+        """Sleep until something is due or ``until``; return up to ``batch_size`` ids."""
+        with self._condition:
+            while not self._stopped:
+                now = time.time()
+                due_at = self._heap[0][0] + expiry_delay() if self._heap else until
+                if due_at <= now or until <= now:
+                    break
+                self._condition.wait(min(due_at, until) - now)
+            cutoff = time.time() - expiry_delay()
+            due = []
+            while self._heap and self._heap[0][0] <= cutoff and len(due) < self.batch_size:
+                attempt_id = heapq.heappop(self._heap)[1]
+                self._scheduled.discard(attempt_id)
+                due.append(attempt_id)
+            return due
+
+    def run(self):
+        next_poll = 0
+        while not self._stopped:
+            if time.time() >= next_poll:
+                close_old_connections()
+                try:
+                    self.load()
+                except Exception:
+                    logger.exception("Could not load attempt deadlines")
+                next_poll = time.time() + self.poll_interval
+            due = self._next_batch(next_poll)
+            if not due:
+                continue
+            close_old_connections()
+            try:
+                expire_attempts(due, self.batch_size)
+            except Exception:
+                # The next poll schedules them again.
+                logger.exception("Could not expire %d attempt(s); retrying shortly", len(due))
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
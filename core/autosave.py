@@ -0,0 +1,263 @@
+"""
+Write-behind buffer for in-progress ``StudentAnswer`` writes.
+
+During a live exam every click used to be its own write to
+``studentpanel_studentanswer``.  Autosaves now land in a per-process
+buffer keyed like the table's unique ``(student, exam, question)``
+index, so repeated edits of one question collapse into a single row.
+A background thread flushes the buffer as one batched upsert every
+``AUTOSAVE_FLUSH_INTERVAL`` seconds (default 1) or as soon as
+``AUTOSAVE_BATCH_SIZE`` (default 500) answers are waiting.
+
+If a batch is rejected, its rows are written one at a time so a single
+bad row cannot hold back everyone else's answers.  Rows the database
+rejects while others go through are logged and dropped; when nothing
+goes through (the database is unavailable) the batch is kept and
+retried, and a row is dropped after ``AUTOSAVE_MAX_RETRIES`` (default
+10) failed flushes.
+
+Each worker also keeps a count of the answers it holds per student and
+exam in the shared cache (``AUTOSAVE_CACHE_ALIAS``, default
+``default``).  Submitting an exam flushes this worker's answers and then
+waits, up to ``AUTOSAVE_SUBMIT_WAIT`` seconds (default 5), until that
+count drops to zero, so answers buffered by other workers are stored
+before the submission is recorded.  With a per-process cache the count
+is invisible to other workers, so ``autosave_answer`` writes every
+answer synchronously instead (``AUTOSAVE_CACHE_SHARED`` overrides the
+guess, as in ``core.principal``).  The buffer is flushed on interpreter
+exit.  Servers that stop workers with a signal should also call
+``get_buffer().shutdown()`` from their worker-exit hook (for gunicorn,
+``worker_exit`` in the config file).
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from core import principal
+from studentpanel.models import StudentAnswer
+
+logger = logging.getLogger(__name__)
+
+ANSWER_FIELDS = ('selected_option_id', 'is_true', 'text_answer', 'matching_response')
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTOSAVE_CACHE_ALIAS', 'default')]
+
+
+def cache_is_shared():
+    """True if every worker sees the pending counts of the others."""
+    return principal.is_shared(_cache(), getattr(settings, 'AUTOSAVE_CACHE_SHARED', None))
+
+
+def _pending_key(student_id, exam_id):
+    return f'autosave:pending:{student_id}:{exam_id}'
+
+
+def _count(keys, delta):
+    """Add ``delta`` to the shared pending count of each ``(student, exam, question)``."""
+    cache = _cache()
+    # A count left behind by a worker that died with answers buffered
+    # expires after this long without activity.
+    timeout = getattr(settings, 'AUTOSAVE_PENDING_TIMEOUT', 300)
+    for (student_id, exam_id), count in Counter(key[:2] for key in keys).items():
+        key = _pending_key(student_id, exam_id)
+        try:
+            cache.add(key, 0, timeout)
+            cache.incr(key, delta * count)
+            cache.touch(key, timeout)
+        except Exception:
+            logger.exception("Could not update the pending answer count %s", key)
+
+
+def wait_for_flush(student_id, exam_id, timeout=None):
+    """Wait until no worker holds unsaved answers of this student's exam.
+
+    Flushes this worker's answers first.  Returns ``False`` if answers are
+    still pending elsewhere after ``timeout`` seconds (default
+    ``AUTOSAVE_SUBMIT_WAIT``).
+    """
+    get_buffer().flush(student_id=student_id, exam_id=exam_id)
+    if timeout is None:
+        timeout = getattr(settings, 'AUTOSAVE_SUBMIT_WAIT', 5)
+    key = _pending_key(student_id, exam_id)
+    deadline = time.monotonic() + timeout
+    while (_cache().get(key) or 0) > 0:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+class AnswerBuffer:
+    """Coalescing buffer of pending answers with a background flusher."""
+
+    def __init__(self, flush_interval=1.0, batch_size=500, max_retries=10):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._pending = {}
+        # key -> failed flushes of the value currently pending
+        self._failures = {}
+        self._lock = threading.Lock()
+        # Held for the whole pop-and-write so an older value can never be
+        # written after a newer one for the same key.
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, student_id, exam_id, question_id, **answer):
+        """Buffer an answer; later edits of the same question replace it."""
+        fields = {field: answer.get(field) for field in ANSWER_FIELDS}
+        fields['answered_at'] = timezone.now()
+        key = (student_id, exam_id, question_id)
+        with self._lock:
+            new = key not in self._pending
+            self._pending[key] = fields
+            self._failures.pop(key, None)
+            full = len(self._pending) >= self.batch_size
+        if new:
+            _count([key], 1)
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def flush(self, student_id=None, exam_id=None):
+        """Write pending answers now; optionally only one student's exam.
+
+        Returns the number of rows written.  If no row can be written the
+        answers go back into the buffer (unless newer edits arrived) and
+        the error is raised; rows rejected on their own are dropped.
+        """
+        with self._write_lock:
+            with self._lock:
+                if student_id is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    batch = {
+                        key: self._pending.pop(key) for key in list(self._pending)
+                        if key[0] == student_id and key[1] == exam_id
+                    }
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception:
+                written, failed, error = self._write_rows(batch)
+                if failed and not written:
+                    self._retry(failed)
+                    raise error
+                self._drop(failed)
+                _count([key for key in batch if key not in failed], -1)
+                return written
+            with self._lock:
+                for key in batch:
+                    self._failures.pop(key, None)
+            _count(batch, -1)
+            return len(batch)
+
+    def _write_rows(self, batch):
+        """Write ``batch`` row by row; returns ``(written, failed, last error)``."""
+        written, failed, error = 0, {}, None
+        for key, fields in batch.items():
+            try:
+                self._write({key: fields})
+                written += 1
+            except Exception as exc:
+                failed[key] = fields
+                error = exc
+        return written, failed, error
+
+    def _retry(self, failed):
+        gone = []
+        with self._lock:
+            for key, fields in failed.items():
+                if key in self._pending:
+                    gone.append(key)  # a newer edit replaces the failed one
+                    continue
+                count = self._failures.get(key, 0) + 1
+                if count >= self.max_retries:
+                    self._failures.pop(key, None)
+                    logger.error("Dropping autosaved answer %s after %d failed flushes", key, count)
+                    gone.append(key)
+                    continue
+                self._failures[key] = count
+                self._pending[key] = fields
+        _count(gone, -1)
+
+    def _drop(self, failed):
+        with self._lock:
+            for key in failed:
+                self._failures.pop(key, None)
+        for key, fields in failed.items():
+            logger.error("Dropping autosaved answer %s rejected by the database: %r", key, fields)
+        _count(failed, -1)
+
+    def _write(self, batch):
+        rows = [
+            StudentAnswer(student_id=student_id, exam_id=exam_id, question_id=question_id, **fields)
+            for (student_id, exam_id, question_id), fields in batch.items()
+        ]
+        with transaction.atomic():
+            StudentAnswer.objects.bulk_create(
+                rows,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['student', 'exam', 'question'],
+                update_fields=[*ANSWER_FIELDS, 'answered_at'],
+            )
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped.clear()
+                    self._thread = threading.Thread(target=self._run, name='answer-autosave', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Autosave flush failed; %d answer(s) kept for retry", len(self))
+        close_old_connections()
+
+    def shutdown(self):
+        """Stop the flusher thread and write everything still buffered."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self.flush()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AnswerBuffer(
+                    flush_interval=getattr(settings, 'AUTOSAVE_FLUSH_INTERVAL', 1.0),
+                    batch_size=getattr(settings, 'AUTOSAVE_BATCH_SIZE', 500),
+                    max_retries=getattr(settings, 'AUTOSAVE_MAX_RETRIES', 10),
+                )
+                atexit.register(_buffer.shutdown)
+    return _buffer
@@ -0,0 +1,372 @@
+"""
+Certificate PDF renderer.
+
+This module is imported by the certificate render processes, which may
+be started with ``spawn`` or ``forkserver``, so it must not import
+Django or anything that does: a worker only needs the payload of plain
+values and the font paths it is given.
+
+Text is set in an embedded TrueType font (``/Type0`` with
+``Identity-H``), so names in any script the font covers come out
+right; the font is subset to the glyphs the page uses (unused glyphs
+are emptied, ids are kept) and compressed, which keeps a certificate
+at a few kilobytes.  Fonts must be TrueType outlines (``glyf``);
+collections (``.ttc``) and CFF-flavoured ``.otf`` files are not read.
+Characters are mapped one to one onto glyphs, with no shaping, so
+scripts that need contextual forms (Arabic, Indic) are shown unjoined.
+
+Without a usable font the page falls back to the standard Helvetica
+faces, which only cover Latin-1.
+"""
+import hashlib
+import os
+import struct
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 842, 595  # A4 landscape, in points
+
+# Tried in order when no font is configured.
+FONT_CANDIDATES = (
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/dejavu/DejaVuSans.ttf', '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/TTF/DejaVuSans.ttf', '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf', '/usr/share/fonts/truetype/noto/NotoSans-Bold.ttf'),
+)
+
+# Tables a PDF viewer needs from an embedded TrueType font.
+SUBSET_TABLES = (b'head', b'hhea', b'maxp', b'hmtx', b'loca', b'glyf', b'cvt ', b'fpgm', b'prep')
+
+_fonts = {}
+
+
+def default_fonts():
+    """``(regular, bold)`` paths of the first installed candidate, or ``None``."""
+    for regular, bold in FONT_CANDIDATES:
+        if os.path.exists(regular):
+            return regular, bold if os.path.exists(bold) else regular
+    return None
+
+
+class TrueTypeFont:
+    """The parts of a TrueType file needed to lay out and embed text."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self.data = handle.read()
+        if self.data[:4] not in (b'\x00\x01\x00\x00', b'true'):
+            raise ValueError(f"{path} is not a TrueType font")
+        count = struct.unpack_from('>H', self.data, 4)[0]
+        self.tables = {}
+        for i in range(count):
+            tag, _, offset, length = struct.unpack_from('>4sIII', self.data, 12 + 16 * i)
+            self.tables[tag] = (offset, length)
+        if b'glyf' not in self.tables:
+            raise ValueError(f"{path} has no TrueType outlines")
+
+        head = self.table(b'head')
+        self.units_per_em = struct.unpack_from('>H', head, 18)[0]
+        self.bbox = [self.scale(v) for v in struct.unpack_from('>hhhh', head, 36)]
+        self.long_loca = struct.unpack_from('>h', head, 50)[0] == 1
+        hhea = self.table(b'hhea')
+        ascent, descent = struct.unpack_from('>hh', hhea, 4)
+        self.ascent, self.descent = self.scale(ascent), self.scale(descent)
+        metrics = struct.unpack_from('>H', hhea, 34)[0]
+        self.glyph_count = struct.unpack_from('>H', self.table(b'maxp'), 4)[0]
+        hmtx = self.table(b'hmtx')
+        self.advances = [struct.unpack_from('>H', hmtx, 4 * i)[0] for i in range(metrics)]
+        loca = self.table(b'loca')
+        fmt = '>%dI' % (self.glyph_count + 1) if self.long_loca else '>%dH' % (self.glyph_count + 1)
+        self.loca = list(struct.unpack_from(fmt, loca))
+        if not self.long_loca:
+            self.loca = [offset * 2 for offset in self.loca]
+        self.cmap = self._read_cmap()
+        self.name = self._read_name() or os.path.splitext(os.path.basename(path))[0]
+
+    def table(self, tag):
+        offset, length = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    def scale(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def _read_cmap(self):
+        cmap = self.table(b'cmap')
+        count = struct.unpack_from('>H', cmap, 2)[0]
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack_from('>HHI', cmap, 4 + 8 * i)
+            subtables[(platform, encoding)] = offset
+        for key in ((3, 10), (0, 4), (0, 6), (3, 1), (0, 3), (0, 1), (0, 0)):
+            if key in subtables:
+                offset = subtables[key]
+                fmt = struct.unpack_from('>H', cmap, offset)[0]
+                if fmt == 12:
+                    return self._cmap12(cmap, offset)
+                if fmt == 4:
+                    return self._cmap4(cmap, offset)
+        return {}
+
+    @staticmethod
+    def _cmap4(cmap, offset):
+        segments = struct.unpack_from('>H', cmap, offset + 6)[0] // 2
+        ends = struct.unpack_from('>%dH' % segments, cmap, offset + 14)
+        starts_at = offset + 16 + 2 * segments
+        starts = struct.unpack_from('>%dH' % segments, cmap, starts_at)
+        deltas = struct.unpack_from('>%dh' % segments, cmap, starts_at + 2 * segments)
+        ranges_at = starts_at + 4 * segments
+        ranges = struct.unpack_from('>%dH' % segments, cmap, ranges_at)
+        mapping = {}
+        for i in range(segments):
+            for code in range(starts[i], ends[i] + 1):
+                if code == 0xFFFF:
+                    continue
+                if ranges[i]:
+                    at = ranges_at + 2 * i + ranges[i] + 2 * (code - starts[i])
+                    glyph = struct.unpack_from('>H', cmap, at)[0]
+                    glyph = (glyph + deltas[i]) & 0xFFFF if glyph else 0
+                else:
+                    glyph = (code + deltas[i]) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    @staticmethod
+    def _cmap12(cmap, offset):
+        groups = struct.unpack_from('>I', cmap, offset + 12)[0]
+        mapping = {}
+        for i in range(groups):
+            start, end, glyph = struct.unpack_from('>III', cmap, offset + 16 + 12 * i)
+            for code in range(start, end + 1):
+                mapping[code] = glyph + code - start
+        return mapping
+
+    def _read_name(self):
+        if b'name' not in self.tables:
+            return None
+        name = self.table(b'name')
+        count, strings = struct.unpack_from('>HH', name, 2)
+        for i in range(count):
+            platform, _, _, name_id, length, offset = struct.unpack_from('>HHHHHH', name, 6 + 12 * i)
+            if name_id != 6:
+                continue
+            raw = name[strings + offset:strings + offset + length]
+            text = raw.decode('utf-16-be', 'ignore') if platform in (0, 3) else raw.decode('latin-1')
+            text = ''.join(ch for ch in text if ch.isalnum() or ch in '-_')
+            if text:
+                return text
+        return None
+
+    def glyph(self, char):
+        return self.cmap.get(ord(char), 0)
+
+    def advance(self, glyph):
+        return self.scale(self.advances[min(glyph, len(self.advances) - 1)])
+
+    def _components(self, glyph):
+        start, end = self.loca[glyph], self.loca[glyph + 1]
+        glyf_offset = self.tables[b'glyf'][0]
+        if end <= start or struct.unpack_from('>h', self.data, glyf_offset + start)[0] >= 0:
+            return []
+        components, at = [], glyf_offset + start + 10
+        while True:
+            flags, component = struct.unpack_from('>HH', self.data, at)
+            components.append(component)
+            at += 4 + (4 if flags & 0x1 else 2)
+            at += 2 if flags & 0x8 else 4 if flags & 0x40 else 8 if flags & 0x80 else 0
+            if not flags & 0x20:
+                return components
+
+    def subset(self, glyphs):
+        """The font with every glyph outside ``glyphs`` emptied, ids kept."""
+        keep, todo = set(), [0, *glyphs]
+        while todo:
+            glyph = todo.pop()
+            if glyph in keep or glyph >= self.glyph_count:
+                continue
+            keep.add(glyph)
+            todo.extend(self._components(glyph))
+
+        glyf = self.table(b'glyf')
+        outlines, offsets = bytearray(), []
+        for glyph in range(self.glyph_count):
+            offsets.append(len(outlines))
+            if glyph in keep:
+                outlines += glyf[self.loca[glyph]:self.loca[glyph + 1]]
+                outlines += b'\0' * (-len(outlines) % 4)
+        offsets.append(len(outlines))
+
+        head = bytearray(self.table(b'head'))
+        head[8:12] = b'\0\0\0\0'  # checkSumAdjustment
+        head[50:52] = struct.pack('>h', 1)  # long loca offsets
+        tables = {tag: self.table(tag) for tag in SUBSET_TABLES if tag in self.tables}
+        tables.update({b'head': bytes(head), b'glyf': bytes(outlines),
+                       b'loca': struct.pack('>%dI' % len(offsets), *offsets)})
+        return _sfnt(tables)
+
+
+def _checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack('>%dI' % (len(data) // 4), data)) & 0xFFFFFFFF
+
+
+def _sfnt(tables):
+    tags = sorted(tables)
+    power = 1
+    while power * 2 <= len(tags):
+        power *= 2
+    out = bytearray(struct.pack('>IHHHH', 0x00010000, len(tags), power * 16,
+                                power.bit_length() - 1, len(tags) * 16 - power * 16))
+    offset = 12 + 16 * len(tags)
+    bodies = bytearray()
+    for tag in tags:
+        body = tables[tag]
+        out += struct.pack('>4sIII', tag, _checksum(body), offset + len(bodies), len(body))
+        bodies += body + b'\0' * (-len(body) % 4)
+    return bytes(out + bodies)
+
+
+def load_font(path):
+    """Parse ``path`` once per process."""
+    font = _fonts.get(path)
+    if font is None:
+        font = _fonts[path] = TrueTypeFont(path)
+    return font
+
+
+def _latin1_text(text):
+    text = str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def _lines(payload):
+    certificate_id, student_name, exam_name, score, total_marks, awarded_on = payload
+    return [
+        (True, 34, 430, "Certificate of Achievement"),
+        (False, 16, 370, "This certifies that"),
+        (True, 28, 325, str(student_name)),
+        (False, 16, 280, "has successfully passed"),
+        (True, 22, 240, str(exam_name)),
+        (False, 14, 195, f"Score: {score} / {total_marks}"),
+        (False, 14, 170, f"Awarded on {awarded_on}"),
+        (False, 10, 60, f"Certificate ID: {certificate_id}"),
+    ]
+
+
+def _document(objects):
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _stream(data, extra=b''):
+    return b'<< /Length %d%s >>\nstream\n' % (len(data), extra) + data + b'\nendstream'
+
+
+_BORDER = ['2 w 30 30 782 535 re S', '0.5 w 40 40 762 515 re S']
+
+
+def _render_base14(lines):
+    content = list(_BORDER)
+    for bold, size, y, text in lines:
+        # Helvetica averages about half an em per character.
+        x = max(50, (PAGE_WIDTH - len(text) * size * 0.5) / 2)
+        content.append(f'BT /{"F1" if bold else "F2"} {size} Tf {x:.1f} {y} Td ({_latin1_text(text)}) Tj ET')
+    stream = '\n'.join(content).encode('latin-1')
+    return _document([
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+         f'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>').encode('ascii'),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        _stream(stream),
+    ])
+
+
+def _to_unicode(used):
+    entries = ''.join(f'<{glyph:04X}> <{"".join(f"{b:04X}" for b in _utf16(char))}>\n'
+                      for glyph, char in sorted(used.items()))
+    return (
+        '/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n'
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n'
+        '/CMapName /Adobe-Identity-UCS def /CMapType 2 def\n'
+        '1 begincodespacerange <0000> <FFFF> endcodespacerange\n'
+        f'{len(used)} beginbfchar\n{entries}endbfchar\n'
+        'endcmap CMapName currentdict /CMap defineresource pop end end'
+    ).encode('ascii')
+
+
+def _utf16(char):
+    data = char.encode('utf-16-be')
+    return struct.unpack('>%dH' % (len(data) // 2), data)
+
+
+def _font_objects(font, used, first):
+    """Objects of one embedded Type0 font, numbered from ``first``."""
+    glyphs = sorted(used)
+    tag = ''.join(chr(65 + b % 26) for b in hashlib.sha256(repr(glyphs).encode()).digest()[:6])
+    name = f'{tag}+{font.name}'.encode('ascii', 'ignore')
+    program = font.subset(glyphs)
+    widths = ' '.join(f'{glyph} [{font.advance(glyph)}]' for glyph in glyphs)
+    bbox = ' '.join(str(v) for v in font.bbox)
+    return [
+        b'<< /Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H '
+        b'/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>' % (name, first + 1, first + 4),
+        b'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /%s '
+        b'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> '
+        b'/FontDescriptor %d 0 R /CIDToGIDMap /Identity /W [%s] >>' % (name, first + 2, widths.encode('ascii')),
+        b'<< /Type /FontDescriptor /FontName /%s /Flags 32 /FontBBox [%s] /ItalicAngle 0 '
+        b'/Ascent %d /Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>'
+        % (name, bbox.encode('ascii'), font.ascent, font.descent, font.ascent, first + 3),
+        _stream(zlib.compress(program, 9), b' /Length1 %d /Filter /FlateDecode' % len(program)),
+        _stream(_to_unicode(used)),
+    ]
+
+
+def _render_truetype(lines, regular, bold):
+    faces = {False: regular, True: bold}
+    used = {False: {}, True: {}}
+    content = list(_BORDER)
+    for is_bold, size, y, text in lines:
+        font = faces[is_bold]
+        glyphs = [font.glyph(char) for char in text]
+        for glyph, char in zip(glyphs, text):
+            if glyph:
+                used[is_bold].setdefault(glyph, char)
+        width = sum(font.advance(glyph) for glyph in glyphs) * size / 1000
+        x = max(50, (PAGE_WIDTH - width) / 2)
+        codes = ''.join(f'{glyph:04X}' for glyph in glyphs)
+        content.append(f'BT /{"F1" if is_bold else "F2"} {size} Tf {x:.1f} {y} Td <{codes}> Tj ET')
+    stream = '\n'.join(content).encode('ascii')
+    return _document([
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+         f'/Resources << /Font << /F1 5 0 R /F2 10 0 R >> >> /Contents 4 0 R >>').encode('ascii'),
+        _stream(stream),
+        *_font_objects(bold, used[True], 5),
+        *_font_objects(regular, used[False], 10),
+    ])
+
+
+def render_pdf(payload, fonts=None):
+    """Render one certificate; ``payload`` is a tuple of plain values.
+
+    ``fonts`` is a ``(regular, bold)`` pair of TrueType paths; without
+    it the Latin-1 Helvetica faces are used.  The output depends only on
+    the payload and the fonts (no timestamps), which keeps the content
+    hash stable across re-renders.
+    """
+    lines = _lines(payload)
+    if not fonts:
+        return _render_base14(lines)
+    regular, bold = fonts
+    return _render_truetype(lines, load_font(regular), load_font(bold or regular))
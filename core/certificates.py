@@ -0,0 +1,193 @@
+"""
+Batch certificate pipeline.
+
+``issue_certificates`` runs when an exam's results are published:
+
+1. passers are selected in one aggregate query - submitted students
+   whose summed ``marks_earned`` reaches ``Exam.passing_marks``;
+2. new ``Certificate`` rows get a unique ``certificate_id`` and are
+   inserted in bulk (rows issued earlier are kept);
+3. PDFs are rendered in a process pool (``CERTIFICATE_WORKERS``,
+   default one per CPU) by ``core.certificate_pdf.render_pdf``, a small
+   hand-written PDF writer with no Django imports, in the TrueType
+   fonts ``CERTIFICATE_FONT`` / ``CERTIFICATE_BOLD_FONT`` (default: an
+   installed DejaVu or Noto Sans);
+4. each file is stored once under its SHA-256 in the default storage
+   (``certificates/ab/abcdef....pdf``) and linked to its certificate
+   through ``CertificateFile``.
+
+Rendering is too slow for a web request, so the admin view only runs
+steps 1 and 2 (``assign_passers``); certificates without a file are the
+queue that ``manage.py issue_certificates`` (e.g. from cron) renders.
+
+Students download the stored file, so a request never renders
+anything, and admins can download every certificate of an exam as a
+zip that is streamed while it is being built.
+"""
+import hashlib
+import os
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.certificate_pdf import default_fonts, render_pdf
+from core.streaming import ZipStream
+from studentpanel.models import Certificate, StudentAnswer, Submission
+
+RENDER_BATCH_SIZE = 500
+STORAGE_PREFIX = 'certificates'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class CertificateFile(models.Model):
+    certificate = models.OneToOneField(Certificate, on_delete=models.CASCADE, primary_key=True, related_name='file')
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def path(self):
+        return storage_path(self.sha256)
+
+    def __str__(self):
+        return f"{self.certificate_id}: {self.sha256[:12]}"
+
+
+def storage_path(sha256):
+    return f'{STORAGE_PREFIX}/{sha256[:2]}/{sha256}.pdf'
+
+
+def certificate_fonts():
+    """``(regular, bold)`` TrueType paths for the renderer, or ``None``."""
+    regular = getattr(settings, 'CERTIFICATE_FONT', None)
+    if regular:
+        return regular, getattr(settings, 'CERTIFICATE_BOLD_FONT', None) or regular
+    return default_fonts()
+
+
+def select_passers(exam):
+    """``{student_id: score}`` for every submitted student who passed."""
+    submitted = Submission.objects.filter(exam=exam).values('student_id')
+    return dict(
+        StudentAnswer.objects.filter(exam=exam, student_id__in=submitted)
+        .values('student_id').annotate(score=Sum('marks_earned'))
+        .filter(score__gte=exam.passing_marks)
+        .values_list('student_id', 'score')
+    )
+
+
+def new_certificate_id():
+    return uuid.uuid4().hex
+
+
+def assign_certificates(exam, student_ids):
+    """Create missing certificates for ``student_ids`` and fill in missing ids."""
+    today = timezone.localdate()
+    with transaction.atomic():
+        existing = set(Certificate.objects.filter(exam=exam).values_list('student_id', flat=True))
+        Certificate.objects.bulk_create([
+            Certificate(exam=exam, student_id=student_id, certificate_id=new_certificate_id(), date_awarded=today)
+            for student_id in student_ids if student_id not in existing
+        ], batch_size=RENDER_BATCH_SIZE, ignore_conflicts=True)
+
+        unnumbered = list(Certificate.objects.filter(exam=exam, certificate_id__isnull=True))
+        for certificate in unnumbered:
+            certificate.certificate_id = new_certificate_id()
+        Certificate.objects.bulk_update(unnumbered, ['certificate_id'], batch_size=RENDER_BATCH_SIZE)
+
+
+def store_pdf(data):
+    """Save ``data`` under its content hash unless it is already stored."""
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = storage_path(sha256)
+    if not default_storage.exists(path):
+        saved = default_storage.save(path, ContentFile(data))
+        if saved != path:
+            # Another writer stored the same content first.
+            default_storage.delete(saved)
+    return sha256
+
+
+def assign_passers(exam):
+    """Issue certificates to the passers of ``exam`` without rendering them.
+
+    Returns the passers' scores, ``{student_id: score}``.
+    """
+    scores = select_passers(exam)
+    assign_certificates(exam, scores)
+    return scores
+
+
+def pending_exam_ids():
+    """Exams with certificates that have no rendered file yet."""
+    return list(Certificate.objects.filter(file__isnull=True).values_list('exam_id', flat=True).distinct())
+
+
+def issue_certificates(exam, rerender=False, workers=None):
+    """Issue and render the certificates of every passer of ``exam``.
+
+    Returns ``(issued, rendered)``: how many passers hold a certificate
+    and how many PDFs were rendered this run.
+    """
+    scores = assign_passers(exam)
+
+    certificates = Certificate.objects.filter(exam=exam, student_id__in=list(scores)).select_related('student')
+    if not rerender:
+        certificates = certificates.filter(file__isnull=True)
+
+    workers = workers or getattr(settings, 'CERTIFICATE_WORKERS', None) or os.cpu_count()
+    rendered = 0
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for certificate in certificates.iterator(chunk_size=RENDER_BATCH_SIZE):
+            batch.append(certificate)
+            if len(batch) >= RENDER_BATCH_SIZE:
+                rendered += _render_batch(pool, exam, batch, scores)
+                batch = []
+        if batch:
+            rendered += _render_batch(pool, exam, batch, scores)
+    return len(scores), rendered
+
+
+def _render_batch(pool, exam, certificates, scores):
+    payloads = [
+        (certificate.certificate_id,
+         certificate.student.full_name or certificate.student.get_full_name() or certificate.student.username,
+         exam.exam_name, scores[certificate.student_id], exam.total_marks,
+         certificate.date_awarded.strftime('%d %B %Y'))
+        for certificate in certificates
+    ]
+    files = []
+    render = partial(render_pdf, fonts=certificate_fonts())
+    for certificate, data in zip(certificates, pool.map(render, payloads, chunksize=25)):
+        files.append(CertificateFile(certificate=certificate, sha256=store_pdf(data), size=len(data)))
+    CertificateFile.objects.bulk_create(
+        files, update_conflicts=True, unique_fields=['certificate'], update_fields=['sha256', 'size'],
+    )
+    return len(files)
+
+
+def stream_zip(exam):
+    """Yield a zip of every rendered certificate of ``exam`` piece by piece."""
+    buffer = ZipStream()
+    files = (CertificateFile.objects.filter(certificate__exam=exam)
+             .select_related('certificate__student').order_by('certificate__student__username'))
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for item in files.iterator(chunk_size=RENDER_BATCH_SIZE):
+            name = f"{item.certificate.student.username}-{item.certificate.certificate_id}.pdf"
+            with default_storage.open(item.path, 'rb') as source, archive.open(name, 'w') as target:
+                for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    if buffer.chunks:
+                        yield buffer.drain()
+            if buffer.chunks:
+                yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,66 @@
+"""
+SQLite performance profile applied to every new connection.
+
+The defaults below switch the bundled SQLite database to WAL (readers
+no longer block the writer), relax fsyncs to ``synchronous=NORMAL``,
+enlarge the page cache, memory-map the file and wait on locks instead
+of failing straight away.  Override them globally with
+``SQLITE_PRAGMAS = {...}`` in settings or per database with a
+``'PRAGMAS'`` entry in its ``DATABASES`` block; a value of ``None``
+skips that pragma.
+
+The read replica (``core.db_router``) is a file that ``sync_replica``
+swaps out with ``os.replace``, so it gets ``REPLICA_SQLITE_PRAGMAS`` on
+top: it is never switched to WAL (its -wal/-shm files would belong to
+the previous copy) and its connections are ``query_only``.  Open it
+read-only as well, with a ``file:...?mode=ro`` URI as its ``NAME`` and
+``'OPTIONS': {'uri': True}``; ``sqlite_file`` turns such a name back
+into a path.
+"""
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,       # KiB, i.e. 64 MB
+    'mmap_size': 268435456,     # 256 MB
+    'busy_timeout': 5000,       # ms
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+
+REPLICA_SQLITE_PRAGMAS = {
+    'journal_mode': None,
+    'query_only': 'ON',
+}
+
+
+def sqlite_file(name):
+    """Filesystem path of a SQLite ``NAME``, which may be a ``file:`` URI."""
+    name = str(name)
+    if not name.startswith('file:'):
+        return name
+    return unquote(urlsplit(name).path)
+
+
+def sqlite_pragmas(alias):
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    pragmas.update(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if alias == getattr(settings, 'REPLICA_DATABASE', 'replica'):
+        pragmas.update(REPLICA_SQLITE_PRAGMAS)
+    pragmas.update(settings.DATABASES.get(alias, {}).get('PRAGMAS', {}))
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas(connection.alias).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
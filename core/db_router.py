@@ -0,0 +1,98 @@
+"""
+Read-replica routing for heavy listing and analytics views.
+
+Views decorated with ``@read_replica`` read from the database alias
+named by ``REPLICA_DATABASE`` (default ``'replica'``) when it is
+configured; everything else, and every write, uses ``default``.  After a
+client sends a non-GET request it is pinned to the primary for
+``REPLICA_STICKY_SECONDS`` (default 10) through a cookie, so it always
+reads its own writes even if the replica is behind.
+
+Settings::
+
+    DATABASES = {
+        'default': {..., 'NAME': BASE_DIR / 'db.sqlite3'},
+        'replica': {
+            ...,
+            'NAME': f"file:{BASE_DIR / 'db_replica.sqlite3'}?mode=ro",
+            'OPTIONS': {'uri': True},
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_ROUTERS = ['core.db_router.ReadReplicaRouter']
+    MIDDLEWARE = [..., 'core.db_router.ReplicaStickinessMiddleware']
+
+A second local SQLite file is kept in sync with ``manage.py
+sync_replica`` and opened read-only, without WAL (see ``core.db``).  Importing this module also installs the SQLite
+connection profile from ``core.db``.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+import core.db  # noqa: F401  (connection profile)
+
+STICKY_COOKIE = 'pin_primary'
+
+_use_replica = ContextVar('use_replica', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def read_replica(view_func):
+    """Route the view's reads to the replica unless the client is pinned."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not _pinned.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, never migrated on its own.
+        return db != replica_alias()
+
+
+class ReplicaStickinessMiddleware:
+    """Pin clients that just wrote to the primary for their next reads."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        token = _pinned.set(pinned_until > time.time() or request.method not in ('GET', 'HEAD', 'OPTIONS'))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(STICKY_COOKIE, str(time.time() + seconds), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
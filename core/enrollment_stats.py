@@ -0,0 +1,121 @@
+"""
+Per-exam enrollment counters.
+
+``ExamEnrollmentStats`` holds the number of approved, pending and
+rejected ``ExamEnrollment`` rows for each ``Exam`` so the exam index can
+show them without joining and counting the enrollment table.  Signals
+keep the counters current when enrollments are created, change status
+or are deleted; code that changes statuses with ``QuerySet.update``
+must call ``adjust`` itself.  ``check_enrollment_counters`` recounts.
+"""
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from adminpanel.models import Exam
+from studentpanel.models import ExamEnrollment
+
+# ExamEnrollment.status -> counter column
+STATUS_FIELDS = {
+    'enrolled': 'approved',
+    'pending': 'pending',
+    'rejected': 'rejected',
+}
+
+
+class ExamEnrollmentStats(models.Model):
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True,
+                                related_name='enrollment_stats')
+    approved = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.exam_id}: {self.approved} approved, {self.pending} pending, {self.rejected} rejected"
+
+
+def adjust(exam_id, deltas):
+    """Apply ``{status: delta}`` changes to the counters of one exam.
+
+    A missing row is only created for pure increments.  Decrements find
+    no row when the exam itself is being deleted (the collector removes
+    the counters before the enrollments), and re-creating it there would
+    point at the exam on its way out.
+    """
+    deltas = {status: delta for status, delta in deltas.items() if status in STATUS_FIELDS and delta}
+    changes = {STATUS_FIELDS[status]: F(STATUS_FIELDS[status]) + delta for status, delta in deltas.items()}
+    if not changes:
+        return
+    with transaction.atomic():
+        if not ExamEnrollmentStats.objects.filter(exam_id=exam_id).update(**changes):
+            if any(delta < 0 for delta in deltas.values()):
+                return
+            ExamEnrollmentStats.objects.get_or_create(exam_id=exam_id)
+            ExamEnrollmentStats.objects.filter(exam_id=exam_id).update(**changes)
+
+
+@receiver(post_init, sender=ExamEnrollment)
+def remember_status(sender, instance, **kwargs):
+    instance._counted = (instance.exam_id, instance.status)
+
+
+@receiver(post_save, sender=ExamEnrollment)
+def count_saved_enrollment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.exam_id, instance.status)
+    if created:
+        adjust(instance.exam_id, {instance.status: 1})
+    elif current != instance._counted:
+        old_exam_id, old_status = instance._counted
+        adjust(old_exam_id, {old_status: -1})
+        adjust(instance.exam_id, {instance.status: 1})
+    instance._counted = current
+
+
+@receiver(post_delete, sender=ExamEnrollment)
+def count_deleted_enrollment(sender, instance, **kwargs):
+    exam_id, status = instance._counted
+    adjust(exam_id, {status: -1})
+
+
+def actual_counts():
+    """Recount ``{exam_id: {status: n}}`` from the enrollment table."""
+    counts = {}
+    for row in ExamEnrollment.objects.values('exam_id', 'status').annotate(n=Count('id')):
+        counts.setdefault(row['exam_id'], Counter())[row['status']] = row['n']
+    return counts
+
+
+def find_drift():
+    """Return ``{exam_id: (stored, actual)}`` for exams whose counters are wrong."""
+    actual = actual_counts()
+    stored = {
+        row.exam_id: {'enrolled': row.approved, 'pending': row.pending, 'rejected': row.rejected}
+        for row in ExamEnrollmentStats.objects.all()
+    }
+    drift = {}
+    for exam_id in set(actual) | set(stored):
+        expected = {status: actual.get(exam_id, {}).get(status, 0) for status in STATUS_FIELDS}
+        current = stored.get(exam_id, dict.fromkeys(STATUS_FIELDS, 0))
+        if expected != current:
+            drift[exam_id] = (current, expected)
+    return drift
+
+
+@transaction.atomic
+def rebuild():
+    """Replace every counter row with a fresh recount."""
+    ExamEnrollmentStats.objects.all().delete()
+    ExamEnrollmentStats.objects.bulk_create([
+        ExamEnrollmentStats(
+            exam_id=exam_id,
+            approved=counts.get('enrolled', 0),
+            pending=counts.get('pending', 0),
+            rejected=counts.get('rejected', 0),
+        )
+        for exam_id, counts in actual_counts().items()
+    ])
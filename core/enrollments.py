@@ -0,0 +1,211 @@
+"""
+Bulk enrollment decisions and auto-approval rules.
+
+``decide`` moves pending ``ExamEnrollment`` or ``ExaminerExamEnrollment``
+rows to ``enrolled`` or ``rejected`` a batch at a time.  Every batch is
+one conditional ``UPDATE ... WHERE id IN (...) AND status = 'pending'``,
+so rows another admin already decided are left alone and the returned
+count is exactly what changed.  Admin exam counters in
+``core.enrollment_stats`` are adjusted by the same counts.
+
+Auto-approval rules are applied when an enrollment is created, per exam
+(``'exam:<id>'`` / ``'examination:<id>'``) or for every exam
+(``'default'``).  A pending enrollment is approved if any rule matches
+its student; a rule matches when all of its conditions hold::
+
+    ENROLLMENT_AUTO_APPROVAL = {
+        'default': [{'field': 'email', 'endswith': '@school.ac.ke'}],
+        'exam:12': [{'field': 'student_id', 'in': ['S1001', 'S1002']}],
+        'examination:3': [{'field': 'student_id', 'startswith': 'BSC'}],
+    }
+
+Conditions: ``equals``, ``in``, ``startswith``, ``endswith`` and
+``regex`` (Python ``re.search``).  String comparisons ignore case.
+
+Rules only ever read the student fields they name: the ``pre_save``
+hook uses the student already attached to the enrollment or loads just
+those fields by ``student_id``, and code that creates many enrollments
+calls ``apply_rules`` to look up every student in one query first.
+"""
+import re
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+from core import enrollment_stats
+from core.models import CustomUser
+from studentpanel.models import ExamEnrollment, ExaminerExamEnrollment
+
+ENROLLED, PENDING, REJECTED = 'enrolled', 'pending', 'rejected'
+DECISIONS = {'approve': ENROLLED, 'reject': REJECTED}
+BATCH_SIZE = 1000
+
+KINDS = {'exam': ExamEnrollment, 'examination': ExaminerExamEnrollment}
+
+
+def pending_enrollments(model, exam_id, search=None):
+    """Pending enrollments of one exam, optionally filtered by student."""
+    queryset = model.objects.filter(exam_id=exam_id, status=PENDING)
+    if search:
+        queryset = queryset.filter(
+            Q(student__username__icontains=search) | Q(student__full_name__icontains=search)
+            | Q(student__email__icontains=search) | Q(student__student_id__icontains=search)
+        )
+    return queryset
+
+
+def decide(queryset, status, batch_size=BATCH_SIZE):
+    """Move the pending rows of ``queryset`` to ``status``; returns the count moved."""
+    model = queryset.model
+    # Snapshot the ids first; the updates below change what the filter matches.
+    ids = list(queryset.filter(status=PENDING).order_by('id').values_list('id', 'exam_id'))
+    moved = 0
+    for start in range(0, len(ids), batch_size):
+        by_exam = {}
+        for enrollment_id, exam_id in ids[start:start + batch_size]:
+            by_exam.setdefault(exam_id, []).append(enrollment_id)
+        for exam_id, batch in by_exam.items():
+            with transaction.atomic():
+                count = model.objects.filter(id__in=batch, status=PENDING).update(status=status)
+                if count and model is ExamEnrollment:
+                    enrollment_stats.adjust(exam_id, {PENDING: -count, status: count})
+            moved += count
+    return moved
+
+
+def decide_from_post(model, exam_id, data):
+    """Apply a bulk decision posted from an exam page.
+
+    ``data`` holds ``action`` (``approve`` / ``reject``) and either
+    ``enrollment_ids`` (a list) or ``scope=all`` plus an optional
+    ``search`` to act on every pending enrollment matching the filter.
+    Returns ``(status, moved)``; raises ``ValueError`` on bad input.
+    """
+    status = DECISIONS.get(data.get('action'))
+    if status is None:
+        raise ValueError("Unknown action.")
+    queryset = pending_enrollments(model, exam_id, data.get('search'))
+    if data.get('scope') != 'all':
+        try:
+            ids = [int(value) for value in data.getlist('enrollment_ids')]
+        except ValueError:
+            raise ValueError("Invalid enrollment id.")
+        if not ids:
+            raise ValueError("No enrollments selected.")
+        queryset = queryset.filter(id__in=ids)
+    return status, decide(queryset, status)
+
+
+def bulk_decision_response(request, model, exam, redirect_to):
+    """Run ``decide_from_post`` for an exam page and answer as JSON or a redirect.
+
+    Shared by the admin and examiner bulk approve/reject views;
+    ``redirect_to`` is the URL name of the exam page.
+    """
+    is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    try:
+        status, moved = decide_from_post(model, exam.id, request.POST)
+    except ValueError as exc:
+        if is_ajax:
+            return JsonResponse({'error': str(exc)}, status=400)
+        messages.error(request, str(exc))
+        return redirect(redirect_to, exam_id=exam.id)
+
+    if is_ajax:
+        return JsonResponse({'status': status, 'updated': moved})
+    verb = 'approved' if status == ENROLLED else 'rejected'
+    messages.success(request, f"{moved} enrollment(s) {verb} for {exam.exam_name}.")
+    return redirect(redirect_to, exam_id=exam.id)
+
+
+def _rules(kind, exam_id):
+    config = getattr(settings, 'ENROLLMENT_AUTO_APPROVAL', {})
+    return config.get(f'{kind}:{exam_id}', config.get('default', ()))
+
+
+def has_rules(kind, exam_id):
+    return bool(_rules(kind, exam_id))
+
+
+def _as_text(value):
+    return '' if value is None else str(value).lower()
+
+
+def _rule_fields(rules):
+    return {rule['field'] for rule in rules if rule.get('field')}
+
+
+def _students(rules, student_ids):
+    """``{student_id: {field: value}}`` with only the fields ``rules`` read, in one query."""
+    fields = _rule_fields(rules)
+    if not fields:
+        return {}
+    rows = CustomUser.objects.filter(id__in=set(student_ids)).values('id', *fields)
+    return {row.pop('id'): row for row in rows}
+
+
+def _field(student, name):
+    if isinstance(student, dict):
+        return student.get(name)
+    return getattr(student, name, None)
+
+
+def rule_matches(rule, student):
+    """``student`` is a user or a ``{field: value}`` dict of the fields rules read."""
+    value = _as_text(_field(student, rule.get('field', '')))
+    checks = {
+        'equals': lambda expected: value == _as_text(expected),
+        'in': lambda expected: value in {_as_text(item) for item in expected},
+        'startswith': lambda expected: value.startswith(_as_text(expected)),
+        'endswith': lambda expected: value.endswith(_as_text(expected)),
+        'regex': lambda expected: re.search(expected, value, re.IGNORECASE) is not None,
+    }
+    conditions = [(name, expected) for name, expected in rule.items() if name in checks]
+    return bool(conditions) and all(checks[name](expected) for name, expected in conditions)
+
+
+def auto_approves(kind, exam_id, student):
+    return any(rule_matches(rule, student) for rule in _rules(kind, exam_id))
+
+
+def apply_rules(kind, exam_id, rows):
+    """Approve the pending, unsaved enrollments in ``rows`` that a rule matches.
+
+    Every student is looked up in a single query, and the rows are
+    marked so ``pre_save`` does not check them again one by one.
+    """
+    rules = _rules(kind, exam_id)
+    pending = [row for row in rows if row.status == PENDING]
+    students = _students(rules, [row.student_id for row in pending]) if rules and pending else {}
+    for row in pending:
+        if any(rule_matches(rule, students.get(row.student_id, {})) for rule in rules):
+            row.status = ENROLLED
+    for row in rows:
+        row._auto_approval_checked = True
+    return rows
+
+
+@receiver(pre_save, sender=ExamEnrollment)
+@receiver(pre_save, sender=ExaminerExamEnrollment)
+def apply_auto_approval(sender, instance, raw=False, **kwargs):
+    if raw or not instance._state.adding or instance.status != PENDING:
+        return
+    if getattr(instance, '_auto_approval_checked', False):
+        return
+    kind = 'exam' if sender is ExamEnrollment else 'examination'
+    rules = _rules(kind, instance.exam_id)
+    if not rules:
+        return
+    if sender.student.is_cached(instance):
+        student = instance.student
+    else:
+        # Only the fields the rules read, instead of the whole user row.
+        student = _students(rules, [instance.student_id]).get(instance.student_id, {})
+    if any(rule_matches(rule, student) for rule in rules):
+        instance.status = ENROLLED
@@ -0,0 +1,271 @@
+"""
+Student-facing exam endpoints on the hot exam-day path.
+
+These views answer with small JSON payloads and avoid per-request
+database work wherever the data can be cached: the paper itself comes
+from ``core.paper_cache``, the student is authorized from the session
+principal (``core.principal``) without loading the user row, and a
+student's access to an exam is checked against the database, then
+remembered in the session for up to a minute.  The current attempt and
+its deadline (``core.attempts``) are remembered there too, and the
+answer and submit paths compare them against the clock.  Neither the waiting room nor the paper is reachable before
+the exam's ``exam_date`` and ``start_time``.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, Http404, JsonResponse
+from django.views.decorators.http import require_POST
+
+from core.principal import role_required
+from core import admission, attempts, autosave, live_monitor, paper_cache
+from core.autosave import ANSWER_FIELDS, get_buffer
+from core.certificates import CertificateFile
+from core.paper_generator import generate_paper
+from studentpanel.models import Certificate, ExamEnrollment, ExaminerExamEnrollment, Submission
+
+ENROLLMENT_MODELS = {
+    paper_cache.EXAM: ExamEnrollment,
+    paper_cache.EXAMINATION: ExaminerExamEnrollment,
+}
+
+
+def has_exam_access(request, kind, exam_id):
+    """True if the student is enrolled.
+
+    A positive check is remembered in the session for
+    ``EXAM_ACCESS_RECHECK_SECONDS`` (default 60), after which the
+    enrollment is read again, so a revoked or cancelled enrollment loses
+    access within that window.
+    """
+    granted = request.session.get('exam_access')
+    if not isinstance(granted, dict):
+        granted = {}
+    token = f'{kind}:{exam_id}'
+    now = time.time()
+    if now - granted.get(token, 0) < getattr(settings, 'EXAM_ACCESS_RECHECK_SECONDS', 60):
+        return True
+    enrolled = ENROLLMENT_MODELS[kind].objects.filter(
+        exam_id=exam_id, student_id=request.principal.id, status='enrolled'
+    ).exists()
+    if enrolled:
+        granted[token] = now
+    else:
+        granted.pop(token, None)
+    request.session['exam_access'] = granted
+    return enrolled
+
+
+@role_required('STUDENT')
+@require_POST
+def start_exam(request, kind, exam_id):
+    """Admit the student through the exam's waiting room and start the clock.
+
+    ``role_required`` has already loaded the session and principal.
+    Enrollment is checked before the waiting room, so students who are
+    not enrolled never take a token; the check is remembered in the
+    session for a while, so a queued student's retries are mostly
+    answered from the session and process memory.  The exam timer only
+    starts once the student is admitted.
+    """
+    if kind not in paper_cache.KINDS:
+        raise Http404("Unknown exam type.")
+    if not has_exam_access(request, kind, exam_id):
+        return JsonResponse({'error': 'Not enrolled in this exam.'}, status=403)
+    try:
+        if not paper_cache.has_opened(kind, exam_id):
+            return JsonResponse({'error': 'This exam has not started yet.'}, status=403)
+    except paper_cache.KINDS[kind].DoesNotExist:
+        raise Http404("Exam not found.")
+
+    result = admission.admit(f'{kind}:{exam_id}', request.principal.id, request.POST.get('ticket'))
+    if not result.admitted:
+        response = JsonResponse({
+            'admitted': False,
+            'position': result.position,
+            'retry_after': result.retry_after,
+            'ticket': result.ticket,
+            'message': f"You are #{result.position} in the queue, retry in {result.retry_after} s.",
+        }, status=429)
+        response['Retry-After'] = str(result.retry_after)
+        return response
+
+    # Only this browser's own attempt counts as resuming it.
+    state = attempts.current(request, kind, exam_id, rebuild=False)
+    try:
+        attempt, created = attempts.start_attempt(kind, exam_id, request.principal.id,
+                                                  resume_id=state[0] if state else None)
+    except paper_cache.KINDS[kind].DoesNotExist:
+        raise Http404("Exam not found.")
+    except attempts.AttemptError as exc:
+        return JsonResponse({'error': str(exc)}, status=409)
+    attempts.remember(request, kind, exam_id, attempt)
+    if created:
+        live_monitor.record_start(kind, exam_id, request.principal.id)
+
+    started_key = f'exam_started_{kind}_{exam_id}'
+    request.session[started_key] = attempt.started_at.isoformat()
+    return JsonResponse({
+        'admitted': True,
+        'started_at': request.session[started_key],
+        'attempt': attempt.number,
+        'deadline': attempt.deadline.isoformat() if attempt.deadline else None,
+        'seconds_left': attempts.seconds_left(attempts.current(request, kind, exam_id)),
+    })
+
+
+@role_required('STUDENT')
+def exam_paper(request, kind, exam_id):
+    """The student's paper, only once the exam is open and their attempt started."""
+    if kind not in paper_cache.KINDS:
+        raise Http404("Unknown exam type.")
+    if not has_exam_access(request, kind, exam_id):
+        return HttpResponse(status=403)
+    try:
+        if not paper_cache.has_opened(kind, exam_id):
+            return HttpResponse(status=403)
+    except paper_cache.KINDS[kind].DoesNotExist:
+        raise Http404("Exam not found.")
+    state = attempts.current(request, kind, exam_id)
+    if state is None:
+        return HttpResponse(status=403)
+
+    attempt = request.session.get(f'exam_attempt_{kind}_{exam_id}', 1)
+    question_ids = attempts.paper_question_ids(request, kind, exam_id, state)
+    try:
+        paper = generate_paper(kind, exam_id, request.principal.id, attempt, question_ids)
+        if state is not None and question_ids is None:
+            # Keep this selection for resume and grading, whatever happens
+            # to the question bank later.
+            drawn = [question['id'] for question in paper['questions']]
+            stored = attempts.store_question_ids(request, kind, exam_id, state, drawn)
+            if stored != drawn:
+                paper = generate_paper(kind, exam_id, request.principal.id, attempt, stored)
+    except paper_cache.KINDS[kind].DoesNotExist:
+        raise Http404("Exam not found.")
+
+    response = JsonResponse(paper)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def clean_answer(exam_id, data):
+    """Return ``(question_id, fields)`` for an autosave, or raise ``ValueError``.
+
+    The question and the selected option must belong to the exam's
+    compiled paper, so a bad id never reaches the shared buffer.
+    """
+    try:
+        question_id = int(data['question_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Expected JSON with a question_id.")
+    options = paper_cache.get_answer_index(paper_cache.EXAM, exam_id).get(question_id)
+    if options is None:
+        raise ValueError("This question is not on the exam paper.")
+
+    fields = {field: data.get(field) for field in ANSWER_FIELDS}
+    option_id = fields['selected_option_id']
+    if option_id is not None:
+        if isinstance(option_id, bool) or not isinstance(option_id, (int, str)):
+            raise ValueError("Invalid selected_option_id.")
+        try:
+            option_id = int(option_id)
+        except ValueError:
+            raise ValueError("Invalid selected_option_id.")
+        if option_id not in options:
+            raise ValueError("This option does not belong to the question.")
+        fields['selected_option_id'] = option_id
+    if fields['is_true'] is not None and not isinstance(fields['is_true'], bool):
+        raise ValueError("is_true must be true, false or null.")
+    if fields['text_answer'] is not None and not isinstance(fields['text_answer'], str):
+        raise ValueError("text_answer must be a string.")
+    if fields['matching_response'] is not None and not isinstance(fields['matching_response'], (dict, list)):
+        raise ValueError("matching_response must be an object or a list.")
+    return question_id, fields
+
+
+@role_required('STUDENT')
+@require_POST
+def autosave_answer(request, exam_id):
+    """Buffer one answer; it reaches the database on the next flush."""
+    if not has_exam_access(request, paper_cache.EXAM, exam_id):
+        return JsonResponse({'error': 'Not enrolled in this exam.'}, status=403)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object.")
+        question_id, fields = clean_answer(exam_id, data)
+    except paper_cache.KINDS[paper_cache.EXAM].DoesNotExist:
+        raise Http404("Exam not found.")
+    except ValueError as exc:
+        # json.JSONDecodeError is a ValueError too.
+        return JsonResponse({'error': str(exc)}, status=400)
+    # The deadline is checked against the session copy; no query.
+    state = attempts.current(request, paper_cache.EXAM, exam_id)
+    if state is None:
+        return JsonResponse({'error': 'Start the exam first.'}, status=409)
+    if attempts.is_expired(state) or state[2] not in attempts.OPEN:
+        return JsonResponse({'error': 'This attempt is over.'}, status=409)
+
+    get_buffer().put(request.principal.id, exam_id, question_id, **fields)
+    if attempts.near_deadline(state) or not autosave.cache_is_shared():
+        # The auto-submission runs in another process and cannot see this
+        # worker's buffer, so late answers are stored before replying; so
+        # is every answer when a submit on another worker could not wait
+        # for this one.
+        try:
+            get_buffer().flush(student_id=request.principal.id, exam_id=exam_id)
+        except Exception:
+            return JsonResponse({'error': 'Could not save the answer, please retry.'}, status=503)
+    live_monitor.record_answer(paper_cache.EXAM, exam_id, request.principal.id, question_id)
+    attempts.mark_in_progress(request, paper_cache.EXAM, exam_id)
+    return JsonResponse({'saved': True, 'seconds_left': attempts.seconds_left(state)}, status=202)
+
+
+@role_required('STUDENT')
+@require_POST
+def submit_exam(request, exam_id):
+    if not has_exam_access(request, paper_cache.EXAM, exam_id):
+        return JsonResponse({'error': 'Not enrolled in this exam.'}, status=403)
+
+    state = attempts.current(request, paper_cache.EXAM, exam_id)
+    if state is None:
+        return JsonResponse({'error': 'Start the exam first.'}, status=409)
+    if attempts.is_expired(state):
+        # Time ran out: the attempt is auto-submitted with the answers saved
+        # before the deadline, whether or not the scheduler got there first.
+        attempts.expire_attempts([state[0]], delay=attempts.grace_seconds())
+        attempts.finish(request, paper_cache.EXAM, exam_id)
+        submission = Submission.objects.filter(student_id=request.principal.id, exam_id=exam_id).first()
+        return JsonResponse({'submitted': True, 'expired': True,
+                             'submitted_at': submission.submitted_at if submission else None})
+
+    # Every buffered answer of this student, on any worker, must be
+    # stored before the submission exists.
+    if not autosave.wait_for_flush(request.principal.id, exam_id):
+        return JsonResponse({'error': 'Your answers are still being saved, please retry.'}, status=503)
+    submission, created = Submission.objects.get_or_create(student_id=request.principal.id, exam_id=exam_id)
+    attempts.finish(request, paper_cache.EXAM, exam_id)
+    live_monitor.record_submit(paper_cache.EXAM, exam_id, request.principal.id)
+    return JsonResponse({'submitted': True, 'submitted_at': submission.submitted_at, 'already_submitted': not created})
+
+
+@role_required('STUDENT')
+def certificate_download(request, certificate_id):
+    """Serve the pre-rendered certificate PDF; nothing is rendered here."""
+    stored = CertificateFile.objects.filter(
+        certificate__certificate_id=certificate_id, certificate__student_id=request.principal.id
+    ).first()
+    if stored is None:
+        if Certificate.objects.filter(certificate_id=certificate_id, student_id=request.principal.id).exists():
+            return JsonResponse({'error': 'This certificate is still being prepared.'}, status=404)
+        raise Http404("Certificate not found.")
+
+    response = FileResponse(default_storage.open(stored.path, 'rb'), content_type='application/pdf',
+                            as_attachment=True, filename=f"certificate-{certificate_id}.pdf")
+    # The path is a content hash, so the bytes never change.
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    response['ETag'] = f'"{stored.sha256}"'
+    return response
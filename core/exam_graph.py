@@ -0,0 +1,167 @@
+"""
+Read-only loader for an exam together with everything hanging off it.
+
+``load_exam_graph`` fetches an ``Exam`` (admin) or ``Examination``
+(examiner) with all of its questions, options, matching pairs,
+true/false answers and enrollments in a fixed number of queries (one per
+table) and returns plain named tuples.  The admin and examiner exam
+pages and the student paper renderer all share it, so none of them
+touch related managers from templates.
+
+The nodes keep the parts of the model API the exam templates use:
+``question.image.url``, ``question.options.all`` (and ``pairs.all``)
+and ``question.get_question_type_display``.
+"""
+from collections import namedtuple
+
+from django.core.files.storage import default_storage
+
+from core.images import variant_map
+from core.models import Question, Option, MatchingPair, TrueFalseAnswer
+from examinerpanel.models import Examination
+from studentpanel.models import ExamEnrollment, ExaminerExamEnrollment
+
+ExamGraph = namedtuple('ExamGraph', 'exam questions total_marks enrollments')
+
+
+class NodeList(tuple):
+    """Tuple of child nodes that also answers ``.all`` and ``.count`` like a manager."""
+
+    def all(self):
+        return self
+
+    def count(self):
+        return len(self)
+
+
+class ImageNode(namedtuple('ImageNode', 'name url')):
+    """Stands in for the ``FieldFile``; false when the question has no image."""
+
+    def __bool__(self):
+        return bool(self.name)
+
+    def __str__(self):
+        return self.name
+
+
+class QuestionNode(namedtuple('QuestionNode', [
+    'id', 'question_type', 'text', 'marks', 'image', 'image_url', 'thumbnail_url', 'tags',
+    'difficulty_level', 'explanation', 'essay_instructions', 'created_at',
+    'options', 'pairs', 'true_false',
+])):
+    __slots__ = ()
+
+    def get_question_type_display(self):
+        return _question_type_labels().get(self.question_type, self.question_type)
+
+
+OptionNode = namedtuple('OptionNode', 'id text is_correct')
+PairNode = namedtuple('PairNode', 'id left_text right_text')
+EnrollmentNode = namedtuple('EnrollmentNode', 'id status enrolled_at is_active student')
+StudentNode = namedtuple('StudentNode', 'id username first_name last_name full_name email student_id')
+
+QUESTION_FIELDS = (
+    'id', 'question_type', 'text', 'marks', 'image', 'tags', 'difficulty_level',
+    'explanation', 'essay_instructions', 'created_at',
+)
+
+
+_type_labels = None
+
+
+def _question_type_labels():
+    global _type_labels
+    if _type_labels is None:
+        _type_labels = dict(Question._meta.get_field('question_type').flatchoices)
+    return _type_labels
+
+
+def _question_lookup(exam):
+    """Return the ``Question`` filter prefix for this kind of exam."""
+    return 'examination' if isinstance(exam, Examination) else 'exam'
+
+
+def load_exam_graph(exam, with_enrollments=True, question_ids=None):
+    """Load ``exam`` and its whole question / enrollment graph.
+
+    Issues one query each for questions, image variants, options, pairs,
+    true/false answers and (optionally) enrollments with their students, whatever
+    the size of the exam.  Questions are ordered newest first, matching
+    the exam pages.  ``question_ids`` limits the graph to those questions
+    (a page of them); ``total_marks`` then only covers that page.
+    """
+    lookup = _question_lookup(exam)
+    if question_ids is None:
+        children = {f'question__{lookup}': exam}
+        question_filter = {lookup: exam}
+    else:
+        question_ids = list(question_ids)
+        children = {'question_id__in': question_ids}
+        question_filter = {lookup: exam, 'id__in': question_ids}
+
+    options, pairs, answers = {}, {}, {}
+    for question_id, option_id, text, is_correct in (
+            Option.objects.filter(**children)
+            .order_by('id').values_list('question_id', 'id', 'text', 'is_correct')):
+        options.setdefault(question_id, []).append(OptionNode(option_id, text, is_correct))
+    for question_id, pair_id, left, right in (
+            MatchingPair.objects.filter(**children)
+            .order_by('id').values_list('question_id', 'id', 'left_text', 'right_text')):
+        pairs.setdefault(question_id, []).append(PairNode(pair_id, left, right))
+    for question_id, is_true in (
+            TrueFalseAnswer.objects.filter(**children)
+            .values_list('question_id', 'is_true')):
+        answers[question_id] = is_true
+
+    rows = list(Question.objects.filter(**question_filter)
+                .order_by('-created_at', '-id').values(*QUESTION_FIELDS))
+    # Resized variants where they exist, the original upload otherwise.
+    variants = variant_map({row['image'] for row in rows})
+
+    questions = []
+    for row in rows:
+        question_id = row['id']
+        name = row.pop('image') or ''
+        original = default_storage.url(name) if name else ''
+        sized = variants.get(name, {})
+        questions.append(QuestionNode(
+            image=ImageNode(name, original),
+            image_url=sized.get('exam', original),
+            thumbnail_url=sized.get('thumb', original),
+            options=NodeList(options.get(question_id, ())),
+            pairs=NodeList(pairs.get(question_id, ())),
+            true_false=answers.get(question_id),
+            **row,
+        ))
+
+    enrollments = ()
+    if with_enrollments:
+        enrollments = tuple(load_enrollments(exam))
+
+    return ExamGraph(
+        exam=exam,
+        questions=tuple(questions),
+        total_marks=sum(question.marks for question in questions),
+        enrollments=enrollments,
+    )
+
+
+def load_enrollments(exam):
+    """Yield ``EnrollmentNode``s for ``exam``, newest first, in one query."""
+    model = ExaminerExamEnrollment if isinstance(exam, Examination) else ExamEnrollment
+    rows = model.objects.filter(exam=exam).order_by('-enrolled_at').values_list(
+        'id', 'status', 'enrolled_at', 'student_id', 'student__username',
+        'student__first_name', 'student__last_name', 'student__email', 'student__student_id',
+    )
+    for (enrollment_id, status, enrolled_at, student_id, username,
+         first_name, last_name, email, student_number) in rows:
+        student = StudentNode(
+            id=student_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            full_name=f"{first_name} {last_name}",
+            email=email,
+            student_id=student_number,
+        )
+        yield EnrollmentNode(enrollment_id, status, enrolled_at, status == 'enrolled', student)
@@ -0,0 +1,213 @@
+"""
+Batch auto-grading of ``StudentAnswer`` rows.
+
+``grade_exam`` loads the answer key of every question answered in an
+exam into NumPy arrays indexed by question, then streams the exam's
+answers in chunks and scores each chunk in one vectorized pass:
+
+* MCQ        - the selected option is a correct option of that same question;
+* TRUE_FALSE - ``is_true`` equals the question's ``TrueFalseAnswer``;
+* MATCHING   - every pair is matched to its right-hand text.
+
+Answers to questions that were not on the student's paper (the
+selection stored on their ``ExamAttempt``) earn nothing.  Essay answers
+are left for manual marking.  Wrong answers cost a
+fraction of the question's marks when negative marking is on.  Answers are
+read by id range and each chunk's ``bulk_update`` commits on its own,
+so SQLite's write lock is never held for the whole exam.  Submissions
+are flagged ``is_marked`` once none of their essay answers is still
+waiting for a mark (``is_correct`` unset).
+"""
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+
+from core.attempts import ExamAttempt
+from core.models import Question, Option, MatchingPair, TrueFalseAnswer
+from core.paper_cache import EXAM
+from studentpanel.models import StudentAnswer, Submission
+
+READ_CHUNK_SIZE = 50000
+WRITE_BATCH_SIZE = 1000
+
+# Question type codes used in the key arrays
+OTHER, MCQ, TRUE_FALSE, MATCHING = 0, 1, 2, 3
+TYPE_CODES = {'MCQ': MCQ, 'TRUE_FALSE': TRUE_FALSE, 'MATCHING': MATCHING}
+
+
+class GradingReport:
+    def __init__(self):
+        self.graded = 0
+        self.correct = 0
+        self.submissions_marked = 0
+
+    def __str__(self):
+        return (f"{self.graded} answer(s) graded, {self.correct} correct, "
+                f"{self.submissions_marked} submission(s) marked")
+
+
+class AnswerKey:
+    """Answer key for a set of questions, laid out for vectorized lookups."""
+
+    def __init__(self, question_ids):
+        rows = list(Question.objects.filter(id__in=question_ids)
+                    .order_by('id').values_list('id', 'question_type', 'marks'))
+        self.question_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.types = np.array([TYPE_CODES.get(row[1], OTHER) for row in rows], dtype=np.int8)
+        self.marks = np.array([row[2] for row in rows], dtype=np.int64)
+
+        # Correct options sorted by id, with the question each belongs to.
+        correct = sorted(Option.objects.filter(question_id__in=question_ids, is_correct=True)
+                         .values_list('id', 'question_id'))
+        self.correct_options = np.array([row[0] for row in correct], dtype=np.int64)
+        self.correct_option_questions = np.array([row[1] for row in correct], dtype=np.int64)
+
+        # 1 = true, 0 = false, -1 = no key
+        self.true_false = np.full(len(rows), -1, dtype=np.int8)
+        for question_id, is_true in (TrueFalseAnswer.objects.filter(question_id__in=question_ids)
+                                     .values_list('question_id', 'is_true')):
+            self.true_false[self.index([question_id])[0]] = int(is_true)
+
+        # Matching keys accept either the pair id or the left text as key.
+        self.matching = {}
+        for question_id, pair_id, left, right in (MatchingPair.objects.filter(question_id__in=question_ids)
+                                                   .values_list('question_id', 'id', 'left_text', 'right_text')):
+            self.matching.setdefault(question_id, []).append((str(pair_id), left, right))
+
+    def index(self, question_ids):
+        return np.searchsorted(self.question_ids, question_ids)
+
+    def mcq_correct(self, question_ids, selected):
+        """True where ``selected`` is a correct option of the matching question."""
+        if not len(self.correct_options):
+            return np.zeros(len(selected), dtype=bool)
+        position = np.minimum(np.searchsorted(self.correct_options, selected), len(self.correct_options) - 1)
+        return ((self.correct_options[position] == selected)
+                & (self.correct_option_questions[position] == question_ids))
+
+    def matching_correct(self, question_id, response):
+        pairs = self.matching.get(question_id)
+        if not pairs or not response:
+            return False
+        if isinstance(response, list):
+            response = {item.get('left'): item.get('right') for item in response if isinstance(item, dict)}
+        if not isinstance(response, dict):
+            return False
+        return all(
+            response.get(pair_id, response.get(left)) == right
+            for pair_id, left, right in pairs
+        )
+
+
+def score_chunk(key, question_ids, selected, is_true, matching, negative_ratio=0.0):
+    """Score one chunk of answers.
+
+    ``selected`` uses -1 for "no option" and ``is_true`` uses -1 for
+    "no answer".  Returns ``(gradable, is_correct, marks_earned)`` arrays;
+    rows with ``gradable`` False (essays, unknown types) must not be
+    written back.
+    """
+    q_index = key.index(question_ids)
+    types = key.types[q_index]
+    marks = key.marks[q_index]
+
+    is_mcq = types == MCQ
+    is_tf = types == TRUE_FALSE
+    is_matching = types == MATCHING
+
+    correct = np.zeros(len(question_ids), dtype=bool)
+    correct[is_mcq] = key.mcq_correct(question_ids[is_mcq], selected[is_mcq])
+    correct[is_tf] = (is_true[is_tf] == key.true_false[q_index[is_tf]]) & (is_true[is_tf] >= 0)
+    for row in np.flatnonzero(is_matching):
+        correct[row] = key.matching_correct(int(question_ids[row]), matching[row])
+
+    answered = np.zeros(len(question_ids), dtype=bool)
+    answered[is_mcq] = selected[is_mcq] >= 0
+    answered[is_tf] = is_true[is_tf] >= 0
+    answered[is_matching] = np.array([bool(matching[row]) for row in np.flatnonzero(is_matching)], dtype=bool)
+
+    earned = np.where(correct, marks, 0)
+    if negative_ratio:
+        penalty = np.maximum(1, np.rint(marks * negative_ratio)).astype(np.int64)
+        earned = np.where(~correct & answered, -penalty, earned)
+
+    gradable = is_mcq | is_tf | is_matching
+    return gradable, correct, earned
+
+
+def _write_back(answer_ids, correct, earned):
+    answers = [
+        StudentAnswer(id=int(answer_id), is_correct=bool(is_correct), marks_earned=int(marks))
+        for answer_id, is_correct, marks in zip(answer_ids, correct, earned)
+    ]
+    StudentAnswer.objects.bulk_update(answers, ['is_correct', 'marks_earned'], batch_size=WRITE_BATCH_SIZE)
+
+
+def grade_exam(exam, negative_marking=None, chunk_size=READ_CHUNK_SIZE):
+    """Grade every auto-gradable answer of ``exam``; returns a ``GradingReport``.
+
+    ``negative_marking`` defaults to the exam's ``allow_negative_marking``
+    flag where it has one.  The penalty per wrong answer is
+    ``NEGATIVE_MARKING_RATIO`` (default 0.25) of the question's marks,
+    at least one mark.
+    """
+    if negative_marking is None:
+        negative_marking = getattr(exam, 'allow_negative_marking', False)
+    negative_ratio = getattr(settings, 'NEGATIVE_MARKING_RATIO', 0.25) if negative_marking else 0.0
+
+    answers = StudentAnswer.objects.filter(exam=exam)
+    key = AnswerKey(answers.values('question_id').distinct())
+    papers = paper_selections(exam)
+    report = GradingReport()
+
+    rows = answers.order_by('id').values_list(
+        'id', 'question_id', 'selected_option_id', 'is_true', 'matching_response', 'student_id'
+    )
+    last_id = 0
+    while True:
+        # A fresh query per chunk, so no cursor stays open across the writes.
+        chunk = list(rows.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            _grade_rows(key, chunk, negative_ratio, report, papers)
+        last_id = chunk[-1][0]
+
+    ungraded_essays = StudentAnswer.objects.filter(
+        exam=exam, question__question_type='ESSAY', is_correct__isnull=True
+    ).values('student_id')
+    report.submissions_marked = Submission.objects.filter(exam=exam, is_marked=False).exclude(
+        student_id__in=ungraded_essays
+    ).update(is_marked=True)
+
+    return report
+
+
+def paper_selections(exam):
+    """``{student_id: set of question ids}`` stored on the students' attempts."""
+    rows = (ExamAttempt.objects.filter(kind=EXAM, exam_id=exam.id, question_ids__isnull=False)
+            .order_by('number').values_list('student_id', 'question_ids'))
+    # Later attempts replace earlier ones.
+    return {student_id: set(question_ids) for student_id, question_ids in rows}
+
+
+def _grade_rows(key, rows, negative_ratio, report, papers=None):
+    count = len(rows)
+    answer_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+    question_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=count)
+    selected = np.fromiter((-1 if row[2] is None else row[2] for row in rows), dtype=np.int64, count=count)
+    is_true = np.fromiter((-1 if row[3] is None else int(row[3]) for row in rows), dtype=np.int8, count=count)
+    matching = [row[4] for row in rows]
+
+    gradable, correct, earned = score_chunk(key, question_ids, selected, is_true, matching, negative_ratio)
+    if papers:
+        on_paper = np.fromiter(
+            (row[5] not in papers or row[1] in papers[row[5]] for row in rows), dtype=bool, count=count,
+        )
+        correct &= on_paper
+        earned = np.where(on_paper, earned, 0)
+    _write_back(answer_ids[gradable], correct[gradable], earned[gradable])
+
+    report.graded += int(gradable.sum())
+    report.correct += int(correct[gradable].sum())
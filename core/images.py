@@ -0,0 +1,186 @@
+"""
+Question image pipeline.
+
+Uploaded question images are stored once per content: the file is
+hashed while it is read and saved as ``question_images/ab/<sha256>.<ext>``,
+so the same picture uploaded for many questions is one file and one
+``QuestionImage`` row.  ``Question.image`` points at that path.
+
+Resized variants are generated in the background by a small worker
+pool (``IMAGE_WORKERS``, default 2; Pillow releases the GIL while
+resizing and encoding):
+
+* ``thumb`` - at most 240 px, for question lists;
+* ``exam``  - at most 1024 px, for exam papers.
+
+Both are WebP (JPEG when Pillow lacks WebP support) and live next to
+the original under the same hash.  Until they exist, the original is
+used.  ``question_image`` serves any of them with a year-long
+``immutable`` cache header, which is safe because the URL contains the
+content hash.  ``process_question_images`` renders anything left
+pending, e.g. after a restart.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, models, transaction
+from django.http import FileResponse, Http404
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+STORAGE_PREFIX = 'question_images'
+VARIANTS = {'thumb': 240, 'exam': 1024}
+QUALITY = 80
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class QuestionImage(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.CharField(max_length=255, unique=True)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0)
+    # {'thumb': 'question_images/ab/<sha>-thumb.webp', 'exam': ...}; empty until processed
+    variants = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.original
+
+    @property
+    def processed(self):
+        return bool(self.variants)
+
+
+def _path(sha256, suffix):
+    return f'{STORAGE_PREFIX}/{sha256[:2]}/{sha256}{suffix}'
+
+
+def store_upload(upload):
+    """Store ``upload`` under its content hash and return the storage path.
+
+    Identical content is stored once; new content gets its variants
+    queued once the surrounding transaction commits.
+    """
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for chunk in upload.chunks() if hasattr(upload, 'chunks') else iter(lambda: upload.read(65536), b''):
+        digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    existing = QuestionImage.objects.filter(sha256=sha256).values_list('original', flat=True).first()
+    if existing:
+        return existing
+
+    extension = os.path.splitext(getattr(upload, 'name', '') or '')[1].lower() or '.bin'
+    path = _path(sha256, extension)
+    upload.seek(0)
+    if not default_storage.exists(path):
+        path = default_storage.save(path, upload)
+    image, created = QuestionImage.objects.get_or_create(
+        sha256=sha256, defaults={'original': path, 'size': getattr(upload, 'size', 0) or 0},
+    )
+    if created:
+        transaction.on_commit(lambda: queue_variants(image.id))
+    return image.original
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+                                           thread_name_prefix='question-images')
+    return _pool
+
+
+def queue_variants(image_id):
+    _get_pool().submit(_process_in_worker, image_id)
+
+
+def _process_in_worker(image_id):
+    close_old_connections()
+    try:
+        process_image(QuestionImage.objects.get(id=image_id))
+    except Exception:
+        logger.exception("Could not render variants of question image %s", image_id)
+    finally:
+        close_old_connections()
+
+
+def render_variants(data):
+    """Return ``(width, height, {name: (bytes, extension)})`` for an image file."""
+    from PIL import Image, ImageOps, features
+
+    fmt, extension = ('WEBP', '.webp') if features.check('webp') else ('JPEG', '.jpg')
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        width, height = source.size
+        if fmt == 'JPEG' or source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGB' if fmt == 'JPEG' or 'A' not in source.getbands() else 'RGBA')
+        variants = {}
+        for name, limit in VARIANTS.items():
+            copy = source.copy()
+            copy.thumbnail((limit, limit), Image.LANCZOS)
+            out = io.BytesIO()
+            if fmt == 'WEBP':
+                copy.save(out, fmt, quality=QUALITY, method=4)
+            else:
+                copy.save(out, fmt, quality=QUALITY, optimize=True, progressive=True)
+            variants[name] = (out.getvalue(), extension)
+    return width, height, variants
+
+
+def process_image(image):
+    with default_storage.open(image.original, 'rb') as fh:
+        data = fh.read()
+    width, height, rendered = render_variants(data)
+
+    paths = {}
+    for name, (content, extension) in rendered.items():
+        path = _path(image.sha256, f'-{name}{extension}')
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+        paths[name] = path
+    image.width, image.height, image.variants = width, height, paths
+    image.save(update_fields=['width', 'height', 'variants'])
+    return image
+
+
+def variant_map(paths):
+    """``{original path: {variant: url}}`` for the processed images among ``paths``."""
+    paths = [path for path in paths if path]
+    if not paths:
+        return {}
+    return {
+        image.original: {
+            name: reverse('question_image', args=[image.sha256, name]) for name in image.variants
+        }
+        for image in QuestionImage.objects.filter(original__in=paths).exclude(variants={})
+    }
+
+
+def question_image(request, sha256, variant):
+    """Serve one variant (or ``original``) of a stored question image."""
+    image = QuestionImage.objects.filter(sha256=sha256).first()
+    if image is None:
+        raise Http404("Image not found.")
+    path = image.original if variant == 'original' else image.variants.get(variant)
+    if not path:
+        raise Http404("Image variant not found.")
+    response = FileResponse(default_storage.open(path, 'rb'))
+    response['Cache-Control'] = CACHE_CONTROL
+    response['ETag'] = f'"{sha256}-{variant}"'
+    return response
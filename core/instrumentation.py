@@ -0,0 +1,239 @@
+"""
+Per-view query and latency instrumentation.
+
+``QueryInstrumentationMiddleware`` wraps every database connection for
+the length of a request and records, per resolved view name:
+
+* wall time, time spent in the database and the number of queries, as
+  histograms;
+* duplicate queries - statements whose fingerprint (the SQL with
+  literals replaced by ``?`` and ``IN`` lists collapsed) ran more than
+  once in the same request, the usual sign of an N+1.
+
+``metrics`` serves the numbers in the Prometheus text format.  They are
+per process; scrape each worker, or put the endpoint behind the same
+address a local agent polls.  Only clients in ``METRICS_ALLOWED_IPS``
+(default loopback) can read it.
+
+Query budgets cap the number of queries a view may run::
+
+    VIEW_QUERY_BUDGETS = {'view_exam': 15, 'admin_exams': 8}
+    QUERY_BUDGET_STRICT = True   # e.g. in test settings
+
+A view may also declare its own budget with ``@query_budget(n)``.  Over
+budget is logged as a warning with the duplicated fingerprints, or
+raised as ``QueryBudgetExceeded`` in strict mode so the test suite
+fails.
+
+Settings::
+
+    MIDDLEWARE = [..., 'core.instrumentation.QueryInstrumentationMiddleware']
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, Http404
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+MAX_FINGERPRINTS_PER_VIEW = 20
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Normalize ``sql`` so repeats of one statement compare equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def query_budget(max_queries):
+    """Declare the most queries ``view_func`` may run per request."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class ViewStats:
+    def __init__(self):
+        self.wall = Histogram(DURATION_BUCKETS)
+        self.db = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.duplicates = 0
+        self.budget_exceeded = 0
+        self.fingerprints = Counter()
+
+
+class Registry:
+    def __init__(self):
+        self.views = {}
+        self.lock = threading.Lock()
+
+    def record(self, view, wall, db, queries, duplicates, over_budget):
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            stats.wall.observe(wall)
+            stats.db.observe(db)
+            stats.queries.observe(queries)
+            stats.duplicates += sum(count - 1 for count in duplicates.values())
+            stats.budget_exceeded += int(over_budget)
+            for sql, count in duplicates.items():
+                if sql in stats.fingerprints or len(stats.fingerprints) < MAX_FINGERPRINTS_PER_VIEW:
+                    stats.fingerprints[sql] += count - 1
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            views = sorted(self.views.items())
+            for name, attr, help_text in (
+                ('django_view_duration_seconds', 'wall', 'Wall time per request.'),
+                ('django_view_db_duration_seconds', 'db', 'Database time per request.'),
+                ('django_view_queries', 'queries', 'Database queries per request.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for view, stats in views:
+                    histogram = getattr(stats, attr)
+                    label = f'view="{_label(view)}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.total}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.total}')
+
+            lines += ['# HELP django_view_duplicate_queries_total Repeated queries per view.',
+                      '# TYPE django_view_duplicate_queries_total counter']
+            for view, stats in views:
+                lines.append(f'django_view_duplicate_queries_total{{view="{_label(view)}"}} {stats.duplicates}')
+
+            lines += ['# HELP django_view_duplicate_query_fingerprint_total Repeats of one statement.',
+                      '# TYPE django_view_duplicate_query_fingerprint_total counter']
+            for view, stats in views:
+                for sql, count in stats.fingerprints.most_common():
+                    lines.append(f'django_view_duplicate_query_fingerprint_total'
+                                 f'{{view="{_label(view)}",sql="{_label(sql[:200])}"}} {count}')
+
+            lines += ['# HELP django_view_query_budget_exceeded_total Requests over their query budget.',
+                      '# TYPE django_view_query_budget_exceeded_total counter']
+            for view, stats in views:
+                lines.append(f'django_view_query_budget_exceeded_total{{view="{_label(view)}"}} '
+                             f'{stats.budget_exceeded}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+registry = Registry()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that times and fingerprints every query."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def view_budget(request):
+    budget = getattr(request, '_query_budget', None)
+    if budget is None and request.resolver_match is not None:
+        budget = getattr(settings, 'VIEW_QUERY_BUDGETS', {}).get(request.resolver_match.view_name)
+    return budget
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall = time.perf_counter() - start
+
+        match = request.resolver_match
+        if match is None:
+            return response
+        view = match.view_name or match._func_path
+        duplicates = recorder.duplicates()
+        budget = view_budget(request)
+        over_budget = budget is not None and recorder.count > budget
+        registry.record(view, wall, recorder.db_time, recorder.count, duplicates, over_budget)
+
+        if over_budget:
+            message = (f"{view} ran {recorder.count} queries (budget {budget}); repeated: "
+                       + ('; '.join(f"{count}x {sql}" for sql, count in duplicates.items()) or 'none'))
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = getattr(view_func, 'query_budget', None)
+        if budget is not None:
+            request._query_budget = budget
+
+
+def metrics(request):
+    """Prometheus scrape endpoint for this process."""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
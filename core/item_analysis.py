@@ -0,0 +1,211 @@
+"""
+Precomputed item analysis for exams.
+
+``update_exam_analytics`` reads an exam's submissions and answers in
+chunks, column-wise into NumPy arrays, and folds them into an
+``ExamAnalytics`` rollup that stores running sums rather than raw data:
+
+* exam level - submission count, sum and sum of squares of total scores,
+  number of passes against ``passing_marks`` and a score histogram;
+* item level - how many students answered / got each question right,
+  the summed total score of those who got it right, and how often each
+  option was picked.
+
+From those sums the rollup derives each question's difficulty index
+(share correct), point-biserial discrimination and per-option
+distractor rates, plus the pass rate.  Only submissions newer than the
+last one folded in are read on each run, so new submissions are added
+incrementally; ``full=True`` starts over (e.g. after re-grading).  The
+watermark only moves over graded (``is_marked``) submissions: a
+submission whose answers are still being graded, and every later one,
+waits for the next run.  The analytics pages read one rollup row per
+exam.
+"""
+import math
+
+import numpy as np
+
+from django.db import models, transaction
+
+from adminpanel.models import Exam
+from core.models import Question, Option
+from studentpanel.models import StudentAnswer, Submission
+
+CHUNK_SIZE = 5000
+
+
+class ExamAnalytics(models.Model):
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True, related_name='analytics')
+    submissions = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sum_sq = models.FloatField(default=0)
+    passed = models.IntegerField(default=0)
+    # {score: number of students}
+    score_histogram = models.JSONField(default=dict)
+    # {question_id: {answered, correct, correct_score_sum, options: {option_id: picks},
+    #                difficulty, discrimination, distractors: {option_id: rate},
+    #                text, option_text: {option_id: text}}}
+    items = models.JSONField(default=dict)
+    last_submission_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Analytics for exam {self.exam_id} ({self.submissions} submissions)"
+
+    @property
+    def mean_score(self):
+        return self.score_sum / self.submissions if self.submissions else None
+
+    @property
+    def score_std(self):
+        if not self.submissions:
+            return None
+        mean = self.score_sum / self.submissions
+        return math.sqrt(max(self.score_sum_sq / self.submissions - mean * mean, 0.0))
+
+    @property
+    def pass_rate(self):
+        return self.passed / self.submissions if self.submissions else None
+
+    def reset(self):
+        self.submissions = 0
+        self.score_sum = self.score_sum_sq = 0
+        self.passed = 0
+        self.score_histogram = {}
+        self.items = {}
+        self.last_submission_id = 0
+
+
+def _fold_chunk(rollup, submission_rows, passing_marks):
+    """Add one chunk of ``(submission_id, student_id)`` rows to ``rollup``."""
+    student_ids = np.array([row[1] for row in submission_rows], dtype=np.int64)
+    answers = list(StudentAnswer.objects.filter(
+        exam_id=rollup.exam_id, student_id__in=student_ids.tolist()
+    ).values_list('student_id', 'question_id', 'selected_option_id', 'is_correct', 'marks_earned'))
+
+    order = np.argsort(student_ids)
+    sorted_students = student_ids[order]
+    count = len(answers)
+    a_student = np.fromiter((row[0] for row in answers), dtype=np.int64, count=count)
+    a_question = np.fromiter((row[1] for row in answers), dtype=np.int64, count=count)
+    a_option = np.fromiter((-1 if row[2] is None else row[2] for row in answers), dtype=np.int64, count=count)
+    a_correct = np.fromiter((bool(row[3]) for row in answers), dtype=bool, count=count)
+    a_marks = np.fromiter((row[4] or 0 for row in answers), dtype=np.float64, count=count)
+
+    # Total score per student (students without answers score 0)
+    student_index = order[np.searchsorted(sorted_students, a_student)]
+    scores = np.bincount(student_index, weights=a_marks, minlength=len(student_ids))
+
+    rollup.submissions += len(student_ids)
+    rollup.score_sum += float(scores.sum())
+    rollup.score_sum_sq += float((scores ** 2).sum())
+    rollup.passed += int((scores >= passing_marks).sum())
+    values, counts = np.unique(scores.astype(np.int64), return_counts=True)
+    for value, n in zip(values.tolist(), counts.tolist()):
+        rollup.score_histogram[str(value)] = rollup.score_histogram.get(str(value), 0) + n
+
+    if not count:
+        return
+
+    questions, q_index = np.unique(a_question, return_inverse=True)
+    answered = np.bincount(q_index, minlength=len(questions))
+    correct = np.bincount(q_index, weights=a_correct, minlength=len(questions))
+    correct_score = np.bincount(q_index, weights=a_correct * scores[student_index], minlength=len(questions))
+
+    for i, question_id in enumerate(questions.tolist()):
+        item = rollup.items.setdefault(str(question_id), {
+            'answered': 0, 'correct': 0, 'correct_score_sum': 0.0, 'options': {},
+        })
+        item['answered'] += int(answered[i])
+        item['correct'] += int(correct[i])
+        item['correct_score_sum'] += float(correct_score[i])
+
+    picked = a_option >= 0
+    if not picked.any():
+        return
+    pairs, picks = np.unique(np.stack([a_question[picked], a_option[picked]]), axis=1, return_counts=True)
+    for (question_id, option_id), n in zip(pairs.T.tolist(), picks.tolist()):
+        options = rollup.items[str(question_id)]['options']
+        options[str(option_id)] = options.get(str(option_id), 0) + n
+
+
+def _derive(rollup):
+    """Recompute difficulty, discrimination and distractor rates from the sums.
+
+    Question and option labels are copied in as well so the analytics
+    pages need nothing but the rollup row.
+    """
+    total = rollup.submissions
+    std = rollup.score_std
+    labels = dict(Question.objects.filter(id__in=list(rollup.items)).values_list('id', 'text'))
+    option_labels = dict(Option.objects.filter(question_id__in=list(rollup.items)).values_list('id', 'text'))
+    for question_id, item in rollup.items.items():
+        item['text'] = labels.get(int(question_id), '')
+        item['option_text'] = {
+            option_id: option_labels.get(int(option_id), '') for option_id in item['options']
+        }
+        correct = item['correct']
+        p = correct / total if total else None
+        item['difficulty'] = p
+        item['discrimination'] = None
+        if p is not None and 0 < p < 1 and std:
+            mean_correct = item['correct_score_sum'] / correct
+            mean_wrong = (rollup.score_sum - item['correct_score_sum']) / (total - correct)
+            item['discrimination'] = (mean_correct - mean_wrong) / std * math.sqrt(p * (1 - p))
+        item['distractors'] = {
+            option_id: picks / total for option_id, picks in item['options'].items()
+        } if total else {}
+
+
+def update_exam_analytics(exam, full=False, chunk_size=CHUNK_SIZE):
+    """Fold new submissions of ``exam`` into its rollup and return it."""
+    with transaction.atomic():
+        rollup, _ = ExamAnalytics.objects.select_for_update().get_or_create(exam=exam)
+        if full:
+            rollup.reset()
+
+        submissions = Submission.objects.filter(exam=exam, id__gt=rollup.last_submission_id)
+        # submit_exam creates the submission before its answers are graded;
+        # stop short of the first one that is not marked yet.
+        pending = submissions.filter(is_marked=False).order_by('id').values_list('id', flat=True).first()
+        if pending is not None:
+            submissions = submissions.filter(id__lt=pending)
+        submissions = submissions.order_by('id').values_list('id', 'student_id')
+
+        chunk = []
+        for row in submissions.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                _fold_chunk(rollup, chunk, exam.passing_marks)
+                rollup.last_submission_id = chunk[-1][0]
+                chunk = []
+        if chunk:
+            _fold_chunk(rollup, chunk, exam.passing_marks)
+            rollup.last_submission_id = chunk[-1][0]
+
+        _derive(rollup)
+        rollup.save()
+    return rollup
+
+
+def stale_exams():
+    """Exams with graded submissions that are not in their rollup yet."""
+    watermarks = dict(ExamAnalytics.objects.values_list('exam_id', 'last_submission_id'))
+    latest = Submission.objects.filter(is_marked=True).values('exam_id').annotate(last=models.Max('id')).values_list('exam_id', 'last')
+    return Exam.objects.filter(id__in=[
+        exam_id for exam_id, last in latest if last > watermarks.get(exam_id, 0)
+    ])
+
+
+def analytics_overview(selected_id=None):
+    """Every exam's rollup summary and the one picked for detail, if any.
+
+    The list leaves out the per-item JSON; only the selected exam's
+    rollup is loaded in full.
+    """
+    rollups = list(ExamAnalytics.objects.select_related('exam')
+                   .defer('items', 'score_histogram').order_by('-exam__exam_date'))
+    selected = None
+    if selected_id and str(selected_id).isdigit():
+        selected = ExamAnalytics.objects.select_related('exam').filter(exam_id=selected_id).first()
+    return rollups, selected
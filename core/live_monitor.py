@@ -0,0 +1,308 @@
+"""
+Live exam progress for the monitoring dashboard.
+
+The student endpoints in ``core.exam_api`` report every start, autosave
+and submission here.  Each worker keeps per-(exam, student) progress in
+process memory - when the student started, which questions they have
+answered, when they submitted and when they were last seen - so
+recording an event is a dictionary update under a lock.
+
+A background thread publishes this worker's progress of every exam that
+changed to the shared cache (``MONITOR_CACHE_ALIAS``, default
+``default``) once per ``MONITOR_PUBLISH_INTERVAL`` seconds (default 1),
+keyed by exam and by a per-process epoch, and registers the epoch in a
+small per-exam index.  A dashboard merges the snapshots of every worker
+(earliest start and submission, latest activity, union of answered
+questions), so a student whose requests land on different workers is
+counted once.  With a per-process ``LocMemCache`` each worker only sees
+its own students.
+
+``event_stream`` pushes the merged progress as Server-Sent Events: one
+full frame, then only the students that changed, every
+``MONITOR_STREAM_INTERVAL`` seconds (default 1).  Nothing on that path
+reads the answer table; ``seed`` fills an empty monitor from the
+database once, e.g. after a restart in the middle of an exam.  Each
+stream occupies a sync worker, so it ends after
+``MONITOR_STREAM_SECONDS`` (default 25) and the browser's
+``EventSource`` reconnects two seconds later with a fresh full frame;
+a dashboard holds a worker for at most that long at a time.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import StreamingHttpResponse
+
+from core.models import CustomUser
+from core.paper_cache import EXAM, EXAMINATION  # noqa: F401  (used by the views)
+from studentpanel.models import StudentAnswer, Submission
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'live_monitor'
+# Snapshots of a worker that stopped publishing disappear after this.
+SNAPSHOT_TIMEOUT = 30
+# Exams without events for this long are dropped from process memory.
+RETENTION_SECONDS = 6 * 3600
+
+_EPOCH = uuid.uuid4().hex[:8]
+
+_exams = {}
+_exams_lock = threading.Lock()
+_publisher = None
+_seeded = set()
+
+
+def _cache():
+    return caches[getattr(settings, 'MONITOR_CACHE_ALIAS', 'default')]
+
+
+def exam_key(kind, exam_id):
+    return f'{kind}:{exam_id}'
+
+
+class StudentProgress:
+    __slots__ = ('started_at', 'answered', 'submitted_at', 'last_seen')
+
+    def __init__(self):
+        self.started_at = None
+        self.answered = set()
+        self.submitted_at = None
+        self.last_seen = None
+
+
+class ExamProgress:
+    """Progress of every student of one exam seen by this process."""
+
+    def __init__(self):
+        self.students = {}
+        self.lock = threading.Lock()
+        self.changed = False
+        self.last_event = time.monotonic()
+        self.published = 0.0
+
+    def _student(self, student_id, at):
+        progress = self.students.get(student_id)
+        if progress is None:
+            progress = self.students[student_id] = StudentProgress()
+        progress.last_seen = max(progress.last_seen or at, at)
+        self.changed = True
+        self.last_event = time.monotonic()
+        return progress
+
+    def start(self, student_id, at):
+        with self.lock:
+            progress = self._student(student_id, at)
+            progress.started_at = min(progress.started_at or at, at)
+
+    def answer(self, student_id, question_id, at):
+        with self.lock:
+            progress = self._student(student_id, at)
+            progress.started_at = progress.started_at or at
+            progress.answered.add(question_id)
+
+    def submit(self, student_id, at):
+        with self.lock:
+            progress = self._student(student_id, at)
+            progress.submitted_at = min(progress.submitted_at or at, at)
+
+    def snapshot(self):
+        """``{student_id: [started_at, submitted_at, last_seen, [question ids]]}``."""
+        with self.lock:
+            self.changed = False
+            return {
+                student_id: [p.started_at, p.submitted_at, p.last_seen, list(p.answered)]
+                for student_id, p in self.students.items()
+            }
+
+
+def _exam(kind, exam_id):
+    key = exam_key(kind, exam_id)
+    progress = _exams.get(key)
+    if progress is None:
+        with _exams_lock:
+            progress = _exams.setdefault(key, ExamProgress())
+    _ensure_publisher()
+    return progress
+
+
+def record_start(kind, exam_id, student_id):
+    _exam(kind, int(exam_id)).start(student_id, time.time())
+
+
+def record_answer(kind, exam_id, student_id, question_id):
+    # Callers pass a question_id already checked against the paper
+    # (core.exam_api.clean_answer), so bogus ids never reach the counts.
+    _exam(kind, int(exam_id)).answer(student_id, question_id, time.time())
+
+
+def record_submit(kind, exam_id, student_id):
+    _exam(kind, int(exam_id)).submit(student_id, time.time())
+
+
+def _snapshot_key(key, epoch):
+    return f'{CACHE_PREFIX}:{key}:{epoch}'
+
+
+def _workers_key(key):
+    return f'{CACHE_PREFIX}:{key}:workers'
+
+
+def publish():
+    """Push the snapshots of changed exams to the shared cache."""
+    cache = _cache()
+    now = time.monotonic()
+    with _exams_lock:
+        exams = list(_exams.items())
+    for key, progress in exams:
+        if now - progress.last_event > RETENTION_SECONDS:
+            with _exams_lock:
+                _exams.pop(key, None)
+            continue
+        # Unchanged snapshots are re-sent before they expire.
+        if not progress.changed and now - progress.published < SNAPSHOT_TIMEOUT / 3:
+            continue
+        cache.set(_snapshot_key(key, _EPOCH), progress.snapshot(), SNAPSHOT_TIMEOUT)
+        progress.published = now
+        # Read-modify-write; a registration lost to a concurrent worker is
+        # repeated on that worker's next publish.
+        wall = time.time()
+        workers = cache.get(_workers_key(key)) or {}
+        if _EPOCH not in workers or wall - workers[_EPOCH] > SNAPSHOT_TIMEOUT / 3:
+            workers = {epoch: seen for epoch, seen in workers.items() if wall - seen < SNAPSHOT_TIMEOUT}
+            workers[_EPOCH] = wall
+            cache.set(_workers_key(key), workers, None)
+
+
+def _run_publisher(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            publish()
+        except Exception:
+            # The cache may be briefly unavailable; the next round retries.
+            logger.warning("Could not publish live exam progress", exc_info=True)
+
+
+def _ensure_publisher():
+    global _publisher
+    if _publisher is None or not _publisher.is_alive():
+        with _exams_lock:
+            if _publisher is None or not _publisher.is_alive():
+                interval = getattr(settings, 'MONITOR_PUBLISH_INTERVAL', 1.0)
+                _publisher = threading.Thread(target=_run_publisher, args=(interval,),
+                                              name='live-monitor', daemon=True)
+                _publisher.start()
+
+
+def merged(kind, exam_id):
+    """``{student_id: (started_at, answered, submitted_at, last_seen)}`` across workers."""
+    key = exam_key(kind, exam_id)
+    cache = _cache()
+    epochs = [epoch for epoch in (cache.get(_workers_key(key)) or {}) if epoch != _EPOCH]
+    snapshots = list(cache.get_many([_snapshot_key(key, epoch) for epoch in epochs]).values())
+    local = _exams.get(key)
+    if local is not None:
+        with local.lock:
+            snapshots.append({
+                student_id: [p.started_at, p.submitted_at, p.last_seen, p.answered]
+                for student_id, p in local.students.items()
+            })
+
+    if len(snapshots) == 1:
+        return {
+            student_id: (started, len(answered), submitted, seen)
+            for student_id, (started, submitted, seen, answered) in snapshots[0].items()
+        }
+
+    combined = {}
+    for snapshot in snapshots:
+        for student_id, (started, submitted, seen, answered) in snapshot.items():
+            row = combined.get(student_id)
+            if row is None:
+                combined[student_id] = [started, submitted, seen, set(answered)]
+                continue
+            row[0] = min(filter(None, (row[0], started)), default=None)
+            row[1] = min(filter(None, (row[1], submitted)), default=None)
+            row[2] = max(filter(None, (row[2], seen)), default=None)
+            row[3].update(answered)
+    return {
+        student_id: (started, len(answered), submitted, seen)
+        for student_id, (started, submitted, seen, answered) in combined.items()
+    }
+
+
+def seed(kind, exam_id):
+    """Load progress from the database if no worker knows this exam yet.
+
+    Start times are not stored, so the first answer stands in for them.
+    Only ``Exam`` answers and submissions are in the database.
+    """
+    key = exam_key(kind, exam_id)
+    if kind != EXAM or key in _seeded or key in _exams or _cache().get(_workers_key(key)):
+        return
+    _seeded.add(key)
+    progress = _exam(kind, exam_id)
+    answers = (StudentAnswer.objects.filter(exam_id=exam_id)
+               .values_list('student_id', 'question_id', 'answered_at'))
+    for student_id, question_id, answered_at in answers.iterator(chunk_size=5000):
+        progress.answer(student_id, question_id, answered_at.timestamp() if answered_at else time.time())
+    for student_id, submitted_at in Submission.objects.filter(exam_id=exam_id).values_list('student_id',
+                                                                                         'submitted_at'):
+        progress.submit(student_id, submitted_at.timestamp() if submitted_at else time.time())
+
+
+def _frame(payload):
+    return f"event: progress\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+def event_stream(kind, exam_id, enrolled=None, interval=None, duration=None):
+    """Yield Server-Sent Events with the live progress of one exam.
+
+    Every frame carries the exam totals and the students whose progress
+    changed since the previous frame (all of them in the first one).
+    """
+    interval = interval or getattr(settings, 'MONITOR_STREAM_INTERVAL', 1.0)
+    duration = duration or getattr(settings, 'MONITOR_STREAM_SECONDS', 25)
+    deadline = time.monotonic() + duration
+    sent, names = {}, {}
+
+    yield "retry: 2000\n\n"
+    while True:
+        progress = merged(kind, exam_id)
+        changed = {student_id: row for student_id, row in progress.items() if sent.get(student_id) != row}
+        unknown = [student_id for student_id in changed if student_id not in names]
+        if unknown:
+            names.update(CustomUser.objects.filter(id__in=unknown).values_list('id', 'username'))
+
+        yield _frame({
+            'full': not sent,
+            'summary': {
+                'enrolled': enrolled,
+                'started': sum(1 for row in progress.values() if row[0]),
+                'submitted': sum(1 for row in progress.values() if row[2]),
+                'answers': sum(row[1] for row in progress.values()),
+            },
+            'students': [
+                {'id': student_id, 'username': names.get(student_id, ''), 'started_at': started,
+                 'answered': answered, 'submitted_at': submitted, 'last_seen': seen}
+                for student_id, (started, answered, submitted, seen) in changed.items()
+            ],
+        })
+        sent.update(changed)
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(interval)
+
+
+def stream_response(kind, exam_id, enrolled=None):
+    seed(kind, exam_id)
+    response = StreamingHttpResponse(event_stream(kind, exam_id, enrolled), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,147 @@
+import json
+import platform
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+
+from adminpanel.models import Exam
+from core.instrumentation import QueryRecorder
+from core.models import CustomUser, Question
+from examinerpanel.models import Examination
+from studentpanel.models import ExamEnrollment, StudentAnswer
+
+# (url name, role, object the URL needs, query string)
+TARGETS = (
+    ('admin_exams', 'ADMIN', None, ''),
+    ('admin_questions', 'ADMIN', None, ''),
+    ('admin_questions', 'ADMIN', None, '?search=energy'),
+    ('admin_users', 'ADMIN', None, ''),
+    ('admin_users', 'ADMIN', None, '?search=kamau'),
+    ('view_exam', 'ADMIN', 'exam', ''),
+    ('admin_analytics', 'ADMIN', None, ''),
+    ('examiner_questions', 'EXAMINER', None, ''),
+    ('examiner_exam_view', 'EXAMINER', 'examination', ''),
+    ('examiner_analytics', 'EXAMINER', None, ''),
+)
+
+
+def scale():
+    return {
+        'users': CustomUser.objects.count(),
+        'exams': Exam.objects.count(),
+        'examinations': Examination.objects.count(),
+        'questions': Question.objects.count(),
+        'enrollments': ExamEnrollment.objects.count(),
+        'answers': StudentAnswer.objects.count(),
+    }
+
+
+def largest(field):
+    row = (Question.objects.exclude(**{field: None}).values(field)
+           .annotate(n=Count('id')).order_by('-n').first())
+    return row[field] if row else None
+
+
+def timed_get(client, url):
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        start = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - start
+    return response.status_code, elapsed, recorder
+
+
+class Command(BaseCommand):
+    help = "Time the hot admin/examiner views through the test client and save the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help="JSON file to write (default: benchmark-<timestamp>.json).")
+        parser.add_argument('--compare', help="Earlier results file to compare against.")
+        parser.add_argument('--only', nargs='*', help="URL names to run.")
+        parser.add_argument('--host', default='localhost', help="Host header; must be in ALLOWED_HOSTS.")
+
+    def handle(self, *args, **options):
+        users = {role: CustomUser.objects.filter(role=role, is_active=True).order_by('id').first()
+                 for role in ('ADMIN', 'EXAMINER')}
+        # The exams with the most questions show the worst case.
+        objects = {
+            'exam': Exam.objects.filter(id=largest('exam_id')).first(),
+            'examination': Examination.objects.filter(id=largest('examination_id')).first(),
+        }
+
+        results = []
+        for name, role, needs, query in TARGETS:
+            if options['only'] and name not in options['only']:
+                continue
+            if users[role] is None or (needs and objects[needs] is None):
+                self.stderr.write(f"Skipping {name}: no {role.lower() if users[role] is None else needs}.")
+                continue
+            try:
+                url = reverse(name, args=[objects[needs].id] if needs else []) + query
+            except NoReverseMatch:
+                self.stderr.write(f"Skipping {name}: no such URL.")
+                continue
+
+            client = Client(SERVER_NAME=options['host'])
+            client.force_login(users[role])
+            timed_get(client, url)  # warm-up: caches, compiled templates
+
+            timings, status, recorder = [], None, None
+            for _ in range(options['repeat']):
+                status, elapsed, recorder = timed_get(client, url)
+                timings.append(elapsed * 1000)
+            timings.sort()
+            result = {
+                'view': name,
+                'url': url,
+                'status': status,
+                'runs': len(timings),
+                'min_ms': round(timings[0], 2),
+                'median_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+                'queries': recorder.count,
+                'db_ms': round(recorder.db_time * 1000, 2),
+                'duplicate_queries': sum(count - 1 for count in recorder.duplicates().values()),
+            }
+            results.append(result)
+            self.stdout.write(f"{url:<45} {status}  median {result['median_ms']:>9.2f} ms  "
+                              f"{result['queries']:>4} queries ({result['duplicate_queries']} repeated)")
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'scale': scale(),
+            'results': results,
+        }
+        output = options['output'] or f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}."))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def compare(self, path, results):
+        try:
+            with open(path) as fh:
+                previous = {row['url']: row for row in json.load(fh)['results']}
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+        self.stdout.write(f"Compared with {path}:")
+        for row in results:
+            old = previous.get(row['url'])
+            if old is None:
+                continue
+            change = (row['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+            self.stdout.write(f"{row['url']:<45} median {change:+7.1f}%  "
+                              f"queries {old['queries']} -> {row['queries']}")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import enrollment_stats
+
+
+class Command(BaseCommand):
+    help = "Recount per-exam enrollment counters and report (or with --fix, repair) drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite the counters from a fresh recount.")
+
+    def handle(self, *args, **options):
+        drift = enrollment_stats.find_drift()
+        for exam_id, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f"exam={exam_id}: stored {stored}, actual {actual}")
+
+        if options['fix']:
+            enrollment_stats.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Enrollment counters rebuilt ({len(drift)} corrected)."))
+        elif drift:
+            raise CommandError(f"{len(drift)} exam(s) have out-of-sync enrollment counters.")
+        else:
+            self.stdout.write(self.style.SUCCESS("Enrollment counters are in sync."))
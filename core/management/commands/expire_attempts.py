@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.attempts import DeadlineScheduler, expire_attempts, overdue_attempt_ids
+
+
+class Command(BaseCommand):
+    help = "Auto-submit exam attempts whose deadline has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true',
+                            help="Keep running and expire attempts as their deadlines pass. "
+                                 "Run exactly one watcher per site.")
+
+    def handle(self, *args, **options):
+        expired = expire_attempts(list(overdue_attempt_ids()))
+        self.stdout.write(self.style.SUCCESS(f"{expired} overdue attempt(s) expired."))
+        if not options['watch']:
+            return
+
+        self.stdout.write("Watching attempt deadlines (Ctrl+C to stop).")
+        scheduler = DeadlineScheduler()
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            scheduler.stop()
@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core.models import Question
+from core.question_bank import FORMATS, export_questions
+
+
+class Command(BaseCommand):
+    help = "Stream the question bank out as CSV, JSON Lines or QTI-style XML."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--subject', type=int, help="Only export questions of this subject id.")
+        parser.add_argument('--output', help="File to write to (defaults to stdout).")
+
+    def handle(self, *args, **options):
+        queryset = Question.objects.all()
+        if options['subject']:
+            queryset = queryset.filter(subject_id=options['subject'])
+
+        out = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in export_questions(queryset, options['format']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,240 @@
+import math
+import random
+import time
+import uuid
+from datetime import time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from adminpanel.models import Exam
+from core import enrollment_stats, search
+from core.models import CustomUser, Subject, Question, Option, MatchingPair, TrueFalseAnswer
+from core.question_service import QuestionGraph, save_questions
+from examinerpanel.models import Examination
+from studentpanel.models import ExamEnrollment, StudentAnswer, Submission
+
+BATCH_SIZE = 5000
+QUESTION_MIX = (('MCQ', 0.6), ('TRUE_FALSE', 0.2), ('MATCHING', 0.1), ('ESSAY', 0.1))
+DIFFICULTIES = ('EASY', 'MEDIUM', 'HARD')
+WORDS = ('algebra', 'cell', 'energy', 'market', 'river', 'protein', 'vector', 'empire', 'climate',
+         'circuit', 'poem', 'theorem', 'enzyme', 'tariff', 'glacier', 'orbit', 'treaty', 'syntax')
+FIRST_NAMES = ('Amina', 'Brian', 'Chen', 'Daniel', 'Esther', 'Faith', 'Grace', 'Hassan', 'Ivy', 'John',
+               'Kevin', 'Lucy', 'Mary', 'Nadia', 'Omar', 'Peter', 'Ruth', 'Samuel', 'Tom', 'Wanjiru')
+LAST_NAMES = ('Otieno', 'Kamau', 'Smith', 'Mwangi', 'Ali', 'Njoroge', 'Brown', 'Achieng', 'Wang', 'Kiprop')
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, exams, questions and answers for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--examiners', type=int, default=20)
+        parser.add_argument('--subjects', type=int, default=20)
+        parser.add_argument('--exams', type=int, default=50, help="Admin exams.")
+        parser.add_argument('--examinations', type=int, default=50, help="Examiner examinations.")
+        parser.add_argument('--questions', type=int, default=5000)
+        parser.add_argument('--questions-per-exam', type=int, default=40)
+        parser.add_argument('--answers', type=int, default=100000, help="Approximate StudentAnswer rows.")
+        parser.add_argument('--prefix', default='bench', help="Prefix for generated usernames and codes.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        if CustomUser.objects.filter(username__startswith=f"{self.prefix}_").exists():
+            raise CommandError(f"Data with prefix '{self.prefix}' already exists; pick another --prefix.")
+
+        started = time.perf_counter()
+        admin = self.make_users('ADMIN', 1)[0]
+        examiners = self.make_users('EXAMINER', options['examiners'])
+        students = self.make_users('STUDENT', options['students'])
+        subjects = self.make_subjects(options['subjects'])
+        exams = self.make_exams(options['exams'], admin, subjects)
+        examinations = self.make_examinations(options['examinations'], examiners, subjects)
+        keys = self.make_questions(options['questions'], options['questions_per_exam'],
+                                   subjects, examiners, exams, examinations)
+        self.make_answers(options['answers'], exams, students, keys)
+
+        enrollment_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s."))
+
+    def log(self, message):
+        self.stdout.write(message)
+        self.stdout.flush()
+
+    def make_users(self, role, count):
+        # Hashing is deliberately slow, so every generated user shares one hash.
+        password = make_password(f"{self.prefix}-password")
+        id_field = {'ADMIN': 'admin_id', 'EXAMINER': 'examiner_id', 'STUDENT': 'student_id'}[role]
+        users = []
+        for i in range(count):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            username = f"{self.prefix}_{role.lower()}_{i}"
+            users.append(CustomUser(
+                username=username, password=password, role=role,
+                first_name=first, last_name=last, full_name=f"{first} {last}",
+                email=f"{username}@example.com", address='', phone=f"07{self.rng.randrange(10 ** 8):08d}",
+                **{id_field: f"{self.prefix.upper()}-{role[:3]}-{i:06d}"},
+            ))
+        created = []
+        for start in range(0, len(users), BATCH_SIZE):
+            with transaction.atomic():
+                batch = CustomUser.objects.bulk_create(users[start:start + BATCH_SIZE])
+                search.get_backend().index_users(batch)
+            created += batch
+        self.log(f"{len(created)} {role.lower()}(s)")
+        return created
+
+    def make_subjects(self, count):
+        subjects = Subject.objects.bulk_create([
+            Subject(name=f"{self.prefix.title()} {self.rng.choice(WORDS).title()} {i}", description='')
+            for i in range(count)
+        ])
+        self.log(f"{len(subjects)} subject(s)")
+        return subjects
+
+    def make_exams(self, count, admin, subjects):
+        today = timezone.localdate()
+        exams = []
+        for i in range(count):
+            exam_date = today + timedelta(days=self.rng.randint(-60, 60))
+            exams.append(Exam(
+                exam_name=f"{self.rng.choice(WORDS).title()} exam {i}",
+                exam_code=f"{self.prefix.upper()[:8]}{i:05d}",
+                token=uuid.uuid4().hex,
+                status='published',
+                exam_date=exam_date,
+                expiry_date=exam_date + timedelta(days=7),
+                start_time=dt_time(9, 0),
+                end_time=dt_time(12, 0),
+                enforce_time_window=False,
+                duration=90,
+                total_marks=100,
+                passing_marks=50,
+                description='',
+                admin=admin,
+                subject=self.rng.choice(subjects),
+            ))
+        exams = Exam.objects.bulk_create(exams, batch_size=BATCH_SIZE)
+        self.log(f"{len(exams)} exam(s)")
+        return exams
+
+    def make_examinations(self, count, examiners, subjects):
+        today = timezone.localdate()
+        examinations = Examination.objects.bulk_create([
+            Examination(
+                exam_name=f"{self.rng.choice(WORDS).title()} examination {i}",
+                description='', instructions='', tags=self.rng.choice(WORDS),
+                exam_date=today + timedelta(days=self.rng.randint(-60, 60)),
+                start_time=dt_time(14, 0), duration_minutes=60, timezone='UTC',
+                total_marks=100, passing_marks=50, number_of_questions=20, selection_mode='random',
+                allow_negative_marking=False, shuffle_questions=True, shuffle_options=True,
+                access_type='all', max_attempts=1, allow_resume=True, allow_skip=True,
+                allow_flagging=True, status='published', visible_to_students=True, instant_publish=False,
+                examiner=self.rng.choice(examiners), subject=self.rng.choice(subjects),
+            )
+            for i in range(count)
+        ], batch_size=BATCH_SIZE)
+        self.log(f"{len(examinations)} examination(s)")
+        return examinations
+
+    def random_text(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    def make_questions(self, count, per_exam, subjects, examiners, exams, examinations):
+        """Create the questions; returns ``{exam_id: [(question_id, type, marks, options)]}``.
+
+        The first ``per_exam`` questions of each exam and examination are
+        attached to it, the rest stay in the bank.
+        """
+        types, weights = zip(*QUESTION_MIX)
+        owners = [(exam, None) for exam in exams] + [(None, examination) for examination in examinations]
+        keys = {exam.id: [] for exam in exams}
+
+        graphs = []
+        for i in range(count):
+            exam, examination = owners[i // per_exam] if i // per_exam < len(owners) else (None, None)
+            question_type = self.rng.choices(types, weights)[0]
+            subject = exam.subject if exam else examination.subject if examination else self.rng.choice(subjects)
+            question = Question(
+                question_type=question_type, text=self.random_text(12) + '?',
+                tags=','.join(self.rng.sample(WORDS, 2)), difficulty_level=self.rng.choice(DIFFICULTIES),
+                explanation=self.random_text(6), essay_instructions='', marks=self.rng.choice((1, 2, 5)),
+                exam=exam, examination=examination, subject=subject,
+                created_by=self.rng.choice(examiners) if examiners else None,
+            )
+            options, pairs, true_false = [], [], None
+            if question_type == 'MCQ':
+                correct = self.rng.randrange(4)
+                options = [Option(text=self.random_text(3), is_correct=j == correct) for j in range(4)]
+            elif question_type == 'TRUE_FALSE':
+                true_false = TrueFalseAnswer(is_true=self.rng.random() < 0.5)
+            elif question_type == 'MATCHING':
+                pairs = [MatchingPair(left_text=self.random_text(2), right_text=self.random_text(2)) for _ in range(4)]
+            else:
+                question.essay_instructions = self.random_text(8)
+            graphs.append(QuestionGraph(question, options, pairs, true_false))
+
+            if len(graphs) >= BATCH_SIZE or i == count - 1:
+                save_questions(graphs)
+                for graph in graphs:
+                    if graph.question.exam_id:
+                        keys[graph.question.exam_id].append(
+                            (graph.question.id, graph.question.question_type, graph.question.marks,
+                             graph.options, graph.true_false, graph.pairs))
+                graphs = []
+                self.log(f"{i + 1}/{count} question(s)")
+        return keys
+
+    def make_answers(self, count, exams, students, keys):
+        """Enroll, answer and submit until about ``count`` answers exist."""
+        exams = [exam for exam in exams if keys[exam.id]]
+        if not exams or not students or not count:
+            return
+        per_exam = count // len(exams)
+        written = 0
+        now = timezone.now()
+
+        for exam in exams:
+            questions = keys[exam.id]
+            takers = self.rng.sample(students, min(len(students), math.ceil(per_exam / len(questions))))
+            with transaction.atomic():
+                ExamEnrollment.objects.bulk_create(
+                    [ExamEnrollment(exam=exam, student=student, status='enrolled') for student in takers],
+                    batch_size=BATCH_SIZE)
+                answers = []
+                for student in takers:
+                    skill = self.rng.random()
+                    for question_id, question_type, marks, options, true_false, pairs in questions:
+                        right = self.rng.random() < 0.3 + 0.6 * skill
+                        answer = StudentAnswer(student=student, exam=exam, question_id=question_id,
+                                               marks_earned=0, answered_at=now)
+                        if question_type == 'MCQ':
+                            choices = [option for option in options if option.is_correct == right] or options
+                            answer.selected_option_id = self.rng.choice(choices).id
+                        elif question_type == 'TRUE_FALSE':
+                            answer.is_true = true_false.is_true if right else not true_false.is_true
+                        elif question_type == 'MATCHING':
+                            answer.matching_response = {
+                                str(pair.id): pair.right_text if right else pairs[0].right_text for pair in pairs
+                            }
+                        else:
+                            answer.text_answer = self.random_text(30)
+                            answers.append(answer)
+                            continue
+                        answer.is_correct = right
+                        answer.marks_earned = marks if right else 0
+                        answers.append(answer)
+                    if len(answers) >= BATCH_SIZE:
+                        StudentAnswer.objects.bulk_create(answers, batch_size=BATCH_SIZE)
+                        written += len(answers)
+                        answers = []
+                StudentAnswer.objects.bulk_create(answers, batch_size=BATCH_SIZE)
+                written += len(answers)
+                Submission.objects.bulk_create(
+                    [Submission(exam=exam, student=student, is_marked=False) for student in takers],
+                    batch_size=BATCH_SIZE)
+            self.log(f"{written}/{count} answer(s)")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from adminpanel.models import Exam
+from core.grading import grade_exam
+from core.item_analysis import update_exam_analytics
+
+
+class Command(BaseCommand):
+    help = "Auto-grade every MCQ, true/false and matching answer of an exam."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--negative-marking', action='store_true', default=None,
+                            help="Deduct marks for wrong answers.")
+        parser.add_argument('--no-negative-marking', action='store_false', dest='negative_marking')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(id=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist.")
+
+        report = grade_exam(exam, negative_marking=options['negative_marking'])
+        self.stdout.write(self.style.SUCCESS(str(report)))
+
+        # Grades changed under the rollup, so rebuild it rather than add to it.
+        update_exam_analytics(exam, full=True)
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Subject, CustomUser
+from core.question_bank import FORMATS, IMPORT_BATCH_SIZE, guess_format, open_stream, import_questions
+
+
+class Command(BaseCommand):
+    help = "Import a question bank file (CSV, JSON/JSON Lines or QTI-style XML)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--subject', type=int, help="Subject id for rows without a subject.")
+        parser.add_argument('--user', help="Username recorded as the creator of the questions.")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+
+        subject = None
+        if options['subject']:
+            try:
+                subject = Subject.objects.get(id=options['subject'])
+            except Subject.DoesNotExist:
+                raise CommandError(f"Subject {options['subject']} does not exist.")
+
+        created_by = None
+        if options['user']:
+            try:
+                created_by = CustomUser.objects.get(username=options['user'])
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        with open(options['path'], 'rb') as binary_file:
+            report = import_questions(
+                open_stream(binary_file, fmt), fmt,
+                default_subject=subject,
+                created_by=created_by,
+                batch_size=options['batch_size'],
+            )
+
+        for row_number, message in report.errors:
+            self.stderr.write(f"Row {row_number}: {message}")
+        self.stdout.write(self.style.SUCCESS(str(report)))
@@ -0,0 +1,50 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from adminpanel.models import Exam
+from core.student_import import (
+    IMPORT_BATCH_SIZE, expire_queued, import_queued, import_students, queued_rosters,
+)
+
+
+class Command(BaseCommand):
+    help = ("Create student accounts from a CSV roster, optionally enrolling them in an exam. "
+            "With --queued, import every roster uploaded through the admin panel.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?')
+        parser.add_argument('--exam', type=int, help="Exam id to enroll the new students in.")
+        parser.add_argument('--queued', action='store_true', help="Import the rosters queued by the admin panel.")
+        parser.add_argument('--workers', type=int, help="Hashing processes (default: PASSWORD_HASH_WORKERS or CPUs).")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['queued']:
+            for name in expire_queued():
+                self.stderr.write(f"{name}: expired, deleted")
+            for name in queued_rosters():
+                report = import_queued(name, batch_size=options['batch_size'], workers=options['workers'])
+                self.stdout.write(self.style.SUCCESS(f"{name}: {report}"))
+            return
+        if not options['path']:
+            raise CommandError("Give the path of a roster or --queued.")
+
+        exam = None
+        if options['exam']:
+            try:
+                exam = Exam.objects.get(id=options['exam'])
+            except Exam.DoesNotExist:
+                raise CommandError(f"Exam {options['exam']} does not exist.")
+
+        with open(options['path'], 'rb') as binary_file:
+            report = import_students(
+                io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline=''),
+                exam=exam,
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+            )
+
+        for row_number, message in report.errors:
+            self.stderr.write(f"Row {row_number}: {message}")
+        self.stdout.write(self.style.SUCCESS(str(report)))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from adminpanel.models import Exam
+from core.certificates import issue_certificates, pending_exam_ids
+
+
+class Command(BaseCommand):
+    help = ("Issue certificates to every student who passed an exam and render their PDFs. "
+            "Without an exam id, render every certificate that has no file yet.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, nargs='?')
+        parser.add_argument('--rerender', action='store_true',
+                            help="Render every certificate again, not just the ones without a file.")
+        parser.add_argument('--workers', type=int, help="Render processes (default: CERTIFICATE_WORKERS or CPUs).")
+
+    def handle(self, *args, **options):
+        if options['exam_id'] is None:
+            exams = Exam.objects.filter(id__in=pending_exam_ids())
+        else:
+            exams = Exam.objects.filter(id=options['exam_id'])
+            if not exams.exists():
+                raise CommandError(f"Exam {options['exam_id']} does not exist.")
+
+        for exam in exams:
+            issued, rendered = issue_certificates(exam, rerender=options['rerender'], workers=options['workers'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{issued} passer(s) hold a certificate for {exam.exam_name}; {rendered} PDF(s) rendered."
+            ))
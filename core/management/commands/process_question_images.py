@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.images import QuestionImage, process_image
+
+
+class Command(BaseCommand):
+    help = "Render the resized variants of question images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Render every image again.")
+
+    def handle(self, *args, **options):
+        images = QuestionImage.objects.order_by('id')
+        if not options['all']:
+            images = images.filter(variants={})
+
+        done = failed = 0
+        for image in images.iterator():
+            try:
+                process_image(image)
+                done += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"{image.original}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"{done} image(s) processed, {failed} failed."))
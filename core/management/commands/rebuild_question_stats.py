@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import question_stats
+
+
+class Command(BaseCommand):
+    help = "Recount the question bank counters, or with --check only report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Report counters that differ from a fresh recount and exit non-zero.")
+
+    def handle(self, *args, **options):
+        drift = question_stats.find_drift()
+        for (subject_id, question_type, creator_id), (stored, actual) in sorted(drift.items(), key=str):
+            self.stdout.write(
+                f"subject={subject_id} type={question_type} creator={creator_id}: "
+                f"stored {stored}, actual {actual}"
+            )
+
+        if options['check']:
+            if drift:
+                raise CommandError(f"{len(drift)} question counter(s) out of sync.")
+            self.stdout.write(self.style.SUCCESS("Question counters are in sync."))
+            return
+
+        question_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Question counters rebuilt ({len(drift)} corrected)."))
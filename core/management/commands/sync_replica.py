@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db import sqlite_file
+from core.db_router import replica_alias
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the replica file (once, or every --interval seconds)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Keep syncing every N seconds.")
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError("No replica database is configured (see REPLICA_DATABASE).")
+        primary, replica = settings.DATABASES['default'], settings.DATABASES[alias]
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError("sync_replica only copies between SQLite databases.")
+
+        while True:
+            started = time.monotonic()
+            self.sync(sqlite_file(primary['NAME']), sqlite_file(replica['NAME']))
+            self.stdout.write(f"Replica synced in {time.monotonic() - started:.2f}s")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def sync(primary, replica):
+        """Snapshot ``primary`` into a temporary file, then swap it in for ``replica``.
+
+        The backup runs in one step, inside a single read transaction, so
+        writes to the primary cannot restart it (in WAL mode they are not
+        blocked either).  Connections that have the old replica open keep
+        reading the old file until they reconnect; new ones see the copy.
+        """
+        temporary = f"{replica}.sync-{os.getpid()}"
+        source = sqlite3.connect(primary)
+        target = sqlite3.connect(temporary)
+        try:
+            source.backup(target)
+            # A WAL header copied from the primary would make readers look
+            # for a -wal file that belongs to the previous replica.
+            target.execute("PRAGMA journal_mode=DELETE")
+        except BaseException:
+            target.close()
+            os.remove(temporary)
+            raise
+        finally:
+            source.close()
+        target.close()
+        os.replace(temporary, replica)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from adminpanel.models import Exam
+from core.item_analysis import update_exam_analytics, stale_exams
+
+
+class Command(BaseCommand):
+    help = "Fold new submissions into the exam analytics rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int,
+                            help="Exams to update (default: every exam with new submissions).")
+        parser.add_argument('--full', action='store_true',
+                            help="Recompute from scratch instead of only adding new submissions.")
+
+    def handle(self, *args, **options):
+        if options['exam_ids']:
+            exams = Exam.objects.filter(id__in=options['exam_ids'])
+            missing = set(options['exam_ids']) - set(exams.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Exam(s) {', '.join(map(str, sorted(missing)))} do not exist.")
+        elif options['full']:
+            exams = Exam.objects.all()
+        else:
+            exams = stale_exams()
+
+        for exam in exams:
+            rollup = update_exam_analytics(exam, full=options['full'])
+            self.stdout.write(f"{exam.exam_name}: {rollup.submissions} submission(s), "
+                              f"{len(rollup.items)} question(s)")
+        self.stdout.write(self.style.SUCCESS("Item analysis up to date."))
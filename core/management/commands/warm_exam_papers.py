@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from adminpanel.models import Exam
+from core import paper_cache
+from examinerpanel.models import Examination
+
+
+class Command(BaseCommand):
+    help = "Compile and cache the papers of exams starting within the next --minutes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=60)
+
+    def handle(self, *args, **options):
+        now = timezone.localtime()
+        until = now + timedelta(minutes=options['minutes'])
+
+        warmed = 0
+        for model in (Exam, Examination):
+            exams = model.objects.filter(exam_date__gte=now.date(), exam_date__lte=until.date())
+            for exam in exams:
+                starts = timezone.make_aware(datetime.combine(exam.exam_date, exam.start_time))
+                if now <= starts <= until:
+                    paper_cache.warm_paper(exam)
+                    warmed += 1
+                    self.stdout.write(f"Warmed {paper_cache.exam_kind(exam)} {exam.id}: {exam.exam_name}")
+
+        self.stdout.write(self.style.SUCCESS(f"{warmed} paper(s) compiled."))
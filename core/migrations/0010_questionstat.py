@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_question_stats(apps, schema_editor):
+    Question = apps.get_model('core', 'Question')
+    QuestionStat = apps.get_model('core', 'QuestionStat')
+    rows = Question.objects.values('subject_id', 'question_type', 'created_by_id').annotate(n=models.Count('id'))
+    totals = {}
+    for row in rows:
+        key = (row['subject_id'], row['question_type'], row['created_by_id'] or 0)
+        totals[key] = totals.get(key, 0) + row['n']
+    QuestionStat.objects.bulk_create([
+        QuestionStat(subject_id=subject_id, question_type=question_type, creator_id=creator_id, count=n)
+        for (subject_id, question_type, creator_id), n in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_question_created_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_type', models.CharField(max_length=10)),
+                ('creator_id', models.BigIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='core.subject')),
+            ],
+            options={
+                'unique_together': {('subject', 'question_type', 'creator_id')},
+            },
+        ),
+        migrations.RunPython(populate_question_stats, migrations.RunPython.noop),
+    ]
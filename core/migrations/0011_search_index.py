@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# The DDL is spelled out here rather than imported from core.search, so
+# the migration keeps working whatever the app code looks like later.
+USER_FTS_TABLE = 'core_user_fts'
+QUESTION_FTS_TABLE = 'core_question_fts'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_FTS_TABLE} "
+            "USING fts5(full_name, email, username, tokenize='unicode61', prefix='2 3')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {QUESTION_FTS_TABLE} "
+            "USING fts5(text, tags, explanation, tokenize='unicode61', prefix='2 3')"
+        )
+        cursor.execute(
+            f"INSERT INTO {USER_FTS_TABLE} (rowid, full_name, email, username) "
+            "SELECT id, COALESCE(full_name, ''), COALESCE(email, ''), COALESCE(username, '') FROM core_customuser"
+        )
+        cursor.execute(
+            f"INSERT INTO {QUESTION_FTS_TABLE} (rowid, text, tags, explanation) "
+            "SELECT id, COALESCE(text, ''), COALESCE(tags, ''), COALESCE(explanation, '') FROM core_question"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {QUESTION_FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_questionstat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+STATUS_FIELDS = {
+    'enrolled': 'approved',
+    'pending': 'pending',
+    'rejected': 'rejected',
+}
+
+
+def populate_enrollment_stats(apps, schema_editor):
+    ExamEnrollment = apps.get_model('studentpanel', 'ExamEnrollment')
+    ExamEnrollmentStats = apps.get_model('core', 'ExamEnrollmentStats')
+    stats = {}
+    for row in ExamEnrollment.objects.values('exam_id', 'status').annotate(n=models.Count('id')):
+        if row['status'] not in STATUS_FIELDS:
+            continue
+        stat = stats.setdefault(row['exam_id'], ExamEnrollmentStats(exam_id=row['exam_id']))
+        setattr(stat, STATUS_FIELDS[row['status']], row['n'])
+    ExamEnrollmentStats.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_search_index'),
+        ('adminpanel', '0004_delete_option_delete_question_delete_truefalseanswer'),
+        ('studentpanel', '0005_examenrollment_status_examinerexamenrollment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamEnrollmentStats',
+            fields=[
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='enrollment_stats', serialize=False, to='adminpanel.exam')),
+                ('approved', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_enrollment_stats, migrations.RunPython.noop),
+    ]
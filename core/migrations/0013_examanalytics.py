@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_examenrollmentstats'),
+        ('adminpanel', '0004_delete_option_delete_question_delete_truefalseanswer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamAnalytics',
+            fields=[
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analytics', serialize=False, to='adminpanel.exam')),
+                ('submissions', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sum_sq', models.FloatField(default=0)),
+                ('passed', models.IntegerField(default=0)),
+                ('score_histogram', models.JSONField(default=dict)),
+                ('items', models.JSONField(default=dict)),
+                ('last_submission_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
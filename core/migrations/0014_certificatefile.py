@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_examanalytics'),
+        ('studentpanel', '0005_examenrollment_status_examinerexamenrollment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificateFile',
+            fields=[
+                ('certificate', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='file', serialize=False, to='studentpanel.certificate')),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
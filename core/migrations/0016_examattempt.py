@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_questionimage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('exam', 'Exam'), ('examination', 'Examination')], max_length=12)),
+                ('exam_id', models.PositiveIntegerField()),
+                ('number', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(choices=[('started', 'Started'), ('in_progress', 'In progress'), ('submitted', 'Submitted'), ('expired', 'Expired')], default='started', max_length=12)),
+                ('started_at', models.DateTimeField()),
+                ('deadline', models.DateTimeField(blank=True, null=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('kind', 'exam_id', 'student', 'number')},
+                'indexes': [models.Index(fields=['status', 'deadline'], name='core_attempt_deadline_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,211 @@
+"""
+Keyset (cursor) pagination for the large admin and examiner listings.
+
+Django's ``Paginator`` issues ``COUNT(*)`` plus ``OFFSET n LIMIT k`` for
+every page, so deep pages get slower as tables grow.  ``KeysetPaginator``
+instead remembers the sort key of the last row it returned and asks for
+rows strictly after it, which costs the same on page 1 and page 10,000.
+The primary key is always added as the final tie-breaker so rows with
+equal sort values are neither skipped nor repeated.
+
+Cursors are signed, opaque strings; pass them back as ``?cursor=``.
+"""
+import datetime
+import decimal
+import json
+import operator
+from functools import reduce
+
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+# Totals above this are reported as "<cap>+" instead of being counted.
+DEFAULT_COUNT_CAP = 1000
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Tag dates, datetimes and decimals so they decode to the same value.
+
+    ``DjangoJSONEncoder`` cuts datetimes to milliseconds, which would make
+    a cursor seek past rows created within the same millisecond.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return {'$dt': o.isoformat()}
+        if isinstance(o, datetime.date):
+            return {'$d': o.isoformat()}
+        if isinstance(o, decimal.Decimal):
+            return {'$dec': str(o)}
+        return super().default(o)
+
+
+_DECODERS = {
+    '$dt': datetime.datetime.fromisoformat,
+    '$d': datetime.date.fromisoformat,
+    '$dec': decimal.Decimal,
+}
+
+
+def _decode_value(obj):
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        if tag in _DECODERS:
+            return _DECODERS[tag](value)
+    return obj
+
+
+class _CursorSerializer:
+    """Signing serializer that round-trips dates, datetimes and decimals exactly."""
+
+    def dumps(self, obj):
+        return json.dumps(obj, cls=_CursorEncoder, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'), object_hook=_decode_value)
+
+
+def encode_cursor(values, direction):
+    return signing.dumps({'v': values, 'd': direction}, salt=CURSOR_SALT,
+                         serializer=_CursorSerializer, compress=True)
+
+
+def decode_cursor(cursor):
+    """Return ``(values, direction)`` or ``(None, None)`` for a bad cursor."""
+    if not cursor:
+        return None, None
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT, serializer=_CursorSerializer)
+        return data['v'], data['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError, decimal.InvalidOperation):
+        return None, None
+
+
+def approximate_count(queryset, cap=DEFAULT_COUNT_CAP):
+    """Count at most ``cap + 1`` rows; returns ``(count, is_exact)``."""
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+class KeysetPage:
+    """One page of results; iterate it like a ``Paginator`` page."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, total=None, total_is_exact=True):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+        self.total_is_exact = total_is_exact
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def total_display(self):
+        if self.total is None:
+            return ''
+        return str(self.total) if self.total_is_exact else f"{self.total}+"
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """Paginate ``queryset`` by ``ordering`` without OFFSET or COUNT.
+
+    ``ordering`` uses ``order_by`` syntax (``'-created_at'``,
+    ``'subject__name'``); ``id`` is appended with the direction of the
+    last key if it is not already there.  Every ordering column must be
+    non-null.
+    """
+
+    def __init__(self, queryset, ordering, per_page, count_cap=None):
+        ordering = list(ordering)
+        last_desc = ordering[-1].startswith('-') if ordering else False
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if last_desc else 'id')
+
+        self.queryset = queryset
+        self.keys = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.per_page = per_page
+        self.count_cap = count_cap
+
+    def _order(self, reverse=False):
+        return [
+            f"{'-' if desc != reverse else ''}{field}"
+            for field, desc in self.keys
+        ]
+
+    def _after(self, values, reverse=False):
+        """Filter for rows that sort strictly after ``values``."""
+        clauses = []
+        for i, (field, desc) in enumerate(self.keys):
+            lookup = 'lt' if desc != reverse else 'gt'
+            clause = Q(**{f'{field}__{lookup}': values[i]})
+            for j in range(i):
+                clause &= Q(**{self.keys[j][0]: values[j]})
+            clauses.append(clause)
+        return reduce(operator.or_, clauses)
+
+    def _values(self, obj):
+        values = []
+        for field, _ in self.keys:
+            value = obj
+            for part in field.split('__'):
+                value = getattr(value, part)
+            values.append(value)
+        return values
+
+    def get_page(self, cursor=None):
+        values, direction = decode_cursor(cursor)
+        if values is not None and len(values) != len(self.keys):
+            values, direction = None, None
+        backwards = direction == 'prev'
+
+        queryset = self.queryset.order_by(*self._order(reverse=backwards))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse=backwards))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = encode_cursor(self._values(rows[-1]), 'next')
+            if values is not None and (has_more or not backwards):
+                previous_cursor = encode_cursor(self._values(rows[0]), 'prev')
+
+        total, exact = None, True
+        if self.count_cap:
+            total, exact = approximate_count(self.queryset, self.count_cap)
+        return KeysetPage(rows, next_cursor, previous_cursor, total, exact)
+
+
+def keyset_page(request, queryset, ordering, per_page, count_cap=None):
+    """Shortcut for views: paginate using the ``cursor`` GET parameter."""
+    paginator = KeysetPaginator(queryset, ordering, per_page, count_cap=count_cap)
+    return paginator.get_page(request.GET.get('cursor'))
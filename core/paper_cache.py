@@ -0,0 +1,281 @@
+"""
+Precompiled, versioned exam papers.
+
+When an exam opens every enrolled student asks for the same paper
+within a few seconds.  Instead of rebuilding it from the question tables
+for each request, the paper is compiled once into an immutable JSON
+blob with the answer key stripped out and cached at two levels:
+
+* a small in-process LRU, so repeat fetches on a worker cost a dict
+  lookup;
+* the shared Django cache named by ``PAPER_CACHE_ALIAS`` (``default``
+  unless configured), so workers and nodes share one compiled copy.
+
+Every exam has a version token in the shared cache.  Any change to the
+exam or its questions replaces the token, which makes every cached copy
+of the old version unreachable.  That only holds when the cache is
+shared by every worker: with a per-process backend (``LocMemCache``,
+``DummyCache``) another worker would never see the new token and would
+keep serving the old paper, so papers are not cached at all and every
+fetch compiles from the database.  ``PAPER_CACHE_SHARED`` overrides the
+guess for other backends, as ``PRINCIPAL_CACHE_SHARED`` does for
+``core.principal``.  Answer children have no receivers of
+their own (that would turn off Django's fast delete for them): they are
+written through ``core.question_service``, which saves or bulk-inserts
+their question in the same transaction.
+``warm_exam_papers`` compiles papers ahead of their start time.
+"""
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from adminpanel.models import Exam
+from core import principal
+from core.models import Question
+from core.exam_graph import load_exam_graph
+from core.images import QuestionImage
+from examinerpanel.models import Examination
+
+EXAM = 'exam'
+EXAMINATION = 'examination'
+KINDS = {EXAM: Exam, EXAMINATION: Examination}
+
+LOCAL_CACHE_SIZE = 64
+PAPER_TIMEOUT = 24 * 60 * 60
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+_compile_locks = {}
+
+
+def _cache():
+    return caches[getattr(settings, 'PAPER_CACHE_ALIAS', 'default')]
+
+
+def cache_is_shared():
+    """True if a version token replaced by one worker is seen by all of them."""
+    return principal.is_shared(_cache(), getattr(settings, 'PAPER_CACHE_SHARED', None))
+
+
+def exam_kind(exam):
+    return EXAMINATION if isinstance(exam, Examination) else EXAM
+
+
+def _version_key(kind, exam_id):
+    return f'paper:version:{kind}:{exam_id}'
+
+
+def _paper_key(kind, exam_id, version):
+    return f'paper:blob:{kind}:{exam_id}:{version}'
+
+
+def get_version(kind, exam_id):
+    """Return the current version token, creating one if there is none."""
+    cache = _cache()
+    key = _version_key(kind, exam_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(kind, exam_id):
+    """Retire every compiled copy of this exam's paper.
+
+    The new token is published once the surrounding transaction commits,
+    so a paper compiled in between cannot be cached under it.
+    """
+    key = _version_key(kind, exam_id)
+    transaction.on_commit(lambda: _cache().set(key, uuid.uuid4().hex, None))
+
+
+def invalidate_exams(exam_id=None, examination_id=None):
+    if exam_id:
+        invalidate(EXAM, exam_id)
+    if examination_id:
+        invalidate(EXAMINATION, examination_id)
+
+
+def compile_paper(exam, version):
+    """Serialize ``exam`` into the student-facing paper (no answer key)."""
+    graph = load_exam_graph(exam, with_enrollments=False)
+    questions = []
+    for question in reversed(graph.questions):  # oldest first on the paper
+        item = {
+            'id': question.id,
+            'type': question.question_type,
+            'text': question.text,
+            'marks': question.marks,
+            'image': question.image_url,
+        }
+        if question.question_type == 'MCQ':
+            item['options'] = [{'id': option.id, 'text': option.text} for option in question.options]
+        elif question.question_type == 'MATCHING':
+            # Left items keep their pair id; the right column is sorted so
+            # its order does not give the pairing away.
+            item['left'] = [{'id': pair.id, 'text': pair.left_text} for pair in question.pairs]
+            item['right'] = sorted(pair.right_text for pair in question.pairs)
+        elif question.question_type == 'ESSAY':
+            item['instructions'] = question.essay_instructions
+        questions.append(item)
+
+    paper = {
+        'kind': exam_kind(exam),
+        'exam_id': exam.id,
+        'version': version,
+        'name': exam.exam_name,
+        'exam_date': exam.exam_date,
+        'start_time': exam.start_time,
+        'duration_minutes': getattr(exam, 'duration_minutes', None) or getattr(exam, 'duration', None),
+        'total_marks': graph.total_marks,
+        # Examination-only paper settings; plain Exams use every question in order.
+        'selection_mode': getattr(exam, 'selection_mode', None),
+        'number_of_questions': getattr(exam, 'number_of_questions', 0),
+        'shuffle_questions': getattr(exam, 'shuffle_questions', False),
+        'shuffle_options': getattr(exam, 'shuffle_options', False),
+        'questions': questions,
+    }
+    return json.dumps(paper, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def _remember(key, blob):
+    with _local_lock:
+        _local[key] = blob
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_CACHE_SIZE:
+            _local.popitem(last=False)
+
+
+def get_paper(kind, exam_id):
+    """Return the compiled paper blob, compiling it at most once per version.
+
+    Only a cache miss on a new version reads the database; concurrent
+    misses on one worker wait for a single compile.  Without a shared
+    cache every call compiles, so no worker can serve a retired paper.
+    """
+    if not cache_is_shared():
+        exam = KINDS[kind].objects.get(id=exam_id)
+        return compile_paper(exam, None)
+
+    version = get_version(kind, exam_id)
+    key = _paper_key(kind, exam_id, version)
+
+    blob = _local.get(key)
+    if blob is not None:
+        return blob
+
+    blob = _cache().get(key)
+    if blob is None:
+        with _local_lock:
+            lock = _compile_locks.setdefault(key, threading.Lock())
+        with lock:
+            blob = _local.get(key) or _cache().get(key)
+            if blob is None:
+                exam = KINDS[kind].objects.get(id=exam_id)
+                blob = compile_paper(exam, version)
+                _cache().set(key, blob, PAPER_TIMEOUT)
+        with _local_lock:
+            _compile_locks.pop(key, None)
+
+    _remember(key, blob)
+    return blob
+
+
+def get_paper_data(kind, exam_id):
+    """Return the compiled paper as a parsed dict, parsed once per version.
+
+    Callers must treat the result as read-only; it is shared between
+    requests.
+    """
+    blob = get_paper(kind, exam_id)
+    key = ('parsed', kind, exam_id)
+    cached = _local.get(key)
+    if cached is not None and cached[0] is blob:
+        return cached[1]
+    data = json.loads(blob)
+    _remember(key, (blob, data))
+    return data
+
+
+def get_answer_index(kind, exam_id):
+    """``{question id: frozenset of option ids}`` for the compiled paper.
+
+    Used to check autosaved answers before they are buffered; built once
+    per paper version, like ``get_paper_data``.
+    """
+    data = get_paper_data(kind, exam_id)
+    key = ('answers', kind, exam_id)
+    cached = _local.get(key)
+    if cached is not None and cached[0] is data:
+        return cached[1]
+    index = {
+        question['id']: frozenset(option['id'] for option in question.get('options', ()))
+        for question in data['questions']
+    }
+    _remember(key, (data, index))
+    return index
+
+
+def opens_at(data):
+    """When the paper ``data`` may first be shown, in the current time zone."""
+    starts = datetime.combine(date.fromisoformat(data['exam_date']),
+                              time.fromisoformat(data['start_time'] or '00:00'))
+    return timezone.make_aware(starts)
+
+
+def has_opened(kind, exam_id):
+    """True once the exam's ``exam_date`` and ``start_time`` have passed."""
+    return timezone.now() >= opens_at(get_paper_data(kind, exam_id))
+
+
+def warm_paper(exam):
+    """Compile and cache ``exam``'s paper ahead of time."""
+    return get_paper(exam_kind(exam), exam.id)
+
+
+@receiver(post_init, sender=Question)
+def remember_paper_exams(sender, instance, **kwargs):
+    instance._paper_exams = (instance.exam_id, instance.examination_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_paper(sender, instance, **kwargs):
+    invalidate_exams(instance.exam_id, instance.examination_id)
+    # A question moved to another exam also changes the exam it left.
+    old_exam_id, old_examination_id = instance._paper_exams
+    if old_exam_id != instance.exam_id:
+        invalidate_exams(exam_id=old_exam_id)
+    if old_examination_id != instance.examination_id:
+        invalidate_exams(examination_id=old_examination_id)
+    instance._paper_exams = (instance.exam_id, instance.examination_id)
+
+
+@receiver(post_save, sender=QuestionImage)
+def invalidate_image_papers(sender, instance, **kwargs):
+    # Papers switch to the resized variants once they are rendered.
+    for exam_id, examination_id in (Question.objects.filter(image=instance.original)
+                                    .values_list('exam_id', 'examination_id').distinct()):
+        invalidate_exams(exam_id, examination_id)
+
+
+@receiver(post_save, sender=Exam)
+def invalidate_exam_paper(sender, instance, **kwargs):
+    invalidate(EXAM, instance.id)
+
+
+@receiver(post_save, sender=Examination)
+def invalidate_examination_paper(sender, instance, **kwargs):
+    # Examination.updated_at moves on every edit, so any save is a new version.
+    invalidate(EXAMINATION, instance.id)
@@ -0,0 +1,91 @@
+"""
+Deterministic per-student papers.
+
+``Examination`` can ask for a random subset of its questions
+(``selection_mode='random'`` with ``number_of_questions``), shuffled
+question order and shuffled options.  Rather than sorting the bank with
+``order_by('?')`` for each student and storing the result, every paper
+is derived from a seed computed from (exam, student, attempt):
+
+* the k questions are drawn with ``random.sample`` over the sorted
+  question ids of the cached compiled paper, and options are shuffled
+  in id order, so editing a question never changes anyone's selection;
+* question and option order come from the same seed.
+
+Adding or removing questions mid-exam would still change the draw, so
+the selected ids are stored on the student's ``ExamAttempt`` when the
+paper is first served; later fetches (resume) and grading read them
+back through ``question_ids``.
+"""
+import hashlib
+import random
+
+from core import paper_cache
+
+
+def paper_seed(kind, exam_id, student_id, attempt):
+    digest = hashlib.sha256(f'{kind}:{exam_id}:{student_id}:{attempt}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def _select(rng, paper):
+    """Return the ids of this paper's questions, in display order."""
+    paper_order = [question['id'] for question in paper['questions']]
+    ids = sorted(paper_order)
+    k = paper.get('number_of_questions') or 0
+    if paper.get('selection_mode') == 'random' and 0 < k < len(ids):
+        chosen = rng.sample(ids, k)
+        if not paper.get('shuffle_questions'):
+            picked = set(chosen)
+            chosen = [question_id for question_id in paper_order if question_id in picked]
+        return chosen
+
+    if paper.get('shuffle_questions'):
+        rng.shuffle(ids)
+        return ids
+    return paper_order
+
+
+def generate_paper(kind, exam_id, student_id, attempt=1, question_ids=None):
+    """Build this student's paper from the cached compiled paper.
+
+    ``question_ids`` (the selection stored on the attempt) replaces the
+    seeded draw; questions deleted since are left out.  Returns a new
+    dict; the shared cached paper is never modified.
+    """
+    paper = paper_cache.get_paper_data(kind, exam_id)
+    seed = paper_seed(kind, exam_id, student_id, attempt)
+    rng = random.Random(seed)
+    shuffle_options = paper.get('shuffle_options')
+    by_id = {question['id']: question for question in paper['questions']}
+    if question_ids is None:
+        question_ids = _select(rng, paper)
+
+    questions = []
+    for question_id in question_ids:
+        question = by_id.get(question_id)
+        if question is None:
+            continue
+        if shuffle_options and ('options' in question or 'right' in question):
+            question = dict(question)
+            option_rng = random.Random(seed ^ question['id'])
+            if 'options' in question:
+                options = sorted(question['options'], key=lambda option: option['id'])
+                question['options'] = option_rng.sample(options, len(options))
+            if 'right' in question:
+                question['right'] = option_rng.sample(question['right'], len(question['right']))
+        questions.append(question)
+
+    generated = {key: value for key, value in paper.items() if key != 'questions'}
+    generated.update({
+        'student_id': student_id,
+        'attempt': attempt,
+        'questions': questions,
+        'total_marks': sum(question['marks'] for question in questions),
+    })
+    return generated
+
+
+def selected_question_ids(kind, exam_id, student_id, attempt=1):
+    """Ids of the questions the seeded draw puts on this student's paper."""
+    return [question['id'] for question in generate_paper(kind, exam_id, student_id, attempt)['questions']]
@@ -0,0 +1,166 @@
+"""
+Session-cached principal for ``role_required``.
+
+``core.decorators.role_required`` reads ``request.user.role``, which
+loads the ``CustomUser`` row on every request.  The drop-in
+``role_required`` here first looks for a small principal stored in the
+session, ``{'id', 'role', 'is_active', 'version'}``, and authorizes
+from it without touching ``core_customuser``.  The view gets it as
+``request.principal``; reading ``request.user`` still works but loads
+the user as before.
+
+A principal is only trusted while its version matches the user's
+version stamp in the shared cache (``PRINCIPAL_CACHE_ALIAS``, default
+``default``).  Saving a user with a different role, active flag or
+password, or deleting one, replaces the stamp, so ``suspend_user``,
+``delete_user`` and role edits take effect on that user's very next
+request.  That only holds when the cache is shared by every worker: with
+a per-process backend (``LocMemCache``, ``DummyCache``) the session
+principal is never trusted and every request goes through the original
+decorator, as before.  ``PRINCIPAL_CACHE_SHARED`` overrides the guess
+for other backends.  Stamps also expire after
+``PRINCIPAL_VERSION_TIMEOUT`` seconds (default 300), which bounds how
+long a lost invalidation can keep a principal alive.  On a stale or
+missing principal the request goes through the original decorator,
+which loads the user and refreshes the principal on the way.
+"""
+import uuid
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from core import decorators
+from core.models import CustomUser
+
+SESSION_PRINCIPAL = '_principal'
+
+Principal = namedtuple('Principal', 'id role is_active version')
+
+
+# Backends whose entries are private to one process.
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _cache():
+    return caches[getattr(settings, 'PRINCIPAL_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'PRINCIPAL_VERSION_TIMEOUT', 300)
+
+
+def is_shared(cache, override=None):
+    """True if ``cache`` entries written by one worker are seen by all of them.
+
+    ``override`` (a ``*_CACHE_SHARED`` setting) wins over the guess made
+    from the backend class.
+    """
+    if override is not None:
+        return override
+    backend = type(cache)
+    return f'{backend.__module__}.{backend.__qualname__}' not in LOCAL_BACKENDS
+
+
+def cache_is_shared():
+    """True if a version stamp written by one worker is seen by all of them."""
+    return is_shared(_cache(), getattr(settings, 'PRINCIPAL_CACHE_SHARED', None))
+
+
+def _version_key(user_id):
+    return f'principal:version:{user_id}'
+
+
+def get_version(user_id):
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, _timeout())
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    """Invalidate every cached principal of ``user_id`` once the change commits."""
+    key = _version_key(user_id)
+    transaction.on_commit(lambda: _cache().set(key, uuid.uuid4().hex, _timeout()))
+
+
+def remember(request, user, version):
+    """Store ``user``'s principal in the session and return it.
+
+    ``version`` must be read before ``user`` was loaded, so a change
+    committed in between leaves the principal stale rather than current.
+    """
+    principal = Principal(user.id, user.role, user.is_active, version)
+    request.session[SESSION_PRINCIPAL] = list(principal)
+    return principal
+
+
+def cached_principal(request):
+    """The session's principal if it is still current, else ``None``."""
+    stored = request.session.get(SESSION_PRINCIPAL)
+    if not stored or not cache_is_shared():
+        return None
+    principal = Principal(*stored)
+    if str(principal.id) != str(request.session.get(SESSION_KEY)):
+        return None
+    if principal.version != _cache().get(_version_key(principal.id)):
+        return None
+    return principal
+
+
+def role_required(role):
+    """``core.decorators.role_required`` that authorizes from the session."""
+    def decorator(view_func):
+        checked = decorators.role_required(role)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            principal = cached_principal(request)
+            if principal is not None and principal.is_active and principal.role == role:
+                request.principal = principal
+                return view_func(request, *args, **kwargs)
+
+            user_id = request.session.get(SESSION_KEY)
+            version = get_version(user_id) if user_id else None
+            user = request.user
+            if user.is_authenticated and str(user.id) == str(user_id):
+                request.principal = remember(request, user, version)
+            else:
+                request.session.pop(SESSION_PRINCIPAL, None)
+            return checked(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _principal_fields(user):
+    # Read from __dict__ so deferred fields are not loaded just for this.
+    return tuple(user.__dict__.get(field) for field in ('role', 'is_active', 'password'))
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_principal_fields(sender, instance, **kwargs):
+    instance._principal_fields = _principal_fields(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def bump_changed_principal(sender, instance, created, **kwargs):
+    current = _principal_fields(instance)
+    if not created and current != instance._principal_fields:
+        bump_version(instance.id)
+    instance._principal_fields = current
+
+
+@receiver(post_delete, sender=CustomUser)
+def bump_deleted_principal(sender, instance, **kwargs):
+    bump_version(instance.id)
@@ -0,0 +1,411 @@
+"""
+Bulk import and export of question banks.
+
+Supported formats:
+
+* ``csv``  - one question per row.  ``options`` and ``pairs`` are ``|``
+  separated, pairs are written ``left=right``, ``correct`` holds the
+  1-based index(es) of the correct options and ``answer`` is
+  ``true``/``false`` for true/false items.
+* ``json`` - JSON Lines (one object per line) or a single JSON array of
+  objects using the same keys, with ``options`` as
+  ``[{"text": ..., "is_correct": ...}]`` and ``pairs`` as
+  ``[{"left": ..., "right": ...}]``.
+* ``qti``  - a QTI-style XML document of ``<item>`` elements.
+
+Files are parsed incrementally and written in batches, so memory use
+does not grow with the size of the bank.
+"""
+import csv
+import io
+import json
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db import transaction
+
+from core.models import Question, Option, MatchingPair, TrueFalseAnswer, Subject
+from core.question_service import QuestionGraph, validate_question, save_questions
+
+FORMATS = ('csv', 'json', 'qti')
+
+CSV_COLUMNS = [
+    'question_type', 'text', 'marks', 'subject', 'tags', 'difficulty_level',
+    'explanation', 'essay_instructions', 'options', 'correct', 'pairs', 'answer',
+]
+
+# Optional Question fields copied straight from a row when present.
+PLAIN_FIELDS = ('tags', 'difficulty_level', 'explanation', 'essay_instructions')
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+JSON_READ_SIZE = 64 * 1024
+# An array element still unparsed after this much text is rejected
+# instead of buffering the rest of the file.
+JSON_MAX_ROW_SIZE = 1024 * 1024
+
+
+class ImportReport:
+    """Outcome of an import: how many rows were saved and which failed."""
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # [(row_number, message)]
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def __str__(self):
+        return f"{self.created} question(s) imported, {len(self.errors)} row(s) rejected"
+
+
+def open_stream(binary_file, fmt):
+    """Wrap a binary file the way the reader for ``fmt`` expects it."""
+    if fmt == 'qti':
+        return binary_file
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def guess_format(filename):
+    name = (filename or '').lower()
+    if name.endswith(('.json', '.jsonl')):
+        return 'json'
+    if name.endswith('.xml'):
+        return 'qti'
+    return 'csv'
+
+
+# --- Readers -----------------------------------------------------------------
+# Every reader yields (row_number, row) where row is a dict in the JSON shape,
+# or a MalformedRow in place of a row that could not be parsed.
+
+class MalformedRow(ValueError):
+    """Stands in for a row a reader could not parse; the import reports it."""
+
+def _split(value):
+    return [part.strip() for part in (value or '').split('|') if part.strip()]
+
+
+def iter_csv_rows(fileobj):
+    reader = csv.DictReader(fileobj)
+    for row_number, record in enumerate(reader, start=2):  # header is line 1
+        correct = {int(i) for i in _split(record.get('correct')) if i.isdigit()}
+        pairs = []
+        for item in _split(record.get('pairs')):
+            left, _, right = item.partition('=')
+            pairs.append({'left': left.strip(), 'right': right.strip()})
+        row = {key: record.get(key) for key in CSV_COLUMNS if record.get(key)}
+        row['options'] = [
+            {'text': text, 'is_correct': index in correct}
+            for index, text in enumerate(_split(record.get('options')), start=1)
+        ]
+        row['pairs'] = pairs
+        yield row_number, row
+
+
+def _incomplete(exc, buffer):
+    """Whether ``exc`` only means the element continues past ``buffer``."""
+    # Truncated literals ("fals", "-1e") fail a few characters before the end.
+    return exc.msg.startswith('Unterminated string') or len(buffer) - exc.pos <= 8
+
+
+def iter_json_rows(fileobj):
+    """Yield objects from JSON Lines or from one top-level JSON array.
+
+    A bad line in JSON Lines is reported and skipped.  A bad element of an
+    array ends the read, since the next element cannot be found reliably.
+    """
+    decoder = json.JSONDecoder()
+    buffer = fileobj.read(JSON_READ_SIZE).lstrip()
+
+    if not buffer.startswith('['):
+        row_number = 0
+        for line in _chain_lines(buffer, fileobj):
+            row_number += 1
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                row = MalformedRow(f"invalid JSON: {exc}")
+            yield row_number, row
+        return
+
+    buffer = buffer[1:]
+    row_number = 0
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as exc:
+            if not eof and len(buffer) < JSON_MAX_ROW_SIZE and _incomplete(exc, buffer):
+                chunk = fileobj.read(JSON_READ_SIZE)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield row_number + 1, MalformedRow(f"invalid JSON, the rest of the file was not read: {exc}")
+            return
+        row_number += 1
+        yield row_number, obj
+        buffer = buffer[end:]
+
+
+def _chain_lines(head, fileobj):
+    pending = head
+    for chunk in iter(lambda: fileobj.read(JSON_READ_SIZE), ''):
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_qti_rows(fileobj):
+    """Yield rows from ``<item>`` elements, discarding each once read."""
+    row_number = 0
+    open_elements = []
+    for event, elem in ET.iterparse(fileobj, events=('start', 'end')):
+        if event == 'start':
+            open_elements.append(elem)
+            continue
+        open_elements.pop()
+        if elem.tag != 'item':
+            continue
+        row_number += 1
+        row = dict(elem.attrib)
+        row['question_type'] = row.pop('type', None)
+        row['text'] = elem.findtext('text', '').strip()
+        for field in PLAIN_FIELDS:
+            value = elem.findtext(field)
+            if value:
+                row[field] = value.strip()
+        row['options'] = [
+            {'text': (opt.text or '').strip(), 'is_correct': opt.get('correct') == 'true'}
+            for opt in elem.findall('option')
+        ]
+        row['pairs'] = [
+            {'left': pair.get('left', ''), 'right': pair.get('right', '')}
+            for pair in elem.findall('pair')
+        ]
+        answer = elem.findtext('answer')
+        if answer:
+            row['answer'] = answer.strip()
+        # Detach the item from its parent too, or the tree keeps every item.
+        if open_elements:
+            open_elements[-1].remove(elem)
+        elem.clear()
+        yield row_number, row
+
+
+READERS = {
+    'csv': iter_csv_rows,
+    'json': iter_json_rows,
+    'qti': iter_qti_rows,
+}
+
+
+# --- Import ------------------------------------------------------------------
+
+def _load_subjects():
+    subjects = {}
+    for subject in Subject.objects.all():
+        subjects[str(subject.id)] = subject
+        subjects[subject.name.lower()] = subject
+    return subjects
+
+
+def build_graph(row, subjects, default_subject=None, created_by=None):
+    """Turn one parsed row into an unsaved ``QuestionGraph``."""
+    subject = default_subject
+    subject_key = str(row.get('subject') or '').strip().lower()
+    if subject_key:
+        if subject_key not in subjects:
+            raise ValueError(f"unknown subject '{row['subject']}'")
+        subject = subjects[subject_key]
+
+    question = Question(
+        question_type=(row.get('question_type') or '').strip().upper(),
+        text=(row.get('text') or '').strip(),
+        marks=int(row.get('marks') or 1),
+        subject=subject,
+        created_by=created_by,
+    )
+    for field in PLAIN_FIELDS:
+        if row.get(field):
+            setattr(question, field, row[field])
+
+    options, pairs, true_false = [], [], None
+    if question.question_type == 'MCQ':
+        options = [
+            Option(text=item['text'], is_correct=bool(item.get('is_correct')))
+            for item in row.get('options') or [] if item.get('text')
+        ]
+    elif question.question_type == 'MATCHING':
+        pairs = [
+            MatchingPair(left_text=item['left'], right_text=item['right'])
+            for item in row.get('pairs') or [] if item.get('left') and item.get('right')
+        ]
+    elif question.question_type == 'TRUE_FALSE':
+        answer = str(row.get('answer', '')).strip().lower()
+        if answer in ('true', 'false'):
+            true_false = TrueFalseAnswer(is_true=(answer == 'true'))
+
+    return QuestionGraph(question, options, pairs, true_false)
+
+
+def import_questions(fileobj, fmt='csv', default_subject=None, created_by=None,
+                     batch_size=IMPORT_BATCH_SIZE):
+    """Validate and insert every question in ``fileobj``.
+
+    Each batch of valid rows is committed in its own transaction, so a bad
+    row never rolls back the rest of the bank.  Returns an ``ImportReport``.
+    """
+    report = ImportReport()
+    subjects = _load_subjects()
+    batch = []
+
+    def flush():
+        if batch:
+            with transaction.atomic():
+                save_questions(batch)
+            report.created += len(batch)
+            batch.clear()
+
+    try:
+        for row_number, row in READERS[fmt](fileobj):
+            if isinstance(row, MalformedRow):
+                report.add_error(row_number, f"Malformed row: {row}")
+                continue
+            if not isinstance(row, dict):
+                report.add_error(row_number, "Malformed row: expected an object.")
+                continue
+            try:
+                graph = build_graph(row, subjects, default_subject, created_by)
+            except (AttributeError, KeyError, TypeError, ValueError) as exc:
+                report.add_error(row_number, f"Malformed row: {exc}")
+                continue
+
+            errors = validate_question(*graph)
+            if errors:
+                report.add_error(row_number, ' '.join(errors))
+                continue
+
+            batch.append(graph)
+            if len(batch) >= batch_size:
+                flush()
+    except (csv.Error, json.JSONDecodeError, ET.ParseError) as exc:
+        report.add_error(None, f"Could not parse file: {exc}")
+
+    flush()
+    return report
+
+
+# --- Export ------------------------------------------------------------------
+
+def iter_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield questions as JSON-shaped rows, a chunk at a time.
+
+    Questions come from ``.iterator()`` and children are loaded with one
+    query per table per chunk, so memory stays flat for any bank size.
+    """
+    queryset = queryset.select_related('subject').order_by('id')
+    chunk = []
+    for question in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(question)
+        if len(chunk) >= chunk_size:
+            yield from _export_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _export_chunk(chunk)
+
+
+def _export_chunk(questions):
+    ids = [question.id for question in questions]
+    options, pairs, answers = {}, {}, {}
+    for option in Option.objects.filter(question_id__in=ids).order_by('id'):
+        options.setdefault(option.question_id, []).append(
+            {'text': option.text, 'is_correct': option.is_correct})
+    for pair in MatchingPair.objects.filter(question_id__in=ids).order_by('id'):
+        pairs.setdefault(pair.question_id, []).append(
+            {'left': pair.left_text, 'right': pair.right_text})
+    for answer in TrueFalseAnswer.objects.filter(question_id__in=ids):
+        answers[answer.question_id] = 'true' if answer.is_true else 'false'
+
+    for question in questions:
+        row = {
+            'question_type': question.question_type,
+            'text': question.text,
+            'marks': question.marks,
+            'subject': question.subject.name,
+            'options': options.get(question.id, []),
+            'pairs': pairs.get(question.id, []),
+        }
+        for field in PLAIN_FIELDS:
+            row[field] = getattr(question, field) or ''
+        if question.id in answers:
+            row['answer'] = answers[question.id]
+        yield row
+
+
+class _Echo:
+    """File-like object whose ``write`` just returns the value (for csv)."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        options = row['options']
+        yield writer.writerow([
+            row['question_type'], row['text'], row['marks'], row['subject'],
+            row['tags'], row['difficulty_level'], row['explanation'], row['essay_instructions'],
+            '|'.join(option['text'] for option in options),
+            '|'.join(str(i) for i, option in enumerate(options, start=1) if option['is_correct']),
+            '|'.join(f"{pair['left']}={pair['right']}" for pair in row['pairs']),
+            row.get('answer', ''),
+        ])
+
+
+def stream_json(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def stream_qti(rows):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<questestinterop>\n'
+    for row in rows:
+        attrs = (f" type={quoteattr(row['question_type'])} marks=\"{row['marks']}\""
+                 f" subject={quoteattr(row['subject'])}")
+        parts = [f"  <item{attrs}>\n    <text>{escape(row['text'])}</text>\n"]
+        for field in PLAIN_FIELDS:
+            if row[field]:
+                parts.append(f"    <{field}>{escape(row[field])}</{field}>\n")
+        for option in row['options']:
+            correct = 'true' if option['is_correct'] else 'false'
+            parts.append(f"    <option correct=\"{correct}\">{escape(option['text'])}</option>\n")
+        for pair in row['pairs']:
+            parts.append(f"    <pair left={quoteattr(pair['left'])} right={quoteattr(pair['right'])}/>\n")
+        if 'answer' in row:
+            parts.append(f"    <answer>{row['answer']}</answer>\n")
+        parts.append('  </item>\n')
+        yield ''.join(parts)
+    yield '</questestinterop>\n'
+
+
+WRITERS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'json': (stream_json, 'application/x-ndjson', 'jsonl'),
+    'qti': (stream_qti, 'application/xml', 'xml'),
+}
+
+
+def export_questions(queryset, fmt='csv'):
+    """Return a generator of text chunks for ``queryset`` in ``fmt``."""
+    writer = WRITERS[fmt][0]
+    return writer(iter_export_rows(queryset))
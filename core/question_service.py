@@ -0,0 +1,160 @@
+"""
+Shared write path for questions and their answer children.
+
+The admin and examiner views build the whole question graph in memory
+(a ``Question`` plus unsaved ``Option`` / ``MatchingPair`` /
+``TrueFalseAnswer`` instances) and hand it to ``save_question``, which
+writes it with a fixed number of statements however many options or
+pairs the question has.  ``save_questions`` does the same for many new
+questions at once (bulk imports).
+"""
+from collections import namedtuple
+
+from django.db import transaction
+
+from core.models import Question, Option, MatchingPair, TrueFalseAnswer
+from core import images, paper_cache, question_stats, search
+
+# Upper bound on rows per INSERT so large matching items stay well below
+# SQLite's bound-parameter limit.
+BULK_BATCH_SIZE = 500
+
+QUESTION_TYPES = ('MCQ', 'TRUE_FALSE', 'ESSAY', 'MATCHING')
+
+# A question and its unsaved children, as handed to ``save_questions``.
+QuestionGraph = namedtuple('QuestionGraph', 'question options pairs true_false')
+
+
+def options_from_post(data, correct=None, prefix='option_'):
+    """Build unsaved MCQ options from ``option_<n>`` POST keys."""
+    options = []
+    for key in data:
+        if key.startswith(prefix):
+            text = data.get(key)
+            if text:
+                options.append(Option(
+                    text=text,
+                    is_correct=bool(correct) and key.endswith(correct),
+                ))
+    return options
+
+
+def matching_pairs_from_post(data, left_prefix='match_left_', right_prefix='match_right_'):
+    """Build unsaved matching pairs from numbered left/right POST keys.
+
+    Reading stops at the first index where either side is missing, which
+    is how the examiner forms submit their rows.
+    """
+    pairs = []
+    index = 1
+    while True:
+        left = data.get(f'{left_prefix}{index}')
+        right = data.get(f'{right_prefix}{index}')
+        if not left or not right:
+            break
+        pairs.append(MatchingPair(left_text=left, right_text=right))
+        index += 1
+    return pairs
+
+
+@transaction.atomic
+def save_question(question, options=(), pairs=(), true_false=None, replace_children=False):
+    """Persist ``question`` together with its children.
+
+    ``options``, ``pairs`` and ``true_false`` are unsaved model instances;
+    their ``question`` foreign key is filled in here.  With
+    ``replace_children`` the existing children of an edited question are
+    removed first.  At most one statement is issued per table.  A newly
+    uploaded image is stored once per content through ``core.images``.
+    """
+    if question.image and not question.image._committed:
+        question.image = images.store_upload(question.image)
+    # Saving the question retires its exam's cached paper (once, on
+    # commit), which covers the children written below.
+    question.save()
+
+    if replace_children:
+        Option.objects.filter(question=question).delete()
+        TrueFalseAnswer.objects.filter(question=question).delete()
+        MatchingPair.objects.filter(question=question).delete()
+
+    options = list(options)
+    pairs = list(pairs)
+
+    for option in options:
+        option.question = question
+    for pair in pairs:
+        pair.question = question
+
+    if options:
+        Option.objects.bulk_create(options, batch_size=BULK_BATCH_SIZE)
+    if pairs:
+        MatchingPair.objects.bulk_create(pairs, batch_size=BULK_BATCH_SIZE)
+    if true_false is not None:
+        true_false.question = question
+        true_false.save()
+
+    return question
+
+
+def validate_question(question, options=(), pairs=(), true_false=None):
+    """Return a list of problems with a question graph (empty if valid).
+
+    These are the same rules the create views enforce: an MCQ needs at
+    least two options with one marked correct, a matching item needs at
+    least two pairs and a true/false item needs its answer.
+    """
+    errors = []
+    if question.question_type not in QUESTION_TYPES:
+        errors.append(f"Unknown question type '{question.question_type}'.")
+    if not question.text:
+        errors.append("Question text is required.")
+    if question.subject_id is None:
+        errors.append("Subject is required.")
+
+    if question.question_type == 'MCQ':
+        if len(options) < 2:
+            errors.append("MCQ questions need at least 2 options.")
+        if not any(option.is_correct for option in options):
+            errors.append("MCQ questions need a correct option.")
+    elif question.question_type == 'MATCHING':
+        if len(pairs) < 2:
+            errors.append("Matching questions need at least 2 pairs.")
+    elif question.question_type == 'TRUE_FALSE':
+        if true_false is None:
+            errors.append("True/False questions need an answer.")
+    return errors
+
+
+@transaction.atomic
+def save_questions(graphs):
+    """Insert many new questions and their children in bulk.
+
+    ``graphs`` is a sequence of ``QuestionGraph``.  The questions are
+    inserted first so their primary keys are known, then every child
+    table gets one batched INSERT for the whole sequence.
+    """
+    graphs = list(graphs)
+    questions = Question.objects.bulk_create([graph.question for graph in graphs], batch_size=BULK_BATCH_SIZE)
+    question_stats.record_created(questions)
+    search.index_questions(questions)
+    # bulk_create sends no post_save, so retire the affected papers here.
+    for exam_id, examination_id in {(q.exam_id, q.examination_id) for q in questions}:
+        paper_cache.invalidate_exams(exam_id, examination_id)
+
+    options, pairs, answers = [], [], []
+    for graph in graphs:
+        for option in graph.options:
+            option.question = graph.question
+            options.append(option)
+        for pair in graph.pairs:
+            pair.question = graph.question
+            pairs.append(pair)
+        if graph.true_false is not None:
+            graph.true_false.question = graph.question
+            answers.append(graph.true_false)
+
+    Option.objects.bulk_create(options, batch_size=BULK_BATCH_SIZE)
+    MatchingPair.objects.bulk_create(pairs, batch_size=BULK_BATCH_SIZE)
+    TrueFalseAnswer.objects.bulk_create(answers, batch_size=BULK_BATCH_SIZE)
+    return questions
@@ -0,0 +1,138 @@
+"""
+Per-subject / per-type / per-creator question counters.
+
+The question list headers used to aggregate the whole ``core_question``
+table on every page view.  ``QuestionStat`` keeps those numbers up to
+date as questions are created, deleted or change type, so the headers
+only read a handful of counter rows.  ``rebuild_question_stats``
+recounts them from scratch and reports drift.
+"""
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import Question, Subject
+
+
+class QuestionStat(models.Model):
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='question_stats')
+    question_type = models.CharField(max_length=10)
+    # Plain id rather than a foreign key so questions without a creator
+    # (creator_id 0) share one row and the unique constraint still holds.
+    creator_id = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('subject', 'question_type', 'creator_id')
+
+    def __str__(self):
+        return f"{self.subject_id}/{self.question_type}/{self.creator_id}: {self.count}"
+
+
+def _stat_key(question):
+    return (question.subject_id, question.question_type, question.created_by_id or 0)
+
+
+def adjust(key, delta):
+    """Add ``delta`` to the counter row for ``key``, creating it for increments.
+
+    A decrement that finds no row is dropped: on a cascade delete
+    (Subject -> Question) the counter rows are removed before the
+    questions, and re-creating one would reference the subject being
+    deleted.
+    """
+    subject_id, question_type, creator_id = key
+    if subject_id is None or not delta:
+        return
+    lookup = {'subject_id': subject_id, 'question_type': question_type, 'creator_id': creator_id}
+    with transaction.atomic():
+        if not QuestionStat.objects.filter(**lookup).update(count=F('count') + delta):
+            if delta < 0:
+                return
+            QuestionStat.objects.get_or_create(**lookup)
+            QuestionStat.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def record_created(questions):
+    """Count questions inserted with ``bulk_create`` (which sends no signals)."""
+    for key, delta in Counter(_stat_key(question) for question in questions).items():
+        adjust(key, delta)
+    for question in questions:
+        question._stat_key = _stat_key(question)
+
+
+@receiver(post_init, sender=Question)
+def remember_stat_key(sender, instance, **kwargs):
+    instance._stat_key = _stat_key(instance)
+
+
+@receiver(post_save, sender=Question)
+def count_saved_question(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new_key = _stat_key(instance)
+    if created:
+        adjust(new_key, 1)
+    elif new_key != instance._stat_key:
+        adjust(instance._stat_key, -1)
+        adjust(new_key, 1)
+    instance._stat_key = new_key
+
+
+@receiver(post_delete, sender=Question)
+def count_deleted_question(sender, instance, **kwargs):
+    adjust(instance._stat_key, -1)
+
+
+def type_counts(subject_id=None, creator_id=None):
+    """Return ``{'total': n, '<question_type>': n, ...}`` from the counters."""
+    rows = QuestionStat.objects.all()
+    if subject_id:
+        rows = rows.filter(subject_id=subject_id)
+    if creator_id is not None:
+        rows = rows.filter(creator_id=creator_id)
+
+    counts = {'total': 0, 'MCQ': 0, 'TRUE_FALSE': 0, 'ESSAY': 0, 'MATCHING': 0}
+    for row in rows.values('question_type').annotate(n=Sum('count')):
+        counts[row['question_type']] = row['n']
+        counts['total'] += row['n']
+    return counts
+
+
+def actual_counts():
+    """Recount questions per counter key straight from ``core_question``.
+
+    Questions without a subject are left out, as ``adjust`` never counts them.
+    """
+    rows = Question.objects.filter(subject__isnull=False).values('subject_id', 'question_type', 'created_by_id').annotate(n=Count('id'))
+    counts = Counter()
+    for row in rows:
+        counts[(row['subject_id'], row['question_type'], row['created_by_id'] or 0)] += row['n']
+    return counts
+
+
+def find_drift():
+    """Return ``{key: (stored, actual)}`` for every counter that is wrong."""
+    stored = {
+        (row.subject_id, row.question_type, row.creator_id): row.count
+        for row in QuestionStat.objects.all()
+    }
+    actual = actual_counts()
+    drift = {}
+    for key in set(stored) | set(actual):
+        if stored.get(key, 0) != actual.get(key, 0):
+            drift[key] = (stored.get(key, 0), actual.get(key, 0))
+    return drift
+
+
+@transaction.atomic
+def rebuild():
+    """Replace every counter row with a fresh recount."""
+    QuestionStat.objects.all().delete()
+    QuestionStat.objects.bulk_create([
+        QuestionStat(subject_id=subject_id, question_type=question_type, creator_id=creator_id, count=n)
+        for (subject_id, question_type, creator_id), n in actual_counts().items()
+    ])
@@ -0,0 +1,223 @@
+"""
+Streaming exam results export.
+
+Two layouts:
+
+* ``long`` - one row per ``StudentAnswer``: the student, the question,
+  what was answered, whether it was correct and the marks earned;
+* ``wide`` - one row per student with a marks column per question, the
+  total and whether it reaches ``passing_marks``.
+
+Both read the answers with ``.iterator()`` ordered by student, so a
+student's answers arrive together and nothing but the current student is
+held in memory.  The submission time comes from a correlated subquery
+instead of a lookup table.
+
+Two formats:
+
+* ``csv``  - written row by row through ``csv.writer``;
+* ``xlsx`` - a minimal workbook (inline strings, one sheet) whose zip
+  container is built on the fly, so its first bytes go out before the
+  first query has finished.
+"""
+import csv
+import json
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+
+from core.models import Question
+from core.streaming import ZipStream
+from studentpanel.models import StudentAnswer, Submission
+
+FORMATS = ('csv', 'xlsx')
+LAYOUTS = ('wide', 'long')
+CHUNK_SIZE = 2000
+XLSX_FLUSH_ROWS = 200
+
+LONG_COLUMNS = [
+    'username', 'student_id', 'full_name', 'question_id', 'question_type', 'question',
+    'selected_option', 'true_false', 'text_answer', 'matching_response',
+    'is_correct', 'marks_earned', 'answered_at', 'submitted_at',
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _answers(exam):
+    submitted_at = Submission.objects.filter(
+        exam_id=OuterRef('exam_id'), student_id=OuterRef('student_id')
+    ).values('submitted_at')[:1]
+    return (StudentAnswer.objects.filter(exam=exam)
+            .annotate(submitted_at=Subquery(submitted_at))
+            .order_by('student_id', 'question_id'))
+
+
+def iter_long_rows(exam):
+    yield LONG_COLUMNS
+    rows = _answers(exam).values_list(
+        'student__username', 'student__student_id', 'student__full_name',
+        'question_id', 'question__question_type', 'question__text',
+        'selected_option__text', 'is_true', 'text_answer', 'matching_response',
+        'is_correct', 'marks_earned', 'answered_at', 'submitted_at',
+    )
+    yield from rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_wide_rows(exam):
+    question_ids = list(Question.objects.filter(exam=exam).order_by('id').values_list('id', flat=True))
+    column = {question_id: i for i, question_id in enumerate(question_ids)}
+    yield (['username', 'student_id', 'full_name', 'submitted_at']
+           + [f"Q{question_id}" for question_id in question_ids] + ['total', 'passed'])
+
+    rows = _answers(exam).values_list(
+        'student_id', 'student__username', 'student__student_id', 'student__full_name',
+        'submitted_at', 'question_id', 'marks_earned',
+    )
+    current, head, marks = None, None, None
+    for student_id, username, student_code, full_name, submitted_at, question_id, earned in \
+            rows.iterator(chunk_size=CHUNK_SIZE):
+        if student_id != current:
+            if current is not None:
+                yield _wide_row(head, marks, exam.passing_marks)
+            current, head, marks = student_id, [username, student_code, full_name, submitted_at], \
+                [None] * len(question_ids)
+        if question_id in column:
+            marks[column[question_id]] = earned
+    if current is not None:
+        yield _wide_row(head, marks, exam.passing_marks)
+
+
+def _wide_row(head, marks, passing_marks):
+    total = sum(mark for mark in marks if mark is not None)
+    return head + marks + [total, total >= passing_marks]
+
+
+ROW_ITERATORS = {'long': iter_long_rows, 'wide': iter_wide_rows}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _csv_value(value):
+    value = _plain(value)
+    # Keep student-typed text from being read as a spreadsheet formula.
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def _xlsx_cell(value):
+    value = _plain(value)
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    text = escape(_XML_INVALID.sub('', text))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Results" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def stream_xlsx(rows):
+    buffer = ZipStream()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            for count, row in enumerate(rows, start=1):
+                sheet.write(('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>').encode('utf-8'))
+                if count % XLSX_FLUSH_ROWS == 0 and buffer.chunks:
+                    yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+WRITERS = {'csv': stream_csv, 'xlsx': stream_xlsx}
+
+
+def export_results(exam, fmt='csv', layout='wide'):
+    """Return ``(chunks, content_type, filename)`` for a streaming response."""
+    chunks = WRITERS[fmt](ROW_ITERATORS[layout](exam))
+    return chunks, CONTENT_TYPES[fmt], f"results-exam-{exam.id}-{layout}.{fmt}"
+
+
+def export_response(request, exam):
+    """Streaming download of ``exam``'s results in the requested format and layout."""
+    fmt = request.GET.get('format', 'csv')
+    layout = request.GET.get('layout', 'wide')
+    if fmt not in FORMATS:
+        fmt = 'csv'
+    if layout not in LAYOUTS:
+        layout = 'wide'
+
+    chunks, content_type, filename = export_results(exam, fmt, layout)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,244 @@
+"""
+Full-text search over users and the question bank.
+
+On SQLite the index lives in two FTS5 virtual tables that mirror
+``CustomUser`` (full name, email, username) and ``Question`` (text,
+tags, explanation), keyed by the row id of the model.  Other databases
+fall back to plain ``icontains`` lookups; a different backend can be
+plugged in with the ``SEARCH_BACKEND`` setting (dotted path to a
+``SearchBackend`` subclass).
+
+Searches narrow a queryset instead of returning a list of ids: the FTS
+table is joined to the model table and matched once, together with the
+caller's other filters, and every row is annotated with ``search_rank``
+(lower is better; bm25 on FTS5) for listings that order by relevance:
+
+    users_qs = search.filter_users(users_qs, query).order_by('search_rank')
+"""
+import operator
+import re
+from functools import reduce
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from core.models import CustomUser, Question
+
+USER_FTS_TABLE = 'core_user_fts'
+QUESTION_FTS_TABLE = 'core_question_fts'
+
+USER_FIELDS = ('full_name', 'email', 'username')
+QUESTION_FIELDS = ('text', 'tags', 'explanation')
+
+_backend = None
+
+
+class SearchBackend:
+    """Interface every search backend implements."""
+
+    def index_users(self, users):
+        pass
+
+    def remove_user(self, user_id):
+        pass
+
+    def index_questions(self, questions):
+        pass
+
+    def remove_question(self, question_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def filter_users(self, queryset, query):
+        """Narrow ``queryset`` to matching users, annotated with ``search_rank``."""
+        raise NotImplementedError
+
+    def filter_questions(self, queryset, query):
+        """Narrow ``queryset`` to matching questions, annotated with ``search_rank``."""
+        raise NotImplementedError
+
+
+class DatabaseBackend(SearchBackend):
+    """Unindexed fallback using ``icontains`` on the model tables."""
+
+    def _filter(self, queryset, fields, query):
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        if not query.strip():
+            return queryset.none()
+        condition = reduce(operator.or_, [Q(**{f'{field}__icontains': query}) for field in fields])
+        return queryset.filter(condition)
+
+    def filter_users(self, queryset, query):
+        return self._filter(queryset, USER_FIELDS, query)
+
+    def filter_questions(self, queryset, query):
+        return self._filter(queryset, QUESTION_FIELDS, query)
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """FTS5 index kept in sync with the model tables, ranked with bm25."""
+
+    @staticmethod
+    def create_tables(cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {USER_FTS_TABLE} "
+            f"USING fts5({', '.join(USER_FIELDS)}, tokenize='unicode61', prefix='2 3')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {QUESTION_FTS_TABLE} "
+            f"USING fts5({', '.join(QUESTION_FIELDS)}, tokenize='unicode61', prefix='2 3')"
+        )
+
+    @staticmethod
+    def drop_tables(cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {USER_FTS_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {QUESTION_FTS_TABLE}")
+
+    def _upsert(self, table, fields, rows):
+        if not rows:
+            return
+        if len(rows) == 1:
+            # Single saves (the signal path) skip the FTS write when the
+            # indexed text did not change.
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT {', '.join(fields)} FROM {table} WHERE rowid = %s", [rows[0][0]])
+                current = cursor.fetchone()
+            if current is not None and list(current) == list(rows[0][1:]):
+                return
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {table} (rowid, {', '.join(fields)}) VALUES ({placeholders})",
+                rows,
+            )
+
+    def _delete(self, table, row_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [row_id])
+
+    def index_users(self, users):
+        self._upsert(USER_FTS_TABLE, USER_FIELDS, [
+            [user.id] + [getattr(user, field) or '' for field in USER_FIELDS] for user in users
+        ])
+
+    def remove_user(self, user_id):
+        self._delete(USER_FTS_TABLE, user_id)
+
+    def index_questions(self, questions):
+        self._upsert(QUESTION_FTS_TABLE, QUESTION_FIELDS, [
+            [question.id] + [getattr(question, field) or '' for field in QUESTION_FIELDS]
+            for question in questions
+        ])
+
+    def remove_question(self, question_id):
+        self._delete(QUESTION_FTS_TABLE, question_id)
+
+    def rebuild(self, chunk_size=2000):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {USER_FTS_TABLE}")
+            cursor.execute(f"DELETE FROM {QUESTION_FTS_TABLE}")
+        for model, fields, table in ((CustomUser, USER_FIELDS, USER_FTS_TABLE),
+                                     (Question, QUESTION_FIELDS, QUESTION_FTS_TABLE)):
+            batch = []
+            for row in model.objects.values_list('id', *fields).iterator(chunk_size=chunk_size):
+                batch.append([value or '' for value in row])
+                if len(batch) >= chunk_size:
+                    self._upsert(table, fields, batch)
+                    batch = []
+            self._upsert(table, fields, batch)
+
+    @staticmethod
+    def match_expression(query):
+        """Turn free text into an FTS5 prefix query with no operators."""
+        tokens = re.findall(r'\w+', query)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def _filter(self, queryset, table, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+        model_table = queryset.model._meta.db_table
+        # The FTS table is joined and matched once; bm25() is read from the
+        # joined row, so the caller's filters, ordering and pagination run
+        # in the same statement without a cap on matches.
+        return queryset.extra(
+            tables=[table],
+            where=[f"{table}.rowid = {model_table}.id", f"{table} MATCH %s"],
+            params=[expression],
+        ).annotate(search_rank=RawSQL(f"bm25({table})", [], output_field=FloatField()))
+
+    def filter_users(self, queryset, query):
+        return self._filter(queryset, USER_FTS_TABLE, query)
+
+    def filter_questions(self, queryset, query):
+        return self._filter(queryset, QUESTION_FTS_TABLE, query)
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any('FTS5' in row[0] for row in cursor.fetchall())
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif fts5_available():
+            _backend = SQLiteFTS5Backend()
+        else:
+            _backend = DatabaseBackend()
+    return _backend
+
+
+def filter_users(queryset, query):
+    """Narrow a ``CustomUser`` queryset to ``query``; rows carry ``search_rank``."""
+    return get_backend().filter_users(queryset, query)
+
+
+def filter_questions(queryset, query):
+    """Narrow a ``Question`` queryset to ``query``; rows carry ``search_rank``."""
+    return get_backend().filter_questions(queryset, query)
+
+
+def index_questions(questions):
+    """Index questions inserted with ``bulk_create`` (which sends no signals)."""
+    get_backend().index_questions(questions)
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or not set(update_fields).isdisjoint(fields)
+
+
+@receiver(post_save, sender=CustomUser)
+def index_saved_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins save ``last_login`` alone; only the indexed fields matter here.
+    if not raw and _touches(update_fields, USER_FIELDS):
+        get_backend().index_users([instance])
+
+
+@receiver(post_delete, sender=CustomUser)
+def unindex_deleted_user(sender, instance, **kwargs):
+    get_backend().remove_user(instance.id)
+
+
+@receiver(post_save, sender=Question)
+def index_saved_question(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _touches(update_fields, QUESTION_FIELDS):
+        get_backend().index_questions([instance])
+
+
+@receiver(post_delete, sender=Question)
+def unindex_deleted_question(sender, instance, **kwargs):
+    get_backend().remove_question(instance.id)
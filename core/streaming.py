@@ -0,0 +1,27 @@
+"""
+Helpers for building files while they are being streamed.
+
+``ZipStream`` is the write-only file object that ``zipfile.ZipFile``
+writes into when an archive is streamed to the client: whatever the
+archive has written so far is taken out with ``drain`` and yielded, so
+the whole file is never held in memory.
+"""
+
+
+class ZipStream:
+    """Write-only file object whose contents are drained as they arrive."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
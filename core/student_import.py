@@ -0,0 +1,267 @@
+"""
+Bulk student import from a CSV roster.
+
+Columns (header required, only ``username`` and ``student_id`` are
+mandatory)::
+
+    username,student_id,email,full_name,first_name,last_name,phone,address,password
+
+The roster is read row by row.  Every ``IMPORT_BATCH_SIZE`` valid rows:
+
+* rows whose ``username``, ``email`` or ``student_id`` is already taken,
+  in the database or earlier in the file, are rejected with their row
+  number (one query per field per batch);
+* passwords are hashed in a process pool (``PASSWORD_HASH_WORKERS``,
+  default one per CPU), since each PBKDF2 hash costs tens of
+  milliseconds; rows without a password get an unusable one and set it
+  through password reset;
+* users are inserted with one ``bulk_create`` and, when an exam is given,
+  enrolled in it with a second one (auto-approval rules from
+  ``core.enrollments`` decide between ``enrolled`` and ``pending``).
+
+If a concurrent insert still makes the batch collide, it is retried row
+by row so only the conflicting rows are rejected.
+
+Hashing a roster takes far too long for a web request, so the admin
+upload is only queued.  Rosters carry plaintext passwords, so they never
+go to the default (possibly public) media storage: ``queue_roster``
+stores the file in ``STUDENT_IMPORT_DIR`` (default
+``BASE_DIR/private/student_imports``), a directory outside ``MEDIA_ROOT``
+readable only by the server user (files ``0600``, directory ``0700``).
+``manage.py import_students --queued`` (run from a single cron entry)
+imports every queued roster, writes its report next to it as
+``<name>.log`` and deletes the roster, passwords included.  Rosters and
+reports older than ``STUDENT_IMPORT_TTL`` seconds (default one day) are
+deleted unimported on the next run.
+"""
+import csv
+import io
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from adminpanel.models import Exam
+from core import enrollment_stats, enrollments, search
+from core.models import CustomUser
+from core.question_bank import ImportReport
+from studentpanel.models import ExamEnrollment
+
+IMPORT_BATCH_SIZE = 1000
+QUEUE_PREFIX = 'student_imports'
+QUEUE_TTL = 24 * 60 * 60
+HASH_CHUNK_SIZE = 16
+UNIQUE_FIELDS = ('username', 'email', 'student_id')
+PROFILE_FIELDS = ('email', 'full_name', 'first_name', 'last_name', 'phone', 'address')
+
+
+class StudentImportReport(ImportReport):
+    def __init__(self):
+        super().__init__()
+        self.enrolled = 0
+
+    def __str__(self):
+        text = f"{self.created} student(s) imported, {len(self.errors)} row(s) rejected"
+        if self.enrolled:
+            text += f", {self.enrolled} enrolled"
+        return text
+
+
+def _init_worker():
+    # Workers started with "spawn" need Django configured before hashing.
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords):
+    return [make_password(password or None) for password in passwords]
+
+
+def iter_roster(fileobj):
+    reader = csv.DictReader(fileobj)
+    for row_number, record in enumerate(reader, start=2):  # header is line 1
+        yield row_number, {key.strip().lower(): (value or '').strip()
+                           for key, value in record.items() if key}
+
+
+def _normalize(field, value):
+    return value.lower() if field == 'email' else value
+
+
+def import_students(fileobj, exam=None, batch_size=IMPORT_BATCH_SIZE, workers=None):
+    """Create every valid student in ``fileobj``; returns a ``StudentImportReport``."""
+    report = StudentImportReport()
+    seen = {field: set() for field in UNIQUE_FIELDS}
+    batch = []
+    workers = workers or getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        try:
+            for row_number, row in iter_roster(fileobj):
+                missing = [field for field in ('username', 'student_id') if not row.get(field)]
+                if missing:
+                    report.add_error(row_number, f"Missing {', '.join(missing)}.")
+                    continue
+                duplicate = next((field for field in UNIQUE_FIELDS
+                                  if row.get(field) and _normalize(field, row[field]) in seen[field]), None)
+                if duplicate:
+                    report.add_error(row_number, f"Duplicate {duplicate} '{row[duplicate]}' earlier in the file.")
+                    continue
+                for field in UNIQUE_FIELDS:
+                    if row.get(field):
+                        seen[field].add(_normalize(field, row[field]))
+
+                batch.append((row_number, row))
+                if len(batch) >= batch_size:
+                    _import_batch(pool, batch, exam, report)
+                    batch = []
+        except csv.Error as exc:
+            report.add_error(None, f"Could not parse file: {exc}")
+        if batch:
+            _import_batch(pool, batch, exam, report)
+    return report
+
+
+def _taken(batch):
+    """``{row_number: field}`` for rows that clash with existing users."""
+    clashes = {}
+    for field in UNIQUE_FIELDS:
+        values = {row[field] for _, row in batch if row.get(field)}
+        if not values:
+            continue
+        if field == 'email':
+            existing = set(CustomUser.objects.annotate(email_lower=Lower('email'))
+                           .filter(email_lower__in={value.lower() for value in values})
+                           .values_list('email_lower', flat=True))
+        else:
+            existing = set(CustomUser.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+        for row_number, row in batch:
+            if row.get(field) and _normalize(field, row[field]) in existing:
+                clashes.setdefault(row_number, field)
+    return clashes
+
+
+def _import_batch(pool, batch, exam, report):
+    clashes = _taken(batch)
+    for row_number, field in clashes.items():
+        report.add_error(row_number, f"A user with this {field} already exists.")
+    batch = [(row_number, row) for row_number, row in batch if row_number not in clashes]
+    if not batch:
+        return
+
+    hashes = pool.map(hash_passwords, _chunks([row.get('password') for _, row in batch]))
+    hashes = [hashed for chunk in hashes for hashed in chunk]
+
+    users = []
+    for (row_number, row), password in zip(batch, hashes):
+        profile = {field: row.get(field, '') for field in PROFILE_FIELDS}
+        if not profile['full_name']:
+            profile['full_name'] = f"{profile['first_name']} {profile['last_name']}".strip()
+        users.append(CustomUser(username=row['username'], student_id=row['student_id'],
+                                role='STUDENT', password=password, **profile))
+
+    try:
+        with transaction.atomic():
+            created = CustomUser.objects.bulk_create(users)
+            # bulk_create sends no post_save, so the search index is fed here.
+            search.get_backend().index_users(created)
+            _after_create(created, exam, report)
+    except IntegrityError:
+        # Someone else took a value since _taken() looked; find the rows one by one.
+        # save() indexes each user through the post_save receiver.
+        created = []
+        for (row_number, _), user in zip(batch, users):
+            try:
+                with transaction.atomic():
+                    user.save()
+                created.append(user)
+            except IntegrityError:
+                report.add_error(row_number, "A user with this username, email or student_id already exists.")
+        with transaction.atomic():
+            _after_create(created, exam, report)
+    report.created += len(created)
+
+
+def _after_create(users, exam, report):
+    if exam is None or not users:
+        return
+    rows = [
+        ExamEnrollment(exam=exam, student=user,
+                       status=enrollments.ENROLLED if _auto_approved(exam, user) else enrollments.PENDING)
+        for user in users
+    ]
+    ExamEnrollment.objects.bulk_create(rows, batch_size=IMPORT_BATCH_SIZE)
+    approved = sum(row.status == enrollments.ENROLLED for row in rows)
+    enrollment_stats.adjust(exam.id, {enrollments.ENROLLED: approved, enrollments.PENDING: len(rows) - approved})
+    report.enrolled += len(rows)
+
+
+def _auto_approved(exam, user):
+    # An admin enrolling a cohort approves it unless the exam has rules of its own.
+    return not enrollments.has_rules('exam', exam.id) or enrollments.auto_approves('exam', exam.id, user)
+
+
+def _chunks(items, size=HASH_CHUNK_SIZE):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def queue_storage():
+    """Private storage for queued rosters, outside the public media root."""
+    location = getattr(settings, 'STUDENT_IMPORT_DIR', None) or os.path.join(
+        getattr(settings, 'BASE_DIR', os.getcwd()), 'private', QUEUE_PREFIX)
+    return FileSystemStorage(location=location, base_url=None,
+                             file_permissions_mode=0o600, directory_permissions_mode=0o700)
+
+
+def queue_roster(upload, exam=None):
+    """Store an uploaded roster for ``import_students --queued``; returns its name."""
+    name = f"{exam.id if exam else 0}-{uuid.uuid4().hex}.csv"
+    return queue_storage().save(name, upload)
+
+
+def queued_rosters():
+    """Storage names of the rosters waiting to be imported, oldest first."""
+    storage = queue_storage()
+    try:
+        _, files = storage.listdir('')
+    except FileNotFoundError:
+        return []
+    names = [name for name in files if name.endswith('.csv')]
+    return sorted(names, key=storage.get_modified_time)
+
+
+def expire_queued(ttl=None):
+    """Delete rosters and reports older than ``ttl`` seconds; returns their names."""
+    storage = queue_storage()
+    ttl = getattr(settings, 'STUDENT_IMPORT_TTL', QUEUE_TTL) if ttl is None else ttl
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    try:
+        _, files = storage.listdir('')
+    except FileNotFoundError:
+        return []
+    expired = [name for name in files if storage.get_modified_time(name) < cutoff]
+    for name in expired:
+        storage.delete(name)
+    return expired
+
+
+def import_queued(name, batch_size=IMPORT_BATCH_SIZE, workers=None):
+    """Import one queued roster, store its report and delete the roster."""
+    storage = queue_storage()
+    exam_id = int(name.split('-', 1)[0])
+    exam = Exam.objects.filter(id=exam_id).first() if exam_id else None
+    with storage.open(name, 'rb') as binary_file:
+        report = import_students(io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline=''),
+                                 exam=exam, batch_size=batch_size, workers=workers)
+    lines = [str(report)] + [f"Row {row_number}: {message}" for row_number, message in report.errors]
+    storage.save(name[:-len('.csv')] + '.log', ContentFile('\n'.join(lines).encode('utf-8')))
+    storage.delete(name)
+    return report
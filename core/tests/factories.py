@@ -0,0 +1,49 @@
+"""Small model factories shared by the core tests."""
+import uuid
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from adminpanel.models import Exam
+from core.models import CustomUser, Question, Subject
+
+
+def make_user(role='STUDENT', **fields):
+    username = fields.pop('username', f"{role.lower()}-{uuid.uuid4().hex[:8]}")
+    return CustomUser.objects.create_user(username=username, password='secret', role=role, **fields)
+
+
+def make_subject(name='Physics'):
+    return Subject.objects.create(name=name, description='')
+
+
+def make_exam(subject=None, admin=None, **fields):
+    today = timezone.localdate()
+    values = {
+        'exam_name': 'Midterm',
+        'token': uuid.uuid4().hex,
+        'status': 'published',
+        'exam_date': today,
+        'expiry_date': today + timedelta(days=7),
+        'start_time': time(9, 0),
+        'end_time': time(12, 0),
+        'enforce_time_window': False,
+        'duration': 90,
+        'total_marks': 100,
+        'passing_marks': 50,
+        'description': '',
+    }
+    values.update(fields)
+    return Exam.objects.create(subject=subject or make_subject(), admin=admin or make_user('ADMIN'), **values)
+
+
+def make_question(subject, question_type='MCQ', marks=1, **fields):
+    values = {
+        'text': 'Question',
+        'tags': '',
+        'difficulty_level': 'EASY',
+        'explanation': '',
+        'essay_instructions': '',
+    }
+    values.update(fields)
+    return Question.objects.create(subject=subject, question_type=question_type, marks=marks, **values)
@@ -0,0 +1,76 @@
+from django.test import TestCase
+
+from core import question_stats
+from core.enrollment_stats import ExamEnrollmentStats
+from core.question_stats import QuestionStat
+from core.tests.factories import make_exam, make_question, make_subject, make_user
+from studentpanel.models import ExamEnrollment
+
+
+class QuestionStatTests(TestCase):
+    def setUp(self):
+        self.subject = make_subject()
+        self.author = make_user('EXAMINER')
+
+    def test_create_change_type_and_delete(self):
+        first = make_question(self.subject, 'MCQ', created_by=self.author)
+        make_question(self.subject, 'MCQ', created_by=self.author)
+        make_question(self.subject, 'ESSAY')
+
+        counts = question_stats.type_counts(subject_id=self.subject.id)
+        self.assertEqual(counts['total'], 3)
+        self.assertEqual(counts['MCQ'], 2)
+        self.assertEqual(question_stats.type_counts(creator_id=self.author.id)['total'], 2)
+
+        first.question_type = 'TRUE_FALSE'
+        first.save()
+        first.delete()
+        counts = question_stats.type_counts(subject_id=self.subject.id)
+        self.assertEqual((counts['total'], counts['MCQ'], counts['TRUE_FALSE']), (2, 1, 0))
+        self.assertEqual(question_stats.find_drift(), {})
+
+    def test_subject_cascade_does_not_recreate_counters(self):
+        make_question(self.subject, 'MCQ')
+        make_question(self.subject, 'ESSAY')
+
+        self.subject.delete()
+
+        self.assertFalse(QuestionStat.objects.exists())
+        self.assertEqual(question_stats.find_drift(), {})
+
+    def test_decrement_without_row_is_dropped(self):
+        question_stats.adjust((self.subject.id, 'MCQ', 0), -1)
+        self.assertFalse(QuestionStat.objects.exists())
+
+
+class EnrollmentStatsTests(TestCase):
+    def setUp(self):
+        self.exam = make_exam()
+        self.students = [make_user() for _ in range(3)]
+
+    def stats(self):
+        row = ExamEnrollmentStats.objects.get(exam=self.exam)
+        return row.approved, row.pending, row.rejected
+
+    def test_counters_follow_status_changes(self):
+        enrollments = [ExamEnrollment.objects.create(exam=self.exam, student=student, status='pending')
+                       for student in self.students]
+        self.assertEqual(self.stats(), (0, 3, 0))
+
+        enrollments[0].status = 'enrolled'
+        enrollments[0].save()
+        enrollments[1].status = 'rejected'
+        enrollments[1].save()
+        self.assertEqual(self.stats(), (1, 1, 1))
+
+        enrollments[2].delete()
+        self.assertEqual(self.stats(), (1, 0, 1))
+
+    def test_exam_cascade_does_not_recreate_counters(self):
+        for student in self.students:
+            ExamEnrollment.objects.create(exam=self.exam, student=student, status='enrolled')
+
+        self.exam.delete()
+
+        self.assertFalse(ExamEnrollmentStats.objects.exists())
+        self.assertFalse(ExamEnrollment.objects.exists())
@@ -0,0 +1,54 @@
+import numpy as np
+from django.test import TestCase
+
+from core.grading import AnswerKey, score_chunk
+from core.models import MatchingPair, Option, TrueFalseAnswer
+from core.tests.factories import make_question, make_subject
+
+
+class AnswerKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        subject = make_subject()
+        cls.mcq = make_question(subject, 'MCQ', marks=2)
+        cls.right = Option.objects.create(question=cls.mcq, text='4', is_correct=True)
+        cls.wrong = Option.objects.create(question=cls.mcq, text='5', is_correct=False)
+        cls.other_mcq = make_question(subject, 'MCQ', marks=1)
+        cls.other_right = Option.objects.create(question=cls.other_mcq, text='Paris', is_correct=True)
+        cls.true_false = make_question(subject, 'TRUE_FALSE', marks=1)
+        TrueFalseAnswer.objects.create(question=cls.true_false, is_true=True)
+        cls.matching = make_question(subject, 'MATCHING', marks=3)
+        cls.pairs = [
+            MatchingPair.objects.create(question=cls.matching, left_text='H2O', right_text='water'),
+            MatchingPair.objects.create(question=cls.matching, left_text='NaCl', right_text='salt'),
+        ]
+        cls.essay = make_question(subject, 'ESSAY', marks=5)
+        cls.key = AnswerKey([cls.mcq.id, cls.other_mcq.id, cls.true_false.id, cls.matching.id, cls.essay.id])
+
+    def test_mcq_correct_needs_an_option_of_the_same_question(self):
+        question_ids = np.array([self.mcq.id, self.mcq.id, self.other_mcq.id, self.mcq.id])
+        selected = np.array([self.right.id, self.wrong.id, self.right.id, -1])
+        self.assertEqual(self.key.mcq_correct(question_ids, selected).tolist(), [True, False, False, False])
+
+    def test_matching_accepts_pair_ids_or_left_texts(self):
+        by_id = {str(self.pairs[0].id): 'water', str(self.pairs[1].id): 'salt'}
+        self.assertTrue(self.key.matching_correct(self.matching.id, by_id))
+        as_list = [{'left': 'H2O', 'right': 'water'}, {'left': 'NaCl', 'right': 'salt'}]
+        self.assertTrue(self.key.matching_correct(self.matching.id, as_list))
+        self.assertFalse(self.key.matching_correct(self.matching.id, {'H2O': 'salt', 'NaCl': 'water'}))
+        self.assertFalse(self.key.matching_correct(self.matching.id, None))
+
+    def test_score_chunk_with_negative_marking(self):
+        question_ids = np.array([self.mcq.id, self.mcq.id, self.true_false.id,
+                                 self.true_false.id, self.matching.id, self.essay.id])
+        selected = np.array([self.right.id, self.wrong.id, -1, -1, -1, -1])
+        is_true = np.array([-1, -1, 1, -1, -1, -1])
+        matching = [None, None, None, None, {'H2O': 'water', 'NaCl': 'salt'}, None]
+
+        gradable, correct, earned = score_chunk(self.key, question_ids, selected, is_true, matching,
+                                                negative_ratio=0.5)
+
+        self.assertEqual(gradable.tolist(), [True, True, True, True, True, False])
+        self.assertEqual(correct.tolist(), [True, False, True, False, True, False])
+        # A wrong answer loses half the marks (at least one); a blank loses nothing.
+        self.assertEqual(earned.tolist(), [2, -1, 1, 0, 3, 0])
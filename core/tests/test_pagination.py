@@ -0,0 +1,72 @@
+import datetime
+import decimal
+
+from django.test import SimpleTestCase, TestCase
+
+from core.models import Subject
+from core.pagination import KeysetPaginator, decode_cursor, encode_cursor
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip_keeps_types(self):
+        values = [
+            datetime.datetime(2026, 10, 18, 9, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            datetime.date(2026, 10, 18),
+            decimal.Decimal('12.50'),
+            'name',
+            42,
+        ]
+        self.assertEqual(decode_cursor(encode_cursor(values, 'next')), (values, 'next'))
+
+    def test_bad_cursor(self):
+        cursor = encode_cursor([1], 'next')
+        self.assertEqual(decode_cursor(cursor[:-2] + 'xx'), (None, None))
+        self.assertEqual(decode_cursor('garbage'), (None, None))
+        self.assertEqual(decode_cursor(''), (None, None))
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Equal names check the id tie-breaker.
+        for name in ['delta', 'alpha', 'bravo', 'bravo', 'bravo', 'charlie', 'echo']:
+            Subject.objects.create(name=name, description='')
+
+    def expected(self):
+        return list(Subject.objects.order_by('name', 'id').values_list('id', flat=True))
+
+    def test_walks_forward_without_gaps_or_repeats(self):
+        paginator = KeysetPaginator(Subject.objects.all(), ['name'], 2)
+        seen, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            seen.extend(subject.id for subject in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected())
+
+    def test_previous_cursor_returns_the_page_before(self):
+        paginator = KeysetPaginator(Subject.objects.all(), ['name'], 3)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        self.assertFalse(first.has_previous)
+        self.assertTrue(second.has_previous)
+
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual([subject.id for subject in back], [subject.id for subject in first])
+        self.assertEqual(paginator.get_page(back.next_cursor).object_list, second.object_list)
+
+    def test_descending_order(self):
+        paginator = KeysetPaginator(Subject.objects.all(), ['-name'], 4)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        ids = [subject.id for subject in first] + [subject.id for subject in second]
+        self.assertEqual(ids, list(Subject.objects.order_by('-name', '-id').values_list('id', flat=True)))
+        self.assertFalse(second.has_next)
+
+    def test_capped_count(self):
+        page = KeysetPaginator(Subject.objects.all(), ['name'], 2, count_cap=5).get_page()
+        self.assertEqual(page.total_display, '5+')
+        page = KeysetPaginator(Subject.objects.all(), ['name'], 2, count_cap=50).get_page()
+        self.assertEqual(page.total_display, '7')
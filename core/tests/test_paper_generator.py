@@ -0,0 +1,64 @@
+import random
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import paper_generator
+from core.paper_generator import _select, generate_paper, paper_seed
+
+PAPER = {
+    'kind': 'examination',
+    'exam_id': 7,
+    'selection_mode': 'random',
+    'number_of_questions': 3,
+    'shuffle_questions': False,
+    'shuffle_options': True,
+    'questions': [
+        {'id': question_id, 'type': 'MCQ', 'marks': 1,
+         'options': [{'id': question_id * 10 + n, 'text': str(n)} for n in range(4)]}
+        for question_id in (50, 40, 30, 20, 10)  # newest first, as compiled
+    ],
+}
+
+
+class SelectTests(SimpleTestCase):
+    def select(self, paper, seed=1):
+        return _select(random.Random(seed), paper)
+
+    def test_same_seed_same_selection(self):
+        self.assertEqual(self.select(PAPER, 3), self.select(PAPER, 3))
+        self.assertEqual(paper_seed('exam', 1, 2, 1), paper_seed('exam', 1, 2, 1))
+        self.assertNotEqual(paper_seed('exam', 1, 2, 1), paper_seed('exam', 1, 2, 2))
+
+    def test_random_subset_keeps_paper_order(self):
+        chosen = self.select(PAPER)
+        self.assertEqual(len(chosen), 3)
+        order = [question['id'] for question in PAPER['questions']]
+        self.assertEqual(chosen, [question_id for question_id in order if question_id in chosen])
+
+    def test_selection_ignores_question_order_in_the_bank(self):
+        reordered = dict(PAPER, questions=list(reversed(PAPER['questions'])))
+        self.assertEqual(sorted(self.select(PAPER, 5)), sorted(self.select(reordered, 5)))
+
+    def test_all_questions_without_random_mode(self):
+        paper = dict(PAPER, selection_mode='all')
+        self.assertEqual(self.select(paper), [50, 40, 30, 20, 10])
+        shuffled = self.select(dict(paper, shuffle_questions=True))
+        self.assertEqual(sorted(shuffled), [10, 20, 30, 40, 50])
+
+
+@mock.patch.object(paper_generator.paper_cache, 'get_paper_data', return_value=PAPER)
+class GeneratePaperTests(SimpleTestCase):
+    def test_deterministic_per_student_and_attempt(self, get_paper_data):
+        first = generate_paper('examination', 7, student_id=1)
+        self.assertEqual(first, generate_paper('examination', 7, student_id=1))
+        self.assertEqual(first['total_marks'], 3)
+        self.assertEqual(PAPER['questions'][0]['options'][0]['id'], 500)  # shared paper untouched
+
+    def test_stored_selection_replaces_the_draw(self, get_paper_data):
+        paper = generate_paper('examination', 7, student_id=1, question_ids=[20, 99, 50])
+        # 99 was deleted since the selection was stored.
+        self.assertEqual([question['id'] for question in paper['questions']], [20, 50])
+        for question in paper['questions']:
+            self.assertEqual(sorted(option['id'] for option in question['options']),
+                             [question['id'] * 10 + n for n in range(4)])
@@ -6,14 +6,33 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, F, Sum
+from django.db import transaction
+from django.db.models import Q, Count, F, Sum, Case, When, Value, IntegerField
+from django.db.models.functions import Coalesce
 from django.forms import modelformset_factory, inlineformset_factory
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.timezone import make_aware
-from core.decorators import role_required
+from django.views.decorators.http import require_POST
+from core.principal import role_required
+from core.question_service import save_question
+# enrollment_stats also connects the signals that keep its counters current
+from core import question_stats, search, enrollment_stats
+from core.pagination import keyset_page, DEFAULT_COUNT_CAP
+from core.exam_graph import load_exam_graph
+from core.db_router import read_replica
+from core.item_analysis import analytics_overview
+from core.certificates import assign_passers, stream_zip
+from core import results_export, live_monitor
+from core.enrollments import bulk_decision_response
+from core.student_import import queue_roster
+from core.exam_clone import clone_questions
+from core.question_bank import (
+    FORMATS as QUESTION_BANK_FORMATS, WRITERS as QUESTION_BANK_WRITERS,
+    guess_format, open_stream, import_questions, export_questions,
+)
 
 
 from .forms import ExamForm, QuestionForm, OptionForm, MatchingPairForm
@@ -72,24 +91,27 @@ def create_exam(request):
 from django.db.models import Count, Q
 
 @role_required('ADMIN')
+@read_replica
 def exams_index(request):
     today = timezone.localdate()
 
+    # Enrollment numbers come from the maintained per-exam counters
+    # (core.enrollment_stats) via a single left join.  Open exams sort
+    # first, so one keyset page holds both lists and is split below;
+    # an exam without an expiry date counts as scheduled.
+    still_open = Q(expiry_date__gte=today) | Q(expiry_date__isnull=True)
     all_exams = Exam.objects.annotate(
-        approved_enrollments=Count('enrollments', filter=Q(enrollments__status='enrolled'), distinct=True),
-        pending_enrollments=Count('enrollments', filter=Q(enrollments__status='pending'), distinct=True)
-    ).order_by('-exam_date')
-
-    paginator = Paginator(all_exams, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        approved_enrollments=Coalesce('enrollment_stats__approved', 0),
+        pending_enrollments=Coalesce('enrollment_stats__pending', 0),
+        is_open=Case(When(still_open, then=Value(1)), default=Value(0), output_field=IntegerField()),
+    )
 
-    scheduled_exams = all_exams.filter(expiry_date__gte=today)
-    completed_exams = all_exams.filter(expiry_date__lt=today)
+    page_obj = keyset_page(request, all_exams, ['-is_open', '-exam_date'], 10)
+    scheduled_exams = [exam for exam in page_obj if exam.is_open]
+    completed_exams = [exam for exam in page_obj if not exam.is_open]
 
     context = {
         'page_obj': page_obj,
-        'all_exams_count': all_exams.count(),
         'scheduled_exams': scheduled_exams,
         'completed_exams': completed_exams,
     }
@@ -115,9 +137,11 @@ def exams_create(request):
 # Admin panel views for questions and students
 
 @role_required('ADMIN')
+@read_replica
 def questions(request):
     type_filter = request.GET.get('type')
     subject_filter = request.GET.get('subject')
+    search_query = request.GET.get('search')
 
     # Always get sorting params
     sort = request.GET.get('sort', 'created')
@@ -142,22 +166,17 @@ def questions(request):
         queryset = queryset.filter(question_type=type_filter)
     if subject_filter:
         queryset = queryset.filter(subject__id=subject_filter)
+    if search_query:
+        queryset = search.filter_questions(queryset, search_query)
+        # Best matches first unless the admin picked a column to sort on
+        if 'sort' not in request.GET:
+            sort_field = 'search_rank'
 
-    paginator = Paginator(queryset, 7)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    question_counts = Question.objects.values('question_type').annotate(count=Count('id'))
-    stats = {
-        'total': Question.objects.count(),
-        'MCQ': 0,
-        'TRUE_FALSE': 0,
-        'ESSAY': 0,
-        'MATCHING': 0,
-    }
-    for entry in question_counts:
-        if entry['question_type'] in stats:
-            stats[entry['question_type']] = entry['count']
+    # Cursor pagination on the chosen sort key, ties broken on id
+    page_obj = keyset_page(request, queryset, [sort_field], 7, count_cap=DEFAULT_COUNT_CAP)
+
+    # Read from the maintained counters instead of aggregating core_question
+    stats = question_stats.type_counts()
 
     return render(request, 'questions/index.html', {
         'stats': stats,
@@ -168,6 +187,7 @@ def questions(request):
         'order': order,
         'type_filter': type_filter,
         'subject_filter': subject_filter,
+        'search_query': search_query,
     })
 
 
@@ -225,8 +245,7 @@ def questions_create(request):
                     'form_data': request.POST,
                 })
 
-            # Save the main Question
-            question = Question.objects.create(
+            question = Question(
                 question_type=question_type,
                 text=text,
                 subject=subject,
@@ -234,26 +253,20 @@ def questions_create(request):
                 image=image,
                 exam_id=exam_id
             )
+            options, pairs, true_false = [], [], None
 
-            # Save related data based on question type
+            # Collect related data based on question type
             if question_type == 'MCQ':
                 for i in range(1, 6):
                     option_text = request.POST.get(f'option_{i}')
                     is_correct = request.POST.get(f'is_correct_{i}') == 'on'
                     if option_text:
-                        Option.objects.create(
-                            question=question,
-                            text=option_text,
-                            is_correct=is_correct
-                        )
+                        options.append(Option(text=option_text, is_correct=is_correct))
 
             elif question_type == 'TRUE_FALSE':
                 is_true_value = request.POST.get('true_false_answer')  # e.g. from radio input
                 if is_true_value in ['True', 'False']:
-                    TrueFalseAnswer.objects.create(
-                        question=question,
-                        is_true=(is_true_value == 'True')
-        )
+                    true_false = TrueFalseAnswer(is_true=(is_true_value == 'True'))
                 else:
                     messages.error(request, "Please select a valid True/False answer.")
                     return render(request, 'questions/new.html', {
@@ -267,11 +280,10 @@ def questions_create(request):
                     left = request.POST.get(f'left_{i}')
                     right = request.POST.get(f'right_{i}')
                     if left and right:
-                        MatchingPair.objects.create(
-                            question=question,
-                            left_text=left,
-                            right_text=right
-                        )
+                        pairs.append(MatchingPair(left_text=left, right_text=right))
+
+            # Question and its children are written together
+            save_question(question, options=options, pairs=pairs, true_false=true_false)
 
             # No extra logic needed for essay questions currently
 
@@ -373,8 +385,69 @@ def delete_question(request, pk):
         return redirect('admin_questions')
     return render(request, 'questions/delete_confirm.html', {'question': question})
 
+@role_required('ADMIN')
+@require_POST
+def questions_import(request):
+    upload = request.FILES.get('bank_file')
+    if not upload:
+        messages.error(request, "Please choose a question bank file to import.")
+        return redirect('admin_questions')
+
+    fmt = request.POST.get('format') or guess_format(upload.name)
+    if fmt not in QUESTION_BANK_FORMATS:
+        messages.error(request, f"Unsupported format: {fmt}")
+        return redirect('admin_questions')
+
+    subject = Subject.objects.filter(id=request.POST.get('subject') or None).first()
+    report = import_questions(open_stream(upload.file, fmt), fmt,
+                              default_subject=subject, created_by=request.user)
+
+    if report.created:
+        messages.success(request, str(report))
+    # Only the first few row errors are flashed; the rest are summarised.
+    for row_number, message in report.errors[:20]:
+        messages.error(request, f"Row {row_number}: {message}")
+    if len(report.errors) > 20:
+        messages.error(request, f"...and {len(report.errors) - 20} more rejected rows.")
+    return redirect('admin_questions')
+
+
+@role_required('ADMIN')
+def questions_export(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in QUESTION_BANK_FORMATS:
+        fmt = 'csv'
+    queryset = Question.objects.all()
+    if request.GET.get('subject'):
+        queryset = queryset.filter(subject__id=request.GET['subject'])
+    if request.GET.get('type'):
+        queryset = queryset.filter(question_type=request.GET['type'])
+
+    _, content_type, extension = QUESTION_BANK_WRITERS[fmt]
+    response = StreamingHttpResponse(export_questions(queryset, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="question_bank.{extension}"'
+    return response
+
+@role_required('ADMIN')
+@require_POST
+def users_import(request):
+    upload = request.FILES.get('roster_file')
+    if not upload:
+        messages.error(request, "Please choose a student roster (CSV) to import.")
+        return redirect('admin_users')
+
+    exam = Exam.objects.filter(id=request.POST.get('exam') or None).first()
+    # Hashing the passwords is too slow for a request; the import_students
+    # command picks the roster up from the queue.
+    queue_roster(upload, exam=exam)
+    messages.success(request, f"Roster '{upload.name}' queued for import. "
+                              "The new students appear once it has been processed.")
+    return redirect('admin_users')
+
+
 # Admin panel view for students
 @role_required('ADMIN')
+@read_replica
 def users(request):
     role = request.GET.get('role')
     status = request.GET.get('status')
@@ -388,16 +461,13 @@ def users(request):
         users_qs = users_qs.filter(is_active=True)
     elif status == 'suspended':
         users_qs = users_qs.filter(is_active=False)
+    ordering = ['-date_joined']
     if search_query:
-        users_qs = users_qs.filter(
-            Q(full_name__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(username__icontains=search_query)
-        )
+        # Full-text index instead of three LIKE scans, best matches first
+        users_qs = search.filter_users(users_qs, search_query)
+        ordering = ['search_rank']
 
-    paginator = Paginator(users_qs, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = keyset_page(request, users_qs, ordering, 5, count_cap=DEFAULT_COUNT_CAP)
 
     context = {
         'page_obj': page_obj,
@@ -467,8 +537,10 @@ def delete_user(request, user_id):
 
 # Admin panel analytics view
 @role_required('ADMIN')
+@read_replica
 def analytics(request):
-    return render(request, 'analytics/index.html')
+    rollups, selected = analytics_overview(request.GET.get('exam'))
+    return render(request, 'analytics/index.html', {'rollups': rollups, 'selected': selected})
 
 # Admin panel settings view
 @role_required('ADMIN')
@@ -502,12 +574,12 @@ def view_exam(request, exam_id):
                     return redirect('view_exam', exam_id=exam.id)
 
                 if option_formset.is_valid():
-                    question.save()
+                    options = []
                     for i, form in enumerate(option_formset.forms):
                         option = form.save(commit=False)
-                        option.question = question
                         option.is_correct = (str(i) == correct_option_index)
-                        option.save()
+                        options.append(option)
+                    save_question(question, options=options)
                     messages.success(request, "MCQ question and options added successfully.")
                 else:
                     messages.error(request, "Please provide at least 2 valid options for the MCQ.")
@@ -520,11 +592,7 @@ def view_exam(request, exam_id):
                     messages.error(request, "Please select either True or False as the correct answer.")
                     return redirect('view_exam', exam_id=exam.id)
 
-                question.save()
-                TrueFalseAnswer.objects.create(
-                    question=question,
-                    is_true=(correct_option_index == '0')
-                )
+                save_question(question, true_false=TrueFalseAnswer(is_true=(correct_option_index == '0')))
                 messages.success(request, "True/False question added successfully.")
 
             # ✅ MATCHING
@@ -533,13 +601,10 @@ def view_exam(request, exam_id):
                 right_items = request.POST.getlist('match-right[]')
 
                 if len(left_items) >= 2 and len(left_items) == len(right_items):
-                    question.save()
-                    for left, right in zip(left_items, right_items):
-                        MatchingPair.objects.create(
-                            question=question,
-                            left_text=left.strip(),
-                            right_text=right.strip()
-                        )
+                    save_question(question, pairs=[
+                        MatchingPair(left_text=left.strip(), right_text=right.strip())
+                        for left, right in zip(left_items, right_items)
+                    ])
                     messages.success(request, "Matching question added successfully.")
                 else:
                     messages.error(request, "Please provide at least 2 valid matching pairs.")
@@ -559,22 +624,18 @@ def view_exam(request, exam_id):
         question_form = QuestionForm()
         option_formset = OptionFormSet(queryset=Option.objects.none(), prefix=prefix)
 
-    questions = Question.objects.filter(exam=exam)
+    # Questions, answer children and enrollments in a fixed number of queries
+    graph = load_exam_graph(exam)
     exam_datetime = datetime.combine(exam.exam_date, exam.start_time).isoformat()
-    total_marks = questions.aggregate(Sum('marks'))['marks__sum'] or 0
-    enrollments = ExamEnrollment.objects.select_related('student').filter(exam=exam).order_by('-enrolled_at')
-    for enrollment in enrollments:
-        enrollment.is_active = enrollment.status == 'enrolled'
-        enrollment.student.full_name = f"{enrollment.student.first_name} {enrollment.student.last_name}"
 
     context = {
         'exam': exam,
         'question_form': question_form,
         'option_formset': option_formset,
-        'questions': questions,
+        'questions': graph.questions,
         'exam_datetime': exam_datetime,
-        'total_marks': total_marks,
-        'enrollments': enrollments,
+        'total_marks': graph.total_marks,
+        'enrollments': graph.enrollments,
     }
 
     return render(request, 'exams/view.html', context)
@@ -584,7 +645,7 @@ from studentpanel.models import ExamEnrollment
 
 @require_POST
 def approve_enrollment(request, enrollment_id):
-    enrollment = get_object_or_404(ExamEnrollment, id=enrollment_id)
+    enrollment = get_object_or_404(ExamEnrollment.objects.select_related('student', 'exam'), id=enrollment_id)
     if enrollment.status == 'pending':
         enrollment.status = 'enrolled'
         enrollment.save()
@@ -592,12 +653,12 @@ def approve_enrollment(request, enrollment_id):
     else:
         messages.warning(request, "This enrollment is not pending.")
 
-    return redirect('view_exam', exam_id=enrollment.exam.id)
+    return redirect('view_exam', exam_id=enrollment.exam_id)
 
 
 @require_POST
 def reject_enrollment(request, enrollment_id):
-    enrollment = get_object_or_404(ExamEnrollment, id=enrollment_id)
+    enrollment = get_object_or_404(ExamEnrollment.objects.select_related('student', 'exam'), id=enrollment_id)
     if enrollment.status == 'pending':
         enrollment.status = 'rejected'
         enrollment.save()
@@ -605,7 +666,54 @@ def reject_enrollment(request, enrollment_id):
     else:
         messages.warning(request, "This enrollment is not pending.")
 
-    return redirect('view_exam', exam_id=enrollment.exam.id)
+    return redirect('view_exam', exam_id=enrollment.exam_id)
+
+
+@role_required('ADMIN')
+@require_POST
+def exam_enrollments_bulk(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+    return bulk_decision_response(request, ExamEnrollment, exam, 'view_exam')
+
+
+@role_required('ADMIN')
+@require_POST
+def exam_certificates_issue(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+    # Rendering runs outside the request: the issue_certificates command
+    # renders every certificate that has no file yet.
+    issued = len(assign_passers(exam))
+    messages.success(request, f"{issued} certificate(s) issued for {exam.exam_name}. "
+                              "The PDFs are rendered in the background and can be downloaded once ready.")
+    return redirect('view_exam', exam_id=exam.id)
+
+
+@role_required('ADMIN')
+def exam_certificates_download(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+    response = StreamingHttpResponse(stream_zip(exam), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="certificates-exam-{exam.id}.zip"'
+    return response
+
+
+@role_required('ADMIN')
+def exam_results_export(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+    return results_export.export_response(request, exam)
+
+
+@role_required('ADMIN')
+def exam_monitor(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+    return render(request, 'exams/monitor.html', {'exam': exam})
+
+
+@role_required('ADMIN')
+def exam_monitor_stream(request, exam_id):
+    exam = get_object_or_404(Exam, id=exam_id)
+    enrolled = (enrollment_stats.ExamEnrollmentStats.objects.filter(exam=exam)
+                .values_list('approved', flat=True).first() or 0)
+    return live_monitor.stream_response(live_monitor.EXAM, exam.id, enrolled)
 
 
 @role_required('ADMIN')
@@ -625,14 +733,16 @@ def edit_exam(request, exam_id):
 
 @role_required('ADMIN')
 def clone_exam(request, exam_id):
-    exam = Exam.objects.get(id=exam_id)
+    exam = get_object_or_404(Exam, id=exam_id)
     if request.method == 'POST':
         form = ExamForm(request.POST)
         if form.is_valid():
-            new_exam = form.save(commit=False)
-            new_exam.admin = request.user
-            new_exam.save()
-            messages.success(request, "Exam cloned successfully.")
+            with transaction.atomic():
+                new_exam = form.save(commit=False)
+                new_exam.admin = request.user
+                new_exam.save()
+                copied = clone_questions(exam, new_exam)
+            messages.success(request, f"Exam cloned successfully with {len(copied)} question(s).")
             return redirect('admin_exams')
         else:
             messages.error(request, "Please correct the errors below.")
@@ -11,8 +11,32 @@ from core.models import Question, Option, MatchingPair, TrueFalseAnswer
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator
 from django.db import transaction, models
-from core.decorators import role_required
-from django.db.models import Count, Q
+from core.principal import role_required
+from core.question_service import save_question, options_from_post, matching_pairs_from_post
+from core import question_stats, search
+from core.pagination import keyset_page, DEFAULT_COUNT_CAP
+from core.exam_graph import load_exam_graph
+from core.db_router import read_replica
+from core.item_analysis import analytics_overview
+from core import results_export, live_monitor
+from core.enrollments import bulk_decision_response
+from core.exam_clone import clone_examination
+from studentpanel.models import ExaminerExamEnrollment
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from adminpanel.models import Exam
+from django.db.models import Count, Q, Sum
+
+def examiner_question_stats():
+    # Counters are maintained on write (core.question_stats), so this is a
+    # lookup over a few rows rather than a scan of core_question.
+    counts = question_stats.type_counts()
+    return {
+        'total': counts['total'],
+        'mcq': counts['MCQ'],
+        'tf': counts['TRUE_FALSE'],
+        'essay': counts['ESSAY'],
+    }
 
 @role_required('EXAMINER')
 def examiner_login(request):
@@ -29,6 +53,7 @@ def examiner_login(request):
     return render(request, 'examinerpanel/login.html')
 
 @role_required('EXAMINER')
+@read_replica
 def examiner_questions(request):
     questions = Question.objects.select_related('subject', 'created_by').order_by('-created_at')
 
@@ -46,18 +71,17 @@ def examiner_questions(request):
     if created_by_me:
         questions = questions.filter(created_by=request.user)
 
+    ordering = ['-created_at']
+    search_query = request.GET.get('search')
+    if search_query:
+        questions = search.filter_questions(questions, search_query)
+        ordering = ['search_rank']
+
     # Stats
-    stats = Question.objects.aggregate(
-        total=Count('id'),
-        mcq=Count('id', filter=Q(question_type='MCQ')),
-        tf=Count('id', filter=Q(question_type='TRUE_FALSE')),
-        essay=Count('id', filter=Q(question_type='ESSAY')),
-    )
+    stats = examiner_question_stats()
 
     # Pagination
-    paginator = Paginator(questions, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = keyset_page(request, questions, ordering, 10, count_cap=DEFAULT_COUNT_CAP)
 
     subjects = Subject.objects.all()
 
@@ -76,21 +100,21 @@ def examiner_exams(request):
 @login_required
 
 @role_required('EXAMINER')
+@read_replica
 def examiner_questions(request):
     questions_queryset = Question.objects.select_related('subject', 'created_by').order_by('-created_at')
 
+    ordering = ['-created_at']
+    search_query = request.GET.get('search')
+    if search_query:
+        questions_queryset = search.filter_questions(questions_queryset, search_query)
+        ordering = ['search_rank']
+
     # Pagination
-    paginator = Paginator(questions_queryset, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = keyset_page(request, questions_queryset, ordering, 10, count_cap=DEFAULT_COUNT_CAP)
 
     # Question Stats
-    stats = Question.objects.aggregate(
-        total=Count('id'),
-        mcq=Count('id', filter=Q(question_type='MCQ')),
-        tf=Count('id', filter=Q(question_type='TRUE_FALSE')),
-        essay=Count('id', filter=Q(question_type='ESSAY')),
-    )
+    stats = examiner_question_stats()
 
     return render(request, 'examinerpanel/questions/index.html', {
         'questions': page_obj,
@@ -182,50 +206,30 @@ def handle_question_form(request, question=None):
         messages.error(request, "Please fill all required fields.")
         return redirect(request.path)
 
-    question.save()
-
-    # If editing, delete old related records
-    if not is_new:
-        Option.objects.filter(question=question).delete()
-        TrueFalseAnswer.objects.filter(question=question).delete()
-        MatchingPair.objects.filter(question=question).delete()
+    options, pairs, true_false = [], [], None
 
     # MCQ
     if question.question_type == 'MCQ':
-        correct = data.get('correct_option')
-        for key in data:
-            if key.startswith('option_'):
-                text = data.get(key)
-                if text:
-                    opt = Option.objects.create(question=question, text=text)
-                    if correct and key.endswith(correct):
-                        opt.is_correct = True
-                        opt.save()
+        options = options_from_post(data, data.get('correct_option'))
 
     # True/False
     elif question.question_type == 'TRUE_FALSE':
         answer = data.get('true_false_answer')
         if answer in ['true', 'false']:
-            TrueFalseAnswer.objects.create(
-                question=question,
-                is_true=(answer == 'true')
-            )
+            true_false = TrueFalseAnswer(is_true=(answer == 'true'))
 
     # Essay
     elif question.question_type == 'ESSAY':
         question.essay_instructions = data.get('essay_guidelines', '')
-        question.save()
 
     # Matching
     elif question.question_type == 'MATCHING':
-        index = 1
-        while True:
-            left = data.get(f'match_left_{index}')
-            right = data.get(f'match_right_{index}')
-            if not left or not right:
-                break
-            MatchingPair.objects.create(question=question, left_text=left, right_text=right)
-            index += 1
+        pairs = matching_pairs_from_post(data)
+
+    # Question and children are written in one batch; old children are
+    # replaced when editing.
+    save_question(question, options=options, pairs=pairs, true_false=true_false,
+                  replace_children=not is_new)
 
     messages.success(request, f"Question {'created' if is_new else 'updated'} successfully.")
     return redirect('examiner_questions')
@@ -235,8 +239,36 @@ def examiner_settings(request):
     return render(request, 'examinerpanel/settings/index.html')
 
 @role_required('EXAMINER')
+@read_replica
 def examiner_analytics(request):
-    return render(request, 'examinerpanel/analytics/index.html')
+    rollups, selected = analytics_overview(request.GET.get('exam'))
+    return render(request, 'examinerpanel/analytics/index.html', {'rollups': rollups, 'selected': selected})
+
+@role_required('EXAMINER')
+@require_POST
+def examiner_enrollments_bulk(request, exam_id):
+    exam = get_object_or_404(Examination, id=exam_id, examiner_id=request.principal.id)
+    return bulk_decision_response(request, ExaminerExamEnrollment, exam, 'examiner_exam_view')
+
+@role_required('EXAMINER')
+def examiner_results_export(request, exam_id):
+    # Answers are only stored for admin Exams, which have no examiner
+    # field, and an examiner's own Examinations have no stored answers to
+    # export.  So an examiner may only export the Exams they created
+    # themselves; writing questions for an exam does not make it theirs.
+    exam = get_object_or_404(Exam, id=exam_id, admin_id=request.principal.id)
+    return results_export.export_response(request, exam)
+
+@role_required('EXAMINER')
+def examiner_monitor(request, exam_id):
+    exam = get_object_or_404(Examination, id=exam_id, examiner_id=request.principal.id)
+    return render(request, 'examinerpanel/exams/monitor.html', {'exam': exam})
+
+@role_required('EXAMINER')
+def examiner_monitor_stream(request, exam_id):
+    exam = get_object_or_404(Examination, id=exam_id, examiner_id=request.principal.id)
+    enrolled = ExaminerExamEnrollment.objects.filter(exam=exam, status='enrolled').count()
+    return live_monitor.stream_response(live_monitor.EXAMINATION, exam.id, enrolled)
 
 @role_required('EXAMINER')
 def examiner_students(request):
@@ -456,79 +488,55 @@ def examiner_exam_view(request, exam_id):
             return redirect('examiner_exam_view', exam_id=exam.id)
 
         try:
-            with transaction.atomic():
-                question = Question.objects.create(
-                    examination=exam,
-                    subject=exam.subject,
-                    text=question_text,
-                    question_type=question_type.upper(),
-                    marks=marks,
-                    image=request.FILES.get('image'),  # Optional
-                    created_by=request.user,
-                    )
-
-                # Handle MCQ
-                if question_type == 'mcq':
-                    correct_option = request.POST.get('correct_option')
-                    for key in request.POST:
-                        if key.startswith('option_'):
-                            text = request.POST.get(key)
-                            if text:
-                                opt = Option.objects.create(question=question, text=text)
-                                if correct_option and key.endswith(correct_option):
-                                    opt.is_correct = True
-                                    opt.save()
-
-                # Handle True/False
-                elif question_type == 'true_false':
-                    tf_value = request.POST.get('true_false_answer')
-                    if tf_value:
-                        TrueFalseAnswer.objects.create(
-                            question=question,
-                            is_true=tf_value.lower() == 'true'
-                        )
-
-                # Handle Essay
-                elif question_type == 'essay':
-                    guidelines = request.POST.get('essay_guidelines', '')
-                    question.essay_instructions = guidelines
-                    question.save()
-
-                # Handle Matching
-                elif question_type == 'matching':
-                    index = 1
-                    while True:
-                        left = request.POST.get(f'match_left_{index}')
-                        right = request.POST.get(f'match_right_{index}')
-                        if left and right:
-                            MatchingPair.objects.create(
-                                question=question,
-                                left_text=left,
-                                right_text=right
-                            )
-                            index += 1
-                        else:
-                            break
-
-                messages.success(request, "Question added successfully.")
-                return redirect('examiner_exam_view', exam_id=exam.id)
+            question = Question(
+                examination=exam,
+                subject=exam.subject,
+                text=question_text,
+                question_type=question_type.upper(),
+                marks=marks,
+                image=request.FILES.get('image'),  # Optional
+                created_by=request.user,
+            )
+            options, pairs, true_false = [], [], None
+
+            # Handle MCQ
+            if question_type == 'mcq':
+                options = options_from_post(request.POST, request.POST.get('correct_option'))
+
+            # Handle True/False
+            elif question_type == 'true_false':
+                tf_value = request.POST.get('true_false_answer')
+                if tf_value:
+                    true_false = TrueFalseAnswer(is_true=tf_value.lower() == 'true')
+
+            # Handle Essay
+            elif question_type == 'essay':
+                question.essay_instructions = request.POST.get('essay_guidelines', '')
+
+            # Handle Matching
+            elif question_type == 'matching':
+                pairs = matching_pairs_from_post(request.POST)
+
+            save_question(question, options=options, pairs=pairs, true_false=true_false)
+
+            messages.success(request, "Question added successfully.")
+            return redirect('examiner_exam_view', exam_id=exam.id)
 
         except Exception as e:
             messages.error(request, f"Error saving question: {str(e)}")
             return redirect('examiner_exam_view', exam_id=exam.id)
 
-    # Fetch all questions and paginate them
-    questions_queryset = Question.objects.filter(examination=exam).order_by('-created_at')
-    paginator = Paginator(questions_queryset, 5)
-    page_number = request.GET.get('page')
-    questions = paginator.get_page(page_number)
-
-    total_marks = questions_queryset.aggregate(models.Sum('marks'))['marks__sum'] or 0
+    # Page the question ids in SQL, then load the graph of that page only
+    exam_questions = Question.objects.filter(examination=exam)
+    paginator = Paginator(exam_questions.order_by('-created_at', '-id').values_list('id', flat=True), 5)
+    questions = paginator.get_page(request.GET.get('page'))
+    questions.object_list = load_exam_graph(exam, with_enrollments=False,
+                                            question_ids=questions.object_list).questions
 
     return render(request, 'examinerpanel/exams/view.html', {
         'exam': exam,
         'questions': questions,
-        'total_marks': total_marks,
+        'total_marks': exam_questions.aggregate(total=Sum('marks'))['total'] or 0,
     })
 @login_required
 def examiner_exam_delete(request, exam_id):
@@ -537,6 +545,14 @@ def examiner_exam_delete(request, exam_id):
     messages.success(request, "Exam deleted successfully.")
     return redirect('examiner_exams')
 
+@role_required('EXAMINER')
+@require_POST
+def examiner_exam_clone(request, exam_id):
+    exam = get_object_or_404(Examination, id=exam_id, examiner_id=request.principal.id)
+    copy = clone_examination(exam, examiner=request.user)
+    messages.success(request, f"Exam cloned as '{copy.exam_name}'.")
+    return redirect('examiner_exam_view', exam_id=copy.id)
+
 
 # ✅ ADD THIS FUNCTION BELOW
 @login_required